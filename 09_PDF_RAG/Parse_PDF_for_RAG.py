@@ -1,10 +1,16 @@
 # 导入所需的库
 from io import BytesIO
 import base64
+import os
+import sys
 from rich import print
 import pandas as pd
 import numpy as np
 
+# 复用 20_rag_practice/EmbeddingCache.py 中的持久化嵌入向量缓存
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "20_rag_practice"))
+from EmbeddingCache import EmbeddingCache
+
 # 初始化OpenAI客户端
 from openai import OpenAI
 client = OpenAI()
@@ -155,18 +161,28 @@ for c in combined_content:
 # 将清理后的内容转换为DataFrame  
 df = pd.DataFrame(clean_content, columns=['content'])
 
+# 嵌入向量缓存，相同文本不再重复调用嵌入接口，脚本结束时关闭
+embedding_model = "text-embedding-3-small"
+embedding_cache = EmbeddingCache("09_PDF_RAG/embedding_cache.sqlite", embedding_model)
+
 # 获取嵌入向量
 def get_embeddings(text):
-    """获取给定文本的嵌入向量"""
+    """获取给定文本的嵌入向量，优先从缓存读取"""
+    cached = embedding_cache.get_many([text])[0]
+    if cached is not None:
+        return cached.tolist()
     embeddings = client.embeddings.create(
-        model="text-embedding-3-small",
+        model=embedding_model,
         input=text,
         encoding_format="float"
     )
-    return embeddings.data[0].embedding
+    embedding = embeddings.data[0].embedding
+    embedding_cache.put_many([text], np.array([embedding], dtype=np.float32))
+    return embedding
 
 # 为每个内容片段生成嵌入向量
 df['embeddings'] = df['content'].apply(lambda x: get_embeddings(x))
+print(f"嵌入缓存统计: {embedding_cache.stats()}")
 
 # 搜索相关内容
 from sklearn.metrics.pairwise import cosine_similarity
@@ -254,4 +270,7 @@ for ex in example_inputs:
         content = str(match['content'])
         print(f"[grey37]{content[:100]}{'...' if len(content) > 100 else ''}[/[grey37]]\n\n")
     reply = generate_output(ex, matching_content)
-    print(f"[turquoise4][b]回复:[/b][/turquoise4]\n\n[spring_green4]{reply}[/spring_green4]\n\n--------------\n\n")
\ No newline at end of file
+    print(f"[turquoise4][b]回复:[/b][/turquoise4]\n\n[spring_green4]{reply}[/spring_green4]\n\n--------------\n\n")
+
+# 关闭嵌入向量缓存
+embedding_cache.close()
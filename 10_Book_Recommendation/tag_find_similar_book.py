@@ -1,8 +1,14 @@
+import os
+import sys
 import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 from openai import OpenAI
 
+# 复用 20_rag_practice/EmbeddingCache.py 中的持久化嵌入向量缓存
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "20_rag_practice"))
+from EmbeddingCache import EmbeddingCache
+
 # 初始化OpenAI客户端
 client = OpenAI()
 
@@ -60,17 +66,26 @@ df['关键词'] = df['内容简介'].apply(generate_keywords)
 data_path = "10_Book_Recommendation/图书_带关键字.csv"
 df.to_csv(data_path, index=False)
 
-# 定义获取嵌入向量的函数
+# 嵌入向量缓存，相同文本不再重复调用嵌入接口，脚本结束时关闭
+embedding_cache = EmbeddingCache("10_Book_Recommendation/embedding_cache.sqlite", "openai")
+
+# 定义获取嵌入向量的函数，优先从缓存读取，模型名作为缓存键的一部分
 def get_embedding(value, model="text-embedding-ada-002"):
+    cached = embedding_cache.get_many([value], variant=model)[0]
+    if cached is not None:
+        return cached.tolist()
     embeddings = client.embeddings.create(
       model=model,
       input=value,
       encoding_format="float"
     )  
-    return embeddings.data[0].embedding
+    embedding = embeddings.data[0].embedding
+    embedding_cache.put_many([value], np.array([embedding], dtype=np.float32), variant=model)
+    return embedding
 
 # 嵌入标题、作者和关键词
 df['embedding'] = df.apply(lambda x: get_embedding(f"{x['标题']} {x['作者']} {x['关键词']}"), axis=1)
+print(f"嵌入缓存统计: {embedding_cache.stats()}")
 
 # 将嵌入向量转换为字符串以便保存到CSV文件
 df['embedding_str'] = df['embedding'].apply(lambda x: ','.join(map(str, x)))
@@ -95,4 +110,7 @@ user_input = "给我一本适合初学者入门的机器学习书"
 res = search_from_input_text(user_input)
 print(f"搜索词: {user_input}\n")
 for index, row in res.iterrows():
-    print(f"{row['标题']} ({row['作者']}) - 关键词: {row['关键词']}")
\ No newline at end of file
+    print(f"{row['标题']} ({row['作者']}) - 关键词: {row['关键词']}")
+
+# 关闭嵌入向量缓存
+embedding_cache.close()
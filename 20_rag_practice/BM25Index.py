@@ -0,0 +1,324 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Collection, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from MetadataFilter import to_sql_where
+from TopK import top_k_indices
+
+# 与 rank_bm25.BM25Okapi 的默认参数一致，保证得分可比
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+DEFAULT_EPSILON = 0.25
+
+
+class BM25Index:
+    """
+    持久化的 BM25 倒排索引。
+
+    倒排表（词 → 文档及词频）、文档长度与元数据、文档频率与 IDF 统计量存储在 SQLite 中，
+    索引阶段增量增删文档；查询时只读取查询词的倒排表，耗时与语料规模无关，
+    元数据过滤条件（filename、type、日期区间）在读取倒排表时由 SQLite 一并完成。
+    打分公式与 rank_bm25.BM25Okapi 相同（负 IDF 以 epsilon * 平均 IDF 代替）。
+    """
+
+    def __init__(self, path: str, k1: float = DEFAULT_K1, b: float = DEFAULT_B, epsilon: float = DEFAULT_EPSILON):
+        """
+        :param path: SQLite 数据库文件路径
+        :param k1: 词频饱和参数
+        :param b: 文档长度归一化参数
+        :param epsilon: 负 IDF 的下限系数
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL, filename TEXT, type TEXT, date INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc_id ON postings(doc_id);
+            CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value REAL NOT NULL);
+            """
+        )
+        # 旧版本的文档表没有元数据列，补齐后旧文档的元数据为空，需重新索引才能参与过滤
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(docs)")}
+        for column, column_type in (("filename", "TEXT"), ("type", "TEXT"), ("date", "INTEGER")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE docs ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+        self._load_stats()
+        # 写入代数：本进程写入或其他进程（例如单独运行的索引脚本）提交后递增，用于使派生结构失效
+        self._generation = 0
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._sparse = None
+        self._sparse_generation = -1
+        # 过滤条件到满足条件的文档 ID 集合的缓存，写入代数变化后清空
+        self._filter_ids: Dict[str, FrozenSet[str]] = {}
+        self._filter_ids_generation = -1
+
+    def _load_stats(self):
+        stats = dict(self._conn.execute("SELECT key, value FROM stats").fetchall())
+        self.doc_count = int(stats.get("doc_count", 0))
+        self.total_length = int(stats.get("total_length", 0))
+        self.average_idf = stats.get("average_idf", 0.0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+        return self.doc_count
+
+    def _refresh(self):
+        """
+        其他连接提交写入后 SQLite 的 data_version 会变化，此时重新读取统计量，并使派生结构失效。
+        """
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self._load_stats()
+            self._generation += 1
+
+    @property
+    def generation(self) -> int:
+        """
+        :return: 索引内容的写入代数，内容变化后递增
+        """
+        with self._lock:
+            self._refresh()
+            return self._generation
+
+    def sparse(self):
+        """
+        返回由当前索引内容构建的 SparseBM25，结果缓存在索引上，索引被写入（包括其他进程写入）后重新构建。
+
+        :return: SparseBM25 实例
+        """
+        # SparseBM25 依赖本模块，在此处导入以避免循环导入
+        from SparseBM25 import SparseBM25
+
+        generation = self.generation
+        if self._sparse is None or self._sparse_generation != generation:
+            self._sparse = SparseBM25.from_index(self)
+            self._sparse_generation = generation
+        return self._sparse
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_length / self.doc_count if self.doc_count else 0.0
+
+    def idf(self, df: int) -> float:
+        """
+        按 BM25Okapi 的定义计算 IDF，负值以 epsilon * 平均 IDF 代替。
+        """
+        idf = math.log(self.doc_count - df + 0.5) - math.log(df + 0.5)
+        return idf if idf >= 0 else self.epsilon * self.average_idf
+
+    def add_documents(self, doc_ids: Sequence[str], tokenized_docs: Sequence[Sequence[str]],
+                      metadatas: Optional[Sequence[Dict[str, Any]]] = None):
+        """
+        增量添加文档，已存在的文档 ID 先删除再写入。
+
+        :param doc_ids: 文档（文本块）ID 列表
+        :param tokenized_docs: 与 doc_ids 一一对应的分词结果
+        :param metadatas: 与 doc_ids 一一对应的元数据，记录其中的 filename、type、date 用于过滤
+        """
+        if metadatas is None:
+            metadatas = [{}] * len(doc_ids)
+        with self._lock:
+            self._refresh()
+            self._delete(doc_ids)
+            df_delta: Dict[str, int] = defaultdict(int)
+            doc_rows, posting_rows = [], []
+            for doc_id, tokens, metadata in zip(doc_ids, tokenized_docs, metadatas):
+                doc_rows.append(
+                    (doc_id, len(tokens), metadata.get("filename"), metadata.get("type"), metadata.get("date"))
+                )
+                self.total_length += len(tokens)
+                for term, tf in Counter(tokens).items():
+                    posting_rows.append((term, doc_id, tf))
+                    df_delta[term] += 1
+            self._conn.executemany(
+                "INSERT INTO docs (doc_id, length, filename, type, date) VALUES (?, ?, ?, ?, ?)", doc_rows
+            )
+            self._conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", posting_rows)
+            self._conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                df_delta.items(),
+            )
+            self.doc_count += len(doc_rows)
+            self._commit()
+
+    def delete_documents(self, doc_ids: Sequence[str]):
+        """
+        删除文档及其倒排记录，不存在的 ID 会被忽略。
+        """
+        with self._lock:
+            self._refresh()
+            self._delete(doc_ids)
+            self._commit()
+
+    def _delete(self, doc_ids: Sequence[str]):
+        for start in range(0, len(doc_ids), 500):
+            batch = list(doc_ids[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT doc_id, length FROM docs WHERE doc_id IN ({placeholders})", batch
+            ).fetchall()
+            if not rows:
+                continue
+            existing = [doc_id for doc_id, _ in rows]
+            placeholders = ",".join("?" * len(existing))
+            df_delta = self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE doc_id IN ({placeholders}) GROUP BY term", existing
+            ).fetchall()
+            self._conn.executemany("UPDATE terms SET df = df - ? WHERE term = ?", [(n, t) for t, n in df_delta])
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", existing)
+            self._conn.execute(f"DELETE FROM docs WHERE doc_id IN ({placeholders})", existing)
+            self.doc_count -= len(rows)
+            self.total_length -= sum(length for _, length in rows)
+        self._conn.execute("DELETE FROM terms WHERE df <= 0")
+
+    def _commit(self):
+        """
+        文档数变化后所有词的 IDF 都会变化，此处重新计算平均 IDF 并与统计量一起落盘。
+        """
+        total_idf, term_count = 0.0, 0
+        for (df,) in self._conn.execute("SELECT df FROM terms"):
+            total_idf += math.log(self.doc_count - df + 0.5) - math.log(df + 0.5)
+            term_count += 1
+        self.average_idf = total_idf / term_count if term_count else 0.0
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)",
+            [("doc_count", self.doc_count), ("total_length", self.total_length), ("average_idf", self.average_idf)],
+        )
+        self._conn.commit()
+        self._generation += 1
+
+    def clear(self):
+        """
+        清空索引，例如向量数据库被删除后需要全量重建时。
+        """
+        with self._lock:
+            self._conn.executescript("DELETE FROM docs; DELETE FROM postings; DELETE FROM terms; DELETE FROM stats;")
+            self._conn.commit()
+            self.doc_count, self.total_length, self.average_idf = 0, 0, 0.0
+            self._generation += 1
+
+    def get_scores(self, query_tokens: Sequence[str],
+                   filters: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+        """
+        只读取查询词的倒排表计算 BM25 得分。
+
+        :param query_tokens: 查询分词结果，重复的词会重复计分（与 BM25Okapi 一致）
+        :param filters: 元数据过滤条件，格式见 MetadataFilter.FILTER_KEYS，None 表示不过滤
+        :return: 至少包含一个查询词且满足过滤条件的文档 ID 到得分的映射
+        """
+        condition, params = to_sql_where(filters)
+        condition = f" AND {condition}" if condition else ""
+        scores: Dict[str, float] = defaultdict(float)
+        with self._lock:
+            self._refresh()
+            if not self.doc_count:
+                return {}
+            avgdl = self.avgdl
+            for term, count in Counter(query_tokens).items():
+                row = self._conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+                if row is None:
+                    continue
+                idf = self.idf(row[0]) * count
+                postings = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON p.doc_id = d.doc_id "
+                    f"WHERE p.term = ?{condition}",
+                    (term, *params),
+                )
+                for doc_id, tf, length in postings:
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (
+                        tf + self.k1 * (1 - self.b + self.b * length / avgdl)
+                    )
+        return dict(scores)
+
+    def search(self, query_tokens: Sequence[str], top_k: int, candidate_ids: Optional[Collection[str]] = None,
+               filters: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        :param query_tokens: 查询分词结果
+        :param top_k: 返回得分最高的前 top_k 个文档
+        :param candidate_ids: 只在这些文档中检索，None 表示不过滤
+        :param filters: 元数据过滤条件，在读取倒排表时过滤，None 表示不过滤
+        :return: (文档 ID, 得分) 列表，按得分降序
+        """
+        scores = self.get_scores(query_tokens, filters)
+        if candidate_ids is not None:
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_id in candidate_ids}
+        doc_ids = list(scores)
+        values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+        return [(doc_ids[i], float(values[i])) for i in top_k_indices(values, top_k)]
+
+    def contains_all(self, doc_ids: Sequence[str]) -> bool:
+        """
+        :param doc_ids: 文档 ID 列表
+        :return: 这些文档是否全部仍在索引中；读取的是 SQLite 中的当前内容，其他进程的写入同样可见
+        """
+        doc_ids = list(set(doc_ids))
+        if not doc_ids:
+            return True
+        with self._lock:
+            found = 0
+            for start in range(0, len(doc_ids), 500):
+                batch = doc_ids[start:start + 500]
+                found += self._conn.execute(
+                    f"SELECT COUNT(*) FROM docs WHERE doc_id IN ({','.join('?' * len(batch))})", batch
+                ).fetchone()[0]
+        return found == len(doc_ids)
+
+    def filter_ids(self, filters: Optional[Dict[str, Any]]) -> Optional[FrozenSet[str]]:
+        """
+        满足元数据过滤条件的文档 ID 集合，按过滤条件缓存，索引写入后重新查询。
+
+        :param filters: 元数据过滤条件，None 或空字典表示不过滤
+        :return: 文档 ID 集合，不过滤时返回 None
+        """
+        condition, params = to_sql_where(filters)
+        if condition is None:
+            return None
+        key = json.dumps(filters, sort_keys=True, ensure_ascii=False, default=str)
+        with self._lock:
+            self._refresh()
+            if self._filter_ids_generation != self._generation:
+                self._filter_ids.clear()
+                self._filter_ids_generation = self._generation
+            doc_ids = self._filter_ids.get(key)
+            if doc_ids is None:
+                rows = self._conn.execute(f"SELECT d.doc_id FROM docs d WHERE {condition}", params).fetchall()
+                doc_ids = self._filter_ids[key] = frozenset(doc_id for doc_id, in rows)
+        return doc_ids
+
+    def export(self) -> Tuple[List[str], List[int], List[Tuple[str, str, int]]]:
+        """
+        导出全部文档与倒排记录，用于构建内存中的向量化打分器。
+
+        :return: (文档 ID 列表, 对应的文档长度列表, (词, 文档 ID, 词频) 列表)
+        """
+        with self._lock:
+            self._refresh()
+            docs = self._conn.execute("SELECT doc_id, length FROM docs ORDER BY doc_id").fetchall()
+            postings = self._conn.execute("SELECT term, doc_id, tf FROM postings").fetchall()
+        return [doc_id for doc_id, _ in docs], [length for _, length in docs], postings
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
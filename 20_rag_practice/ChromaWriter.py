@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from DedupIndex import DedupIndex
+from EmbeddingCache import EmbeddingCache
+from EmbeddingEncoder import DEFAULT_BATCH_SIZE, encode_texts
+
+# Chroma 单次 add 的默认条数上限（SQLite 后端的最大批量约为 5461）
+DEFAULT_WRITE_BATCH_SIZE = 4096
+
+
+def max_write_batch_size(client=None, write_batch_size: int = DEFAULT_WRITE_BATCH_SIZE) -> int:
+    """
+    取配置值与 Chroma 客户端允许的最大批量（client.get_max_batch_size()）中较小者。
+
+    :param client: 创建集合所用的 Chroma 客户端，未传入时只使用配置值
+    :param write_batch_size: 配置的每批写入条数
+    :return: 实际使用的每批写入条数
+    """
+    if client is not None:
+        return min(write_batch_size, client.get_max_batch_size())
+    return write_batch_size
+
+
+def _add_batch(collection, ids: List[str], embeddings, documents: List[str],
+               metadatas: Optional[List[Dict[str, Any]]]):
+    """
+    在写入线程中把一批向量转换为列表并写入集合，转换与下一批的编码重叠。
+    """
+    collection.add(ids=ids, embeddings=embeddings.tolist(), documents=documents, metadatas=metadatas)
+
+
+def encode_and_store(
+    embedding_model,
+    collection,
+    ids: List[str],
+    documents: List[str],
+    metadatas: Optional[List[Dict[str, Any]]] = None,
+    write_batch_size: int = DEFAULT_WRITE_BATCH_SIZE,
+    encode_batch_size: int = DEFAULT_BATCH_SIZE,
+    cache: Optional[EmbeddingCache] = None,
+    client=None,
+) -> int:
+    """
+    分批计算嵌入向量并写入 Chroma 集合。
+
+    每批向量在写入线程中才转换为 Python 列表（较早版本的 chromadb 不接受 ndarray），写入在后台线程执行，
+    与下一批的编码重叠。任一时刻最多只有两批向量驻留内存，峰值内存与语料规模无关。
+
+    :param embedding_model: 预加载的 SentenceTransformer 模型
+    :param collection: Chroma 集合
+    :param ids: 文本块 ID 列表
+    :param documents: 文本块内容列表
+    :param metadatas: 文本块元数据列表，可选
+    :param write_batch_size: 每次写入 Chroma 的条数，不超过客户端允许的最大批量
+    :param encode_batch_size: 嵌入模型每批编码的文本数量
+    :param cache: 嵌入向量缓存，可选
+    :param client: 创建集合所用的 Chroma 客户端，用于读取允许的最大批量，可选
+    :return: 写入的文本块数量
+    """
+    batch_size = max_write_batch_size(client, write_batch_size)
+    pending = None
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for start in range(0, len(ids), batch_size):
+            stop = start + batch_size
+            embeddings = encode_texts(
+                embedding_model,
+                documents[start:stop],
+                batch_size=encode_batch_size,
+                normalize_embeddings=True,
+                cache=cache,
+            )
+            # 等待上一批写入完成后再提交，保证同时只有一批在写
+            if pending is not None:
+                pending.result()
+            pending = writer.submit(
+                _add_batch,
+                collection,
+                ids[start:stop],
+                embeddings,
+                documents[start:stop],
+                metadatas[start:stop] if metadatas is not None else None,
+            )
+            print(f"已提交写入 {min(stop, len(ids))}/{len(ids)} 个文本块")
+        if pending is not None:
+            pending.result()
+    return len(ids)
+
+
+def update_duplicate_metadata(collection, dedup_index: DedupIndex, representative_ids: Iterable[str]) -> int:
+    """
+    按去重索引记录的重复块，更新已写入 Chroma 的代表块元数据中的 duplicate_filenames 与 duplicate_count。
+    用于代表块来自历史运行、本次运行新增或移除了与之重复的文本块的情况。
+
+    :param collection: Chroma 集合
+    :param dedup_index: 持久化的去重索引
+    :param representative_ids: 需要更新的代表块 ID，集合中不存在的 ID 会被忽略
+    :return: 更新的代表块数量
+    """
+    representative_ids = sorted(set(representative_ids))
+    if not representative_ids:
+        return 0
+    existing = collection.get(ids=representative_ids, include=["metadatas"])
+    if not existing['ids']:
+        return 0
+    duplicates = dedup_index.duplicate_filenames(existing['ids'])
+    metadatas = []
+    for chunk_id, metadata in zip(existing['ids'], existing['metadatas']):
+        metadata = dict(metadata or {})
+        # Chroma 元数据只支持标量，文件名去重后以逗号拼接，与 ChunkDeduplicator 一致
+        metadata["duplicate_filenames"] = ",".join(dict.fromkeys(name for name in duplicates[chunk_id] if name))
+        metadata["duplicate_count"] = len(duplicates[chunk_id])
+        metadatas.append(metadata)
+    collection.update(ids=existing['ids'], metadatas=metadatas)
+    return len(metadatas)
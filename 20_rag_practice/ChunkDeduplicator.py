@@ -0,0 +1,158 @@
+import hashlib
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import logging
+
+from DedupIndex import DedupIndex
+from EmbeddingCache import normalize_text
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class ChunkDeduplicator:
+    """
+    文本块去重：先按归一化文本的哈希去除完全重复，再用 MinHash + LSH 去除近似重复。
+
+    字符 n-gram 作为 shingle，对中英文都适用。被合并的重复块不会写入向量数据库，
+    其来源文件名记录在保留块元数据的 duplicate_filenames 字段中。
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 32,
+                 shingle_size: int = 5, seed: int = 1):
+        """
+        :param threshold: 近似重复判定的 Jaccard 相似度阈值（由 MinHash 签名估计）
+        :param num_perm: MinHash 置换函数个数
+        :param bands: LSH 分带数，num_perm 必须能被整除；带数越多召回越高、候选越多
+        :param shingle_size: 字符 n-gram 长度
+        :param seed: 置换函数随机种子，固定后结果可复现
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._seed = seed
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        计算文本的 MinHash 签名。
+        """
+        n = self.shingle_size
+        shingles = {text[i:i + n] for i in range(max(1, len(text) - n + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # (a * x + b) mod p，uint64 溢出回绕不影响作为哈希族使用
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+    @property
+    def settings(self) -> str:
+        """
+        影响签名取值的参数，持久化的签名只在参数一致时可以比较。
+        """
+        return f"num_perm={self.num_perm},bands={self.bands},shingle_size={self.shingle_size},seed={self._seed}"
+
+    def deduplicate(self, chunks: List[Dict[str, Any]], chunk_ids: Optional[Sequence[str]] = None,
+                    index: Optional[DedupIndex] = None) -> List[Any]:
+        """
+        找出每个文本块的代表块，并在代表块元数据中记录被合并重复块的来源文件名。
+
+        提供 index 时，新文本块同时与历史运行中已索引的代表块比较，本次新保留的代表块与被合并的重复块
+        暂存到 index 中，调用方在向量数据库写入成功后调用 index.commit()。代表块已在历史运行中写入时，
+        本方法不修改其元数据，由调用方根据 index.duplicate_filenames() 更新向量数据库中的元数据。
+
+        :param chunks: 带元数据的文本块列表，元数据中的 filename 用于记录来源
+        :param chunk_ids: 与 chunks 一一对应的文本块 ID，提供 index 时必须提供
+        :param index: 已索引代表块的持久化 MinHash 索引
+        :return: 与 chunks 一一对应的代表块；未提供 chunk_ids 时为下标（等于自身下标表示该块被保留），
+                 否则为代表块 ID（等于自身 ID 表示该块被保留）
+        """
+        if index is not None and chunk_ids is None:
+            raise ValueError("使用持久化去重索引时必须提供 chunk_ids")
+        ids = list(chunk_ids) if chunk_ids is not None else list(range(len(chunks)))
+        if index is not None:
+            index.check_settings(self.settings)
+
+        representatives = list(ids)
+        exact: Dict[str, Any] = {}
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        signatures: Dict[int, np.ndarray] = {}
+        duplicates: Dict[int, List[int]] = defaultdict(list)
+        # 本次运行中保留的代表块 ID 到其下标的映射，只有这些代表块才记录重复来源
+        keepers: Dict[Any, int] = {}
+        new_entries = []
+
+        for position, chunk in enumerate(chunks):
+            text = normalize_text(chunk["content"])
+            digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            if digest not in exact and index is not None:
+                existing = index.find_exact(digest)
+                if existing is not None and existing != ids[position]:
+                    exact[digest] = existing
+            if digest in exact:
+                representatives[position] = exact[digest]
+                if exact[digest] in keepers:
+                    duplicates[keepers[exact[digest]]].append(position)
+                continue
+
+            signature = self.signature(text)
+            band_keys = [
+                bytes([band]) + signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                for band in range(self.bands)
+            ]
+            # 先与本次运行中保留的代表块比较，再与历史运行中已索引的代表块比较
+            match = None
+            for candidate in sorted({candidate for key in band_keys for candidate in buckets.get(key, ())}):
+                if np.mean(signatures[candidate] == signature) >= self.threshold:
+                    match = ids[candidate]
+                    break
+            if match is None and index is not None:
+                for chunk_id, candidate_signature in sorted(index.candidates(band_keys).items()):
+                    if chunk_id != ids[position] and np.mean(candidate_signature == signature) >= self.threshold:
+                        match = chunk_id
+                        break
+
+            if match is not None:
+                representatives[position] = match
+                if match in keepers:
+                    duplicates[keepers[match]].append(position)
+                exact[digest] = match
+                continue
+
+            exact[digest] = ids[position]
+            keepers[ids[position]] = position
+            signatures[position] = signature
+            for key in band_keys:
+                buckets[key].append(position)
+            new_entries.append((ids[position], digest, signature, band_keys))
+
+        if index is not None:
+            index.add_many(new_entries)
+            index.add_duplicates(
+                (ids[position], representative, chunks[position]["metadata"].get("filename", ""))
+                for position, representative in enumerate(representatives) if representative != ids[position]
+            )
+
+        for keeper, members in duplicates.items():
+            metadata = chunks[keeper]["metadata"]
+            filenames = dict.fromkeys(
+                chunks[member]["metadata"].get("filename", "") for member in members
+            )
+            # Chroma 元数据只支持标量，文件名以逗号拼接
+            metadata["duplicate_filenames"] = ",".join(name for name in filenames if name)
+            metadata["duplicate_count"] = len(members)
+
+        removed = sum(1 for chunk_id, representative in zip(ids, representatives) if chunk_id != representative)
+        logging.info(f"Deduplicated {len(chunks)} chunks, removed {removed} duplicates")
+        return representatives
@@ -0,0 +1,209 @@
+import bisect
+import regex as re
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+# 句子边界：中英文句末标点（可带后续引号/括号）或换行
+SENTENCE_BOUNDARY_REGEX = re.compile(r"(?:[^。！？!?；;.\n]|\.(?!\s|$))*(?:[。！？!?；;]+[”’」』)）]?|\.(?=\s|$)|\n+|$)")
+
+# 嵌入模型输入会额外加上 [CLS] 与 [SEP]
+SPECIAL_TOKENS_PER_INPUT = 2
+
+
+class ChunkPacker:
+    """
+    按 token 预算合并 TextSplitter 产出的相邻文本块。
+
+    小块按顺序贪心合并到目标 token 数以内，超长块在句子边界处拆分，
+    使每个文本块都能完整送入嵌入模型，同时减少嵌入调用次数。
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[List[str]], List[int]],
+        max_tokens: int,
+        overlap_tokens: int = 0,
+    ):
+        """
+        :param count_tokens: 批量计算 token 数的函数，输入文本列表，返回对应的 token 数列表
+        :param max_tokens: 每个合并块的 token 上限
+        :param overlap_tokens: 相邻合并块之间重叠的 token 数，按整块回溯，不超过该值
+        """
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens 必须小于 max_tokens")
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @classmethod
+    def from_embedding_model(cls, embedding_model, max_tokens: Optional[int] = None, overlap_tokens: int = 0):
+        """
+        使用 SentenceTransformer 模型自带的分词器计数，默认上限为模型的 max_seq_length。
+
+        :param embedding_model: 预加载的 SentenceTransformer 模型
+        :param max_tokens: 每个合并块的 token 上限，None 表示使用模型最大输入长度
+        :param overlap_tokens: 相邻合并块之间重叠的 token 数
+        :return: ChunkPacker 实例
+        """
+        tokenizer = embedding_model.tokenizer
+        limit = embedding_model.max_seq_length - SPECIAL_TOKENS_PER_INPUT
+        max_tokens = min(max_tokens or limit, limit)
+
+        def count_tokens(texts: List[str]) -> List[int]:
+            if not texts:
+                return []
+            encoded = tokenizer(texts, add_special_tokens=False)["input_ids"]
+            return [len(ids) for ids in encoded]
+
+        return cls(count_tokens, max_tokens, overlap_tokens)
+
+    def pack(
+        self,
+        chunks: List[Dict[str, Any]],
+        document_text: Optional[str] = None,
+        page_offsets: Optional[List[int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        合并同一文档的相邻文本块。
+
+        合并块的内容直接从原文切片，文本块之间的原始分隔符保持不变，
+        仍满足 document_text[start:end] == content。
+
+        :param chunks: split_with_metadata 的输出，需来自同一文档且按顺序排列
+        :param document_text: 文档原文，文本块带 start/end 偏移元数据时必须提供
+        :param page_offsets: 每一页在原文中的起始字符偏移，提供时记录合并块的起止页码（page/page_end）
+        :return: 合并后的文本块列表，元数据中的 start/end/byte_start/byte_end 覆盖合并前的全部文本块
+        """
+        if document_text is None and any("start" in chunk["metadata"] for chunk in chunks):
+            raise ValueError("文本块带有偏移元数据时必须提供 document_text")
+        pieces = self._split_oversized(chunks)
+        token_counts = self.count_tokens([piece["content"] for piece in pieces])
+
+        packed = []
+        current: List[int] = []
+        current_tokens = 0
+        for index, tokens in enumerate(token_counts):
+            if current and current_tokens + tokens > self.max_tokens:
+                packed.append(self._merge([pieces[i] for i in current], current_tokens, document_text))
+                current, current_tokens = self._overlap_tail(current, token_counts, tokens)
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            packed.append(self._merge([pieces[i] for i in current], current_tokens, document_text))
+        if page_offsets:
+            for chunk in packed:
+                metadata = chunk["metadata"]
+                # 拆分或合并后按实际字符区间重新计算起止页码
+                metadata["page"] = bisect.bisect_right(page_offsets, metadata["start"])
+                metadata["page_end"] = bisect.bisect_right(page_offsets, max(metadata["start"], metadata["end"] - 1))
+
+        logging.info(f"Packed {len(chunks)} chunks into {len(packed)} chunks")
+        return packed
+
+    def _overlap_tail(self, current: List[int], token_counts: List[int], next_tokens: int):
+        """
+        从上一个合并块末尾回溯，选出放入下一个合并块开头的重叠文本块。
+        """
+        tail: List[int] = []
+        tail_tokens = 0
+        budget = min(self.overlap_tokens, self.max_tokens - next_tokens)
+        for index in reversed(current[1:]):
+            if tail_tokens + token_counts[index] > budget:
+                break
+            tail.insert(0, index)
+            tail_tokens += token_counts[index]
+        return tail, tail_tokens
+
+    def _split_oversized(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        将超过 token 上限的文本块在句子边界处拆分，单句仍超长时按字符硬切分。
+        """
+        token_counts = self.count_tokens([chunk["content"] for chunk in chunks])
+        pieces = []
+        for chunk, tokens in zip(chunks, token_counts):
+            if tokens <= self.max_tokens:
+                pieces.append(chunk)
+                continue
+
+            sentences = [
+                (match.start(), match.end())
+                for match in SENTENCE_BOUNDARY_REGEX.finditer(chunk["content"])
+                if match.end() > match.start()
+            ]
+            sentence_tokens = self.count_tokens([chunk["content"][start:end] for start, end in sentences])
+
+            group_start, group_end, group_tokens = None, None, 0
+            for (start, end), count in zip(sentences, sentence_tokens):
+                if group_start is not None and group_tokens + count > self.max_tokens:
+                    pieces.extend(self._hard_split(chunk, group_start, group_end, group_tokens))
+                    group_start, group_tokens = None, 0
+                if group_start is None:
+                    group_start = start
+                group_end = end
+                group_tokens += count
+            if group_start is not None:
+                pieces.extend(self._hard_split(chunk, group_start, group_end, group_tokens))
+        return pieces
+
+    def _hard_split(self, chunk: Dict[str, Any], start: int, end: int, tokens: int) -> List[Dict[str, Any]]:
+        """
+        将 chunk 内容的 [start, end) 区间切成 token 数不超过上限的子块。
+        """
+        if tokens <= self.max_tokens:
+            piece = self._sub_chunk(chunk, start, end)
+            return [piece] if piece["content"] else []
+
+        # 按 token 密度估算每段字符数，再逐段校验
+        step = max(1, (end - start) * self.max_tokens // tokens)
+        result = []
+        position = start
+        while position < end:
+            stop = min(end, position + step)
+            while stop - position > 1 and self.count_tokens([chunk["content"][position:stop]])[0] > self.max_tokens:
+                stop = position + (stop - position) * 3 // 4
+            result.append(self._sub_chunk(chunk, position, stop))
+            position = stop
+        return [piece for piece in result if piece["content"]]
+
+    @staticmethod
+    def _sub_chunk(chunk: Dict[str, Any], start: int, end: int) -> Dict[str, Any]:
+        """
+        截取文本块内容的 [start, end) 区间（去除首尾空白），并同步调整偏移元数据。
+        """
+        raw = chunk["content"][start:end]
+        start += len(raw) - len(raw.lstrip())
+        content = raw.strip()
+        metadata = dict(chunk["metadata"])
+        metadata["length"] = len(content)
+        if "start" in metadata:
+            prefix = chunk["content"][:start]
+            metadata["start"] += start
+            metadata["end"] = metadata["start"] + len(content)
+            metadata["byte_start"] += len(prefix.encode("utf-8"))
+            metadata["byte_end"] = metadata["byte_start"] + len(content.encode("utf-8"))
+        return {"content": content, "metadata": metadata}
+
+    @staticmethod
+    def _merge(pieces: List[Dict[str, Any]], tokens: int, document_text: Optional[str] = None) -> Dict[str, Any]:
+        """
+        合并若干相邻文本块，类型一致时保留原类型，否则记为 mixed。
+        有偏移元数据时从原文切出 [首块 start, 末块 end) 区间，保留块之间的原始分隔符。
+        """
+        if len(pieces) == 1:
+            merged = {"content": pieces[0]["content"], "metadata": dict(pieces[0]["metadata"])}
+        else:
+            first, last = pieces[0]["metadata"], pieces[-1]["metadata"]
+            if "start" in first:
+                content = document_text[first["start"]:last["end"]]
+            else:
+                content = "\n".join(piece["content"] for piece in pieces)
+            types = {piece["metadata"]["type"] for piece in pieces}
+            metadata = dict(first)
+            metadata["length"] = len(content)
+            metadata["type"] = types.pop() if len(types) == 1 else "mixed"
+            for key in ("end", "byte_end"):
+                if key in last:
+                    metadata[key] = last[key]
+            merged = {"content": content, "metadata": metadata}
+        merged["metadata"]["tokens"] = tokens
+        return merged
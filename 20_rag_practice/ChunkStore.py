@@ -0,0 +1,77 @@
+import mmap
+import os
+from typing import Iterator, Sequence
+
+import numpy as np
+
+OFFSETS_FILENAME = "chunks.offsets.npy"
+BLOB_FILENAME = "chunks.bin"
+
+
+class ChunkStore:
+    """
+    紧凑的只读文本块存储：所有文本块按 UTF-8 编码首尾相接写入一个二进制文件，
+    另用一个 uint64 偏移数组记录第 i 个文本块的字节区间 [offsets[i], offsets[i + 1])。
+
+    打开时两个文件都以内存映射方式读取，启动耗时与文本块数量无关，
+    多个工作进程共享操作系统页缓存；按下标访问时才解码对应的文本块。
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: 由 ChunkStore.write 写入的目录
+        """
+        self.directory = directory
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILENAME), mmap_mode="r")
+        self._file = open(os.path.join(directory, BLOB_FILENAME), "rb")
+        # 空文件无法内存映射
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @staticmethod
+    def write(directory: str, chunks: Sequence[str]):
+        """
+        写入文本块存储，先写临时文件再替换，避免中断时留下不一致的文件。
+
+        :param directory: 输出目录
+        :param chunks: 文本块列表
+        """
+        os.makedirs(directory, exist_ok=True)
+        offsets = np.zeros(len(chunks) + 1, dtype=np.uint64)
+        blob_path = os.path.join(directory, BLOB_FILENAME)
+        offsets_path = os.path.join(directory, OFFSETS_FILENAME)
+        with open(blob_path + ".tmp", "wb") as f:
+            position = 0
+            for i, chunk in enumerate(chunks):
+                data = chunk.encode("utf-8")
+                f.write(data)
+                position += len(data)
+                offsets[i + 1] = position
+        with open(offsets_path + ".tmp", "wb") as f:
+            np.save(f, offsets)
+        os.replace(blob_path + ".tmp", blob_path)
+        os.replace(offsets_path + ".tmp", offsets_path)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return all(os.path.exists(os.path.join(directory, name)) for name in (OFFSETS_FILENAME, BLOB_FILENAME))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return self._blob[start:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class DedupIndex:
+    """
+    持久化的 MinHash 去重索引，记录已写入向量数据库的代表块。
+
+    每个代表块保存归一化文本哈希、MinHash 签名及 LSH 分带键，增量索引时新文本块
+    与之比较，历史运行中已索引的页眉页脚、免责声明等重复内容同样会被识别。
+    被合并的重复块及其来源文件名同样记录在索引中，代表块来自历史运行时据此更新其 duplicate_filenames。
+    写入先暂存在当前事务中，向量数据库写入成功后再调用 commit() 落盘。
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: SQLite 数据库文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS representatives (
+                chunk_id TEXT PRIMARY KEY, digest TEXT NOT NULL, signature BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS representatives_digest ON representatives(digest);
+            CREATE TABLE IF NOT EXISTS bands (key BLOB NOT NULL, chunk_id TEXT NOT NULL, PRIMARY KEY (key, chunk_id))
+                WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS bands_chunk_id ON bands(chunk_id);
+            CREATE TABLE IF NOT EXISTS duplicates (
+                chunk_id TEXT PRIMARY KEY, representative TEXT NOT NULL, filename TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS duplicates_representative ON duplicates(representative);
+            CREATE INDEX IF NOT EXISTS duplicates_filename ON duplicates(filename);
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._conn.commit()
+
+    def check_settings(self, settings: str):
+        """
+        签名参数（置换数、分带数、shingle 长度、种子）变化后旧签名不可比较，此时清空索引。
+
+        :param settings: 去重器的签名参数标识
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM settings WHERE key = 'signature'").fetchone()
+            if row is not None and row[0] == settings:
+                return
+            self._clear()
+            self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('signature', ?)", (settings,))
+            self._conn.commit()
+
+    def find_exact(self, digest: str) -> Optional[str]:
+        """
+        :param digest: 归一化文本的哈希
+        :return: 文本完全相同的代表块 ID，不存在时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunk_id FROM representatives WHERE digest = ? ORDER BY chunk_id LIMIT 1", (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def candidates(self, band_keys: Sequence[bytes]) -> Dict[str, np.ndarray]:
+        """
+        :param band_keys: 新文本块的 LSH 分带键
+        :return: 至少一个分带相同的代表块 ID 到其 MinHash 签名的映射
+        """
+        if not band_keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.chunk_id, r.signature FROM representatives r WHERE r.chunk_id IN "
+                f"(SELECT chunk_id FROM bands WHERE key IN ({','.join('?' * len(band_keys))}))",
+                list(band_keys),
+            ).fetchall()
+        return {chunk_id: np.frombuffer(signature, dtype=np.uint64) for chunk_id, signature in rows}
+
+    def add_many(self, entries: Iterable[Tuple[str, str, np.ndarray, Sequence[bytes]]]):
+        """
+        暂存新的代表块，调用 commit() 后才落盘。
+
+        :param entries: (文本块 ID, 归一化文本哈希, MinHash 签名, LSH 分带键) 列表
+        """
+        with self._lock:
+            for chunk_id, digest, signature, band_keys in entries:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO representatives (chunk_id, digest, signature) VALUES (?, ?, ?)",
+                    (chunk_id, digest, np.asarray(signature, dtype=np.uint64).tobytes()),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO bands (key, chunk_id) VALUES (?, ?)", [(key, chunk_id) for key in band_keys]
+                )
+
+    def add_duplicates(self, entries: Iterable[Tuple[str, str, str]]):
+        """
+        暂存被合并的重复块，调用 commit() 后才落盘。
+
+        :param entries: (重复块 ID, 代表块 ID, 重复块来源文件名) 列表
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO duplicates (chunk_id, representative, filename) VALUES (?, ?, ?)", entries
+            )
+
+    def duplicate_filenames(self, representatives: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        :param representatives: 代表块 ID
+        :return: 代表块 ID 到被合并重复块来源文件名列表的映射（同一文件的多个重复块各占一项），
+                 没有重复块的代表块对应空列表
+        """
+        representatives = list(representatives)
+        result: Dict[str, List[str]] = {representative: [] for representative in representatives}
+        with self._lock:
+            for start in range(0, len(representatives), 500):
+                batch = representatives[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT representative, filename FROM duplicates "
+                    f"WHERE representative IN ({','.join('?' * len(batch))}) ORDER BY rowid",
+                    batch,
+                ).fetchall()
+                for representative, filename in rows:
+                    result[representative].append(filename)
+        return result
+
+    def delete(self, chunk_ids: Sequence[str]):
+        """
+        删除代表块及以其为代表的重复块记录，在文本块被删除或重新索引时调用。
+        """
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                batch = list(chunk_ids[start:start + 500])
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM representatives WHERE chunk_id IN ({placeholders})", batch)
+                self._conn.execute(f"DELETE FROM bands WHERE chunk_id IN ({placeholders})", batch)
+                self._conn.execute(
+                    f"DELETE FROM duplicates WHERE representative IN ({placeholders}) "
+                    f"OR chunk_id IN ({placeholders})",
+                    batch + batch,
+                )
+            self._conn.commit()
+
+    def delete_files(self, filenames: Sequence[str]) -> List[str]:
+        """
+        删除来自指定文件的重复块记录，在文件被删除或修改时调用。
+
+        :param filenames: 文件名列表
+        :return: 因此失去重复块的代表块 ID，其 duplicate_filenames 需要更新
+        """
+        representatives = set()
+        with self._lock:
+            for start in range(0, len(filenames), 500):
+                batch = list(filenames[start:start + 500])
+                placeholders = ",".join("?" * len(batch))
+                representatives.update(
+                    representative for representative, in self._conn.execute(
+                        f"SELECT DISTINCT representative FROM duplicates WHERE filename IN ({placeholders})", batch
+                    )
+                )
+                self._conn.execute(f"DELETE FROM duplicates WHERE filename IN ({placeholders})", batch)
+            self._conn.commit()
+        return sorted(representatives)
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._conn.rollback()
+
+    def clear(self):
+        """
+        清空索引，例如向量数据库被删除后需要全量重建时。
+        """
+        with self._lock:
+            self._clear()
+            self._conn.commit()
+
+    def _clear(self):
+        self._conn.executescript("DELETE FROM representatives; DELETE FROM bands; DELETE FROM duplicates;")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM representatives").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
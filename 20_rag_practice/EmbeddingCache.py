@@ -0,0 +1,185 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+# SQLite 内存映射 I/O 大小，读取向量时直接访问页缓存
+DEFAULT_MMAP_SIZE = 1 << 30
+# 命中记录先缓存在内存中，累计到一定数量再批量更新访问时间
+ACCESS_FLUSH_SIZE = 1024
+
+WHITESPACE_REGEX = re.compile(r"\s+")
+
+# rag_app 各版本共用的缓存文件
+EMBEDDING_CACHE_PATH = "rag_app/embedding_cache.sqlite"
+
+
+def embedding_cache_model_name(model_path: str) -> str:
+    """
+    由嵌入模型路径得到缓存键中的模型标识（模型目录名，例如 bge-small-zh-v1.5）。
+    加载同一模型的脚本得到相同标识，向量可以互相命中；更换模型路径后标识随之变化，不会读到旧模型的向量。
+    """
+    return os.path.basename(os.path.normpath(model_path))
+
+
+def normalize_text(text: str) -> str:
+    """
+    归一化文本：Unicode NFKC 规范化、合并连续空白、去除首尾空白。
+    全角/半角、多余空格不同但内容相同的文本会得到相同的缓存键。
+    """
+    return WHITESPACE_REGEX.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    持久化的嵌入向量缓存，键为 (模型标识, 归一化文本哈希)。
+
+    向量以 float32 字节存储在 SQLite 中，开启内存映射 I/O；条目数超过上限时按最近访问时间淘汰。
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 mmap_size: int = DEFAULT_MMAP_SIZE):
+        """
+        :param path: SQLite 数据库文件路径
+        :param model_name: 模型标识，不同模型的向量互不混用
+        :param max_entries: 最多缓存的向量条数
+        :param mmap_size: SQLite 内存映射大小（字节）
+        """
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pending_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        # 条目数的上界估计，只有可能超出容量时才精确计数
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, text: str, variant: str) -> str:
+        payload = f"{self.model_name}\0{variant}\0{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Sequence[str], variant: str = "") -> List[Optional[np.ndarray]]:
+        """
+        批量查询缓存。
+
+        :param texts: 文本列表
+        :param variant: 同一模型的不同编码参数（如是否归一化），作为键的一部分
+        :return: 与 texts 一一对应的向量列表，未命中的位置为 None
+        """
+        keys = [self._key(text, variant) for text in texts]
+        found = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # SQLite 单条语句的参数个数有限，分批查询
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+
+            now = time.time()
+            for key in found:
+                self._pending_access[key] = now
+            if len(self._pending_access) >= ACCESS_FLUSH_SIZE:
+                self._flush_access()
+
+            result = [found.get(key) for key in keys]
+            hit_count = sum(vector is not None for vector in result)
+            self.hits += hit_count
+            self.misses += len(result) - hit_count
+        return result
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray, variant: str = ""):
+        """
+        批量写入缓存，超出容量时淘汰最久未访问的条目。
+
+        :param texts: 文本列表
+        :param vectors: 与 texts 一一对应的向量数组
+        :param variant: 同一模型的不同编码参数，作为键的一部分
+        """
+        if len(texts) == 0:
+            return
+        now = time.time()
+        rows = [
+            (self._key(text, variant), len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector, last_access) VALUES (?, ?, ?, ?)", rows
+            )
+            self._entries += len(rows)
+            self._evict()
+            self._conn.commit()
+
+    def _flush_access(self):
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(access, key) for key, access in self._pending_access.items()],
+            )
+            self._conn.commit()
+            self._pending_access.clear()
+
+    def _evict(self):
+        if self._entries <= self.max_entries:
+            return
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = self._entries - self.max_entries
+        if overflow > 0:
+            self._flush_access()
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._entries -= overflow
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: 命中次数、未命中次数、命中率与当前条目数
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.close()
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 异常退出时同样写回缓存的访问时间，LRU 淘汰不会依据过期的 last_access
+        self.close()
+
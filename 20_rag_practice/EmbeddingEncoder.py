@@ -0,0 +1,72 @@
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from EmbeddingCache import EmbeddingCache
+
+DEFAULT_BATCH_SIZE = 64
+
+
+def encode_texts(
+    embedding_model,
+    texts: List[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    normalize_embeddings: bool = True,
+    show_progress: bool = True,
+    cache: Optional[EmbeddingCache] = None,
+) -> np.ndarray:
+    """
+    批量计算文本嵌入向量。
+
+    文本按长度降序排列后分批送入模型，同一批次内长度相近，减少填充带来的无效计算；
+    结果按原始顺序写回一个连续的 float32 数组。
+
+    :param embedding_model: 预加载的 SentenceTransformer 模型
+    :param texts: 待编码的文本列表
+    :param batch_size: 每批文本数量
+    :param normalize_embeddings: 是否对嵌入向量进行归一化，用于计算余弦相似度
+    :param show_progress: 是否输出编码进度与吞吐量
+    :param cache: 嵌入向量缓存，提供时只对未命中的文本调用模型
+    :return: 形状为 (len(texts), 维度) 的 float32 数组，行顺序与 texts 一致
+    """
+    dimension = embedding_model.get_sentence_embedding_dimension()
+    embeddings = np.empty((len(texts), dimension), dtype=np.float32)
+    if not texts:
+        return embeddings
+
+    pending = list(range(len(texts)))
+    variant = f"normalize={normalize_embeddings}"
+    if cache is not None:
+        cached = cache.get_many(texts, variant)
+        pending = []
+        for i, vector in enumerate(cached):
+            if vector is None:
+                pending.append(i)
+            else:
+                embeddings[i] = vector
+        if show_progress:
+            print(f"嵌入缓存命中 {len(texts) - len(pending)}/{len(texts)} 个文本块")
+
+    order = sorted(pending, key=lambda i: -len(texts[i]))
+    start_time = time.perf_counter()
+    for batch_start in range(0, len(order), batch_size):
+        batch_indices = order[batch_start:batch_start + batch_size]
+        batch_texts = [texts[i] for i in batch_indices]
+        batch_embeddings = embedding_model.encode(
+            batch_texts,
+            batch_size=batch_size,
+            normalize_embeddings=normalize_embeddings,
+            convert_to_numpy=True,
+        )
+        embeddings[batch_indices] = batch_embeddings
+        if cache is not None:
+            cache.put_many(batch_texts, batch_embeddings, variant)
+        if show_progress:
+            done = min(batch_start + batch_size, len(order))
+            elapsed = time.perf_counter() - start_time
+            print(f"\r已编码 {done}/{len(order)} 个文本块, {done / max(elapsed, 1e-9):.1f} 块/秒", end="")
+
+    if show_progress and order:
+        print()
+    return embeddings
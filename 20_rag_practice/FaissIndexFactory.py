@@ -0,0 +1,150 @@
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+# HNSW 图每个节点的邻居数、构建与检索时的候选队列长度
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# IVF-PQ：每个子量化器 2^8 个中心（每个子向量编码为 1 字节），每 2 维一个子量化器，
+# 即每个向量编码为 d/2 字节，为 float32 原始向量的 1/8；默认检索 32 个倒排列表
+IVFPQ_NBITS = 8
+IVFPQ_DIMS_PER_SUBQUANTIZER = 2
+IVFPQ_NPROBE = 32
+# 可选的精确重排（RFlat）：按 PQ 距离取 k * IVFPQ_K_FACTOR 个候选，再用原始向量重排。
+# 需要额外保存全部原始向量，内存反而超过 Flat 索引，因此默认关闭
+IVFPQ_K_FACTOR = 4
+# 每个聚类中心至少需要的训练样本数，低于该值时 faiss 聚类质量明显下降
+IVF_MIN_POINTS_PER_CENTROID = 39
+IVF_MAX_POINTS_PER_CENTROID = 256
+# PQ 码本的每个子量化器有 2^nbits 个中心，同样需要每个中心足够的训练样本
+PQ_MIN_TRAINING_POINTS = IVF_MIN_POINTS_PER_CENTROID << IVFPQ_NBITS
+TRAIN_SAMPLE_SEED = 1234
+
+
+def _ivf_nlist(vector_count: int) -> int:
+    """
+    倒排列表数取约 4 * sqrt(n)，并保证每个聚类中心有足够的训练样本。
+    """
+    nlist = int(4 * math.sqrt(vector_count))
+    return max(1, min(nlist, vector_count // IVF_MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """
+    选取能整除向量维度、且每个子向量不少于 IVFPQ_DIMS_PER_SUBQUANTIZER 维的最大子量化器个数。
+    """
+    for m in range(max(1, dimension // IVFPQ_DIMS_PER_SUBQUANTIZER), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def index_description(index_type: str, vector_count: int, dimension: int, refine: bool = False) -> str:
+    """
+    :param index_type: "flat"（精确检索）、"hnsw"（图索引）或 "ivfpq"（倒排 + 乘积量化）
+    :param vector_count: 向量数量
+    :param dimension: 向量维度
+    :param refine: ivfpq 是否附加原始向量精确重排（RFlat），召回更高但内存超过 Flat
+    :return: faiss.index_factory 的索引描述字符串
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型: {index_type}，可选 {INDEX_TYPES}")
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M},Flat"
+    if index_type == "ivfpq":
+        # PQ 码本训练需要 39 * 2^nbits 个样本；语料不足时精确检索的 Flat 既准确，内存也不大（HNSW 还要额外保存图结构）
+        if vector_count < PQ_MIN_TRAINING_POINTS:
+            logging.info(f"Only {vector_count} vectors (< {PQ_MIN_TRAINING_POINTS}), "
+                         f"falling back to an exact Flat index instead of IVF-PQ")
+            return "Flat"
+        # np：跳过多义（polysemous）训练，检索不使用它，却占据了大部分训练时间
+        description = f"IVF{_ivf_nlist(vector_count)},PQ{_pq_subquantizers(dimension)}x{IVFPQ_NBITS}np"
+        return description + ",RFlat" if refine else description
+    return "Flat"
+
+
+def build_index(embeddings: np.ndarray, index_type: str = "flat", refine: bool = False) -> faiss.Index:
+    """
+    按索引类型创建内积（归一化后即余弦相似度）索引，需要训练的索引先在随机样本上训练，再添加全部向量。
+
+    :param embeddings: 形状为 (n, d) 的 float32 嵌入向量
+    :param index_type: "flat"、"hnsw" 或 "ivfpq"
+    :param refine: ivfpq 是否附加原始向量精确重排（RFlat），默认关闭
+    :return: 已添加全部向量的 FAISS 索引
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    vector_count, dimension = embeddings.shape
+    description = index_description(index_type, vector_count, dimension, refine)
+    index = faiss.index_factory(dimension, description, faiss.METRIC_INNER_PRODUCT)
+
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    if not index.is_trained:
+        ivf = faiss.downcast_index(faiss.extract_index_ivf(index))
+        sample_size = min(vector_count, max(ivf.nlist * IVF_MAX_POINTS_PER_CENTROID, PQ_MIN_TRAINING_POINTS))
+        if isinstance(ivf, faiss.IndexIVFPQ):
+            # 每个子量化器的码本只用 PQ_MIN_TRAINING_POINTS 个残差训练，码本训练耗时不随样本增大
+            ivf.pq.cp.max_points_per_centroid = IVF_MIN_POINTS_PER_CENTROID
+        # 只在随机样本上训练聚类中心与量化码本，训练耗时与语料规模无关
+        rng = np.random.RandomState(TRAIN_SAMPLE_SEED)
+        sample = embeddings[np.sort(rng.choice(vector_count, sample_size, replace=False))]
+        index.train(sample)
+
+    index.add(embeddings)
+    set_search_params(index)
+    logging.info(f"Built FAISS index '{description}' with {index.ntotal} vectors")
+    return index
+
+
+def set_search_params(index: faiss.Index, nprobe: int = IVFPQ_NPROBE, ef_search: int = HNSW_EF_SEARCH,
+                      k_factor: int = IVFPQ_K_FACTOR):
+    """
+    设置检索参数：IVF 检索的倒排列表数 nprobe、HNSW 检索的候选队列长度 efSearch、
+    精确重排（仅开启 RFlat 时）的候选倍数 k_factor。三者越大召回越高、延迟越大；对精确检索的 Flat 索引无影响。
+    """
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = k_factor
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+        return
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+
+
+def save_index(index: faiss.Index, path: str):
+    """
+    将索引写入文件，先写临时文件再替换，避免中断时留下损坏的索引。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_index(path: str, mmap: bool = True, nprobe: int = IVFPQ_NPROBE,
+               ef_search: int = HNSW_EF_SEARCH, k_factor: int = IVFPQ_K_FACTOR) -> faiss.Index:
+    """
+    读取索引文件。mmap 为 True 时以只读方式内存映射，启动时不把向量整体读入内存，
+    多个进程共享操作系统页缓存。
+
+    :param path: 索引文件路径
+    :param mmap: 是否内存映射
+    :param nprobe: IVF 检索的倒排列表数
+    :param ef_search: HNSW 检索的候选队列长度
+    :param k_factor: IVF-PQ 开启精确重排时的候选倍数
+    :return: FAISS 索引
+    """
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(path, flags)
+    set_search_params(index, nprobe, ef_search, k_factor)
+    return index
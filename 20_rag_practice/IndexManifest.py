@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+MANIFEST_VERSION = 1
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_content_hash(file_path: str) -> str:
+    """
+    分块读取文件并计算 SHA-256，避免一次性读入大文件。
+
+    :param file_path: 文件路径
+    :return: 十六进制哈希字符串
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(filename: str, file_hash: str, start: int, end: int) -> str:
+    """
+    由文件内容哈希与文本块字符区间确定性地生成文本块 ID。
+
+    文件名参与前缀计算，使内容相同的两个文件不会产生冲突的 ID。
+
+    :param filename: 文件名
+    :param file_hash: 文件内容哈希
+    :param start: 文本块在文档中的起始字符偏移
+    :param end: 文本块在文档中的结束字符偏移
+    :return: 文本块 ID
+    """
+    prefix = hashlib.sha256(f"{filename}\0{file_hash}".encode("utf-8")).hexdigest()[:16]
+    return f"{prefix}-{start}-{end}"
+
+
+class IndexManifest:
+    """
+    增量索引清单：记录每个文件的内容哈希及其写入向量数据库的文本块 ID。
+
+    清单同时记录影响分块结果的配置，配置变化时所有文件都会被视为已修改。
+    """
+
+    def __init__(self, path: str, settings: Optional[Dict[str, Any]] = None):
+        """
+        :param path: 清单 JSON 文件路径
+        :param settings: 影响分块与嵌入结果的配置（如模型路径、token 上限）
+        """
+        self.path = path
+        self.settings = settings or {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._settings_changed = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION or data.get("settings") != self.settings:
+            logging.info("Index manifest settings changed, all files will be re-indexed")
+            self._settings_changed = True
+        self.files = data.get("files", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "settings": self.settings, "files": self.files},
+                f,
+                ensure_ascii=False,
+            )
+        # 先写临时文件再替换，避免中断时留下损坏的清单
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        """
+        清空清单记录，例如向量数据库被删除后需要全量重建时。
+        """
+        self.files = {}
+
+    def diff(self, file_hashes: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        对比当前文件与清单。
+
+        :param file_hashes: 当前文件名到内容哈希的映射
+        :return: (需要重新索引的文件名列表, 已删除的文件名列表, 需要从向量数据库删除的文本块 ID 列表)
+        """
+        changed = [
+            filename for filename, file_hash in file_hashes.items()
+            if self._settings_changed
+            or filename not in self.files
+            or self.files[filename]["hash"] != file_hash
+        ]
+        removed = [filename for filename in self.files if filename not in file_hashes]
+
+        stale_ids = []
+        for filename in changed + removed:
+            if filename in self.files:
+                stale_ids.extend(self.files[filename]["chunk_ids"])
+
+        # 去重时被合并到其他文件文本块的文件，在代表块被删除后也要重新索引，直到不再扩散
+        stale_set = set(stale_ids)
+        pending = set(changed)
+        while True:
+            dependents = [
+                filename for filename, entry in self.files.items()
+                if filename in file_hashes and filename not in pending
+                and stale_set.intersection(entry.get("depends_on", ()))
+            ]
+            if not dependents:
+                break
+            for filename in dependents:
+                changed.append(filename)
+                pending.add(filename)
+                stale_ids.extend(self.files[filename]["chunk_ids"])
+                stale_set.update(self.files[filename]["chunk_ids"])
+        return changed, removed, stale_ids
+
+    def update(self, filename: str, file_hash: str, chunk_ids: List[str], depends_on: Optional[List[str]] = None):
+        """
+        :param filename: 文件名
+        :param file_hash: 文件内容哈希
+        :param chunk_ids: 该文件写入向量数据库的文本块 ID
+        :param depends_on: 该文件被去重合并到的其他文本块 ID
+        """
+        self.files[filename] = {"hash": file_hash, "chunk_ids": chunk_ids, "depends_on": depends_on or []}
+
+    def remove(self, filename: str):
+        self.files.pop(filename, None)
+
+    def mark_clean(self):
+        """
+        当前配置下的全部文件已重新索引，后续对比不再强制全量。
+        """
+        self._settings_changed = False
@@ -0,0 +1,86 @@
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# 支持的过滤条件：
+#   filename: 文件名，字符串或字符串列表
+#   type: 文本块类型（split_with_metadata 记录的 heading、paragraph 等），字符串或字符串列表
+#   date_from / date_to: 文档日期区间（含端点），YYYYMMDD 格式的整数
+FILTER_KEYS = ("filename", "type", "date_from", "date_to")
+
+
+def file_date(file_path: str) -> int:
+    """
+    以文件修改时间作为文档日期，记录为 YYYYMMDD 格式的整数，便于在 Chroma 中做范围过滤。
+    """
+    return int(time.strftime("%Y%m%d", time.localtime(os.path.getmtime(file_path))))
+
+
+def to_chroma_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    把元数据过滤条件转换为 Chroma 的 where 子句，过滤在向量检索内部完成。
+
+    :param filters: 过滤条件字典，键见 FILTER_KEYS，None 或空字典表示不过滤
+    :return: Chroma where 子句，无过滤条件时返回 None
+    """
+    if not filters:
+        return None
+    _check_filter_keys(filters)
+
+    clauses: List[Dict[str, Any]] = []
+    for key in ("filename", "type"):
+        value = filters.get(key)
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            clauses.append({key: {"$in": list(value)}})
+        else:
+            clauses.append({key: {"$eq": value}})
+    if filters.get("date_from") is not None:
+        clauses.append({"date": {"$gte": int(filters["date_from"])}})
+    if filters.get("date_to") is not None:
+        clauses.append({"date": {"$lte": int(filters["date_to"])}})
+
+    if not clauses:
+        return None
+    # Chroma 要求 $and 至少包含两个条件
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def to_sql_where(filters: Optional[Dict[str, Any]], table: str = "d") -> Tuple[Optional[str], List[Any]]:
+    """
+    把元数据过滤条件转换为 SQL 条件，供 BM25Index 在 SQLite 中按 filename、type、date 列过滤倒排记录。
+
+    :param filters: 过滤条件字典，键见 FILTER_KEYS，None 或空字典表示不过滤
+    :param table: 文档表在查询中的别名
+    :return: (SQL 条件, 参数列表)，无过滤条件时 SQL 条件为 None
+    """
+    if not filters:
+        return None, []
+    _check_filter_keys(filters)
+
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key in ("filename", "type"):
+        value = filters.get(key)
+        if value is None:
+            continue
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        clauses.append(f"{table}.{key} IN ({','.join('?' * len(values))})")
+        params.extend(values)
+    if filters.get("date_from") is not None:
+        clauses.append(f"{table}.date >= ?")
+        params.append(int(filters["date_from"]))
+    if filters.get("date_to") is not None:
+        clauses.append(f"{table}.date <= ?")
+        params.append(int(filters["date_to"]))
+
+    if not clauses:
+        return None, []
+    return " AND ".join(clauses), params
+
+
+def _check_filter_keys(filters: Dict[str, Any]):
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"不支持的过滤条件: {sorted(unknown)}，可选 {FILTER_KEYS}")
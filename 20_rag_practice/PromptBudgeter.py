@@ -0,0 +1,124 @@
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from ChunkPacker import SENTENCE_BOUNDARY_REGEX
+
+PROMPT_HEADER = "根据参考文档回答问题：{query}\n\n"
+CONTEXT_ITEM = "参考文档{index}: \n{chunk}\n\n"
+
+_budgeters = {}
+_budgeters_lock = threading.Lock()
+
+
+class PromptBudgeter:
+    """
+    按 token 预算组装生成阶段的提示词。
+
+    文本块按重排序得分从高到低贪心放入上下文，放不下的第一个文本块在句子边界处截断，
+    只保留能放下的前若干句，其后的文本块全部丢弃。分段计数之和与整段计数可能不同（分词在拼接处合并），
+    因此组装后再对完整提示词计数，超出时继续截断最后一个文本块，保证提示词长度不超过预算，生成耗时与费用可预期。
+    """
+
+    def __init__(self, count_tokens: Callable[[List[str]], List[int]], max_tokens: int):
+        """
+        :param count_tokens: 批量计算 token 数的函数，输入文本列表，返回对应的 token 数列表
+        :param max_tokens: 整个提示词（问题与参考文档）的 token 上限
+        """
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+
+    @classmethod
+    def from_model(cls, model_name: str, max_tokens: int) -> "PromptBudgeter":
+        """
+        使用 dashscope 提供的目标模型分词器计数，与模型实际计费的 token 数一致。
+
+        :param model_name: 大模型名称，例如 qwen-turbo
+        :param max_tokens: 整个提示词的 token 上限
+        :return: PromptBudgeter 实例
+        """
+        # 只在需要真实分词器时导入，使用自定义计数函数时不依赖 dashscope
+        import dashscope
+
+        tokenizer = dashscope.get_tokenizer(model_name)
+
+        def count_tokens(texts: List[str]) -> List[int]:
+            return [len(tokenizer.encode(text)) for text in texts]
+
+        return cls(count_tokens, max_tokens)
+
+    def build(self, query: str, chunks: Sequence[str],
+              scores: Optional[Sequence[float]] = None) -> Tuple[str, int]:
+        """
+        :param query: 查询语句
+        :param chunks: 检索得到的文本块
+        :param scores: 与 chunks 一一对应的重排序得分，None 表示 chunks 已按得分降序排列
+        :return: (提示词, 提示词 token 数)
+        :raises ValueError: 问题本身已超过 token 预算
+        """
+        if scores is not None:
+            order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+            chunks = [chunks[i] for i in order]
+
+        header = PROMPT_HEADER.format(query=query)
+        header_tokens = self.count_tokens([header])[0]
+        if header_tokens > self.max_tokens:
+            raise ValueError(f"问题本身有 {header_tokens} 个 token，超过提示词预算 {self.max_tokens}")
+        remaining = self.max_tokens - header_tokens
+        items = [CONTEXT_ITEM.format(index=i + 1, chunk=chunk) for i, chunk in enumerate(chunks)]
+        # 已放入的 (上下文条目, 文本块序号)
+        context: List[Tuple[str, int]] = []
+        for index, (chunk, tokens) in enumerate(zip(chunks, self.count_tokens(items))):
+            if tokens <= remaining:
+                context.append((items[index], index))
+                remaining -= tokens
+                continue
+            trimmed = self._trim(chunk, index + 1, remaining)
+            if trimmed:
+                context.append((trimmed, index))
+            break
+
+        prompt = header + "".join(item for item, _ in context)
+        tokens = self.count_tokens([prompt])[0]
+        # 整段计数仍超出预算时，按超出量继续截断最后一个文本块，截不出完整句子时整块丢弃
+        while tokens > self.max_tokens and context:
+            item, index = context.pop()
+            item_tokens = self.count_tokens([item])[0]
+            trimmed = self._trim(chunks[index], index + 1, item_tokens - (tokens - self.max_tokens))
+            if trimmed and trimmed != item:
+                context.append((trimmed, index))
+            prompt = header + "".join(item for item, _ in context)
+            tokens = self.count_tokens([prompt])[0]
+        return prompt, tokens
+
+    def _trim(self, chunk: str, index: int, budget: int) -> Optional[str]:
+        """
+        保留文本块开头能放进 budget 的若干完整句子，一句都放不下时返回 None。
+        """
+        overhead = self.count_tokens([CONTEXT_ITEM.format(index=index, chunk="")])[0]
+        sentences = [
+            match.group() for match in SENTENCE_BOUNDARY_REGEX.finditer(chunk) if match.end() > match.start()
+        ]
+        used, kept = overhead, 0
+        for tokens in self.count_tokens(sentences):
+            if used + tokens > budget:
+                break
+            used += tokens
+            kept += 1
+        if not kept:
+            return None
+        return CONTEXT_ITEM.format(index=index, chunk="".join(sentences[:kept]).strip())
+
+
+def get_prompt_budgeter(model_name: str, max_tokens: int) -> PromptBudgeter:
+    """
+    获取进程内共享的提示词预算器，目标模型的分词器只加载一次。
+
+    :param model_name: 大模型名称
+    :param max_tokens: 整个提示词的 token 上限
+    :return: PromptBudgeter 单例
+    """
+    key = (model_name, max_tokens)
+    with _budgeters_lock:
+        if key not in _budgeters:
+            _budgeters[key] = PromptBudgeter.from_model(model_name, max_tokens)
+        return _budgeters[key]
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from EmbeddingCache import EmbeddingCache, normalize_text
+from EmbeddingEncoder import encode_texts
+
+DEFAULT_MAX_ENTRIES = 10_000
+
+
+class QueryEmbeddingCache:
+    """
+    查询嵌入向量的进程内 LRU 缓存，键为模型标识与归一化查询文本。
+
+    可选以 EmbeddingCache（SQLite）作为二级缓存：进程内未命中时先查磁盘，
+    多个工作进程共用同一个数据库文件即可共享已计算的查询向量，都未命中才调用模型。
+    """
+
+    def __init__(self, model_name: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 backend: Optional[EmbeddingCache] = None, normalize_embeddings: bool = True):
+        """
+        :param model_name: 模型标识，换模型后旧向量不会被误用
+        :param max_entries: 进程内最多缓存的查询数
+        :param backend: 跨进程共享的磁盘缓存，None 表示只使用进程内缓存
+        :param normalize_embeddings: 是否对嵌入向量进行归一化
+        """
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.backend = backend
+        self.normalize_embeddings = normalize_embeddings
+        # 与 encode_texts 使用相同的变体标识，磁盘缓存中的条目可与文本块嵌入共用
+        self.variant = f"normalize={normalize_embeddings}"
+        self.memory_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, embedding_model, query: str) -> np.ndarray:
+        """
+        :param embedding_model: 预加载的 SentenceTransformer 模型
+        :param query: 查询语句
+        :return: 查询的嵌入向量
+        """
+        return self.encode_many(embedding_model, [query])[0]
+
+    def encode_many(self, embedding_model, queries: Sequence[str]) -> np.ndarray:
+        """
+        批量获取查询嵌入向量，只有所有缓存都未命中的查询才会一次性送入模型编码。
+
+        :param embedding_model: 预加载的 SentenceTransformer 模型
+        :param queries: 查询语句列表
+        :return: 形状为 (len(queries), 维度) 的 float32 数组
+        """
+        keys = [(self.model_name, normalize_text(query)) for query in queries]
+        vectors: List[Optional[np.ndarray]] = [None] * len(queries)
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[i] = vector
+                    self.memory_hits += 1
+
+        pending = [i for i, vector in enumerate(vectors) if vector is None]
+        if pending and self.backend is not None:
+            stored = self.backend.get_many([queries[i] for i in pending], self.variant)
+            for i, vector in zip(pending, stored):
+                if vector is not None:
+                    vectors[i] = vector
+                    self.backend_hits += 1
+            pending = [i for i in pending if vectors[i] is None]
+
+        if pending:
+            self.misses += len(pending)
+            pending_queries = [queries[i] for i in pending]
+            encoded = encode_texts(
+                embedding_model, pending_queries, normalize_embeddings=self.normalize_embeddings, show_progress=False
+            )
+            if self.backend is not None:
+                self.backend.put_many(pending_queries, encoded, self.variant)
+            for i, vector in zip(pending, encoded):
+                vectors[i] = vector
+
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return np.stack(vectors).astype(np.float32, copy=False)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.backend_hits + self.misses
+        return (self.memory_hits + self.backend_hits) / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: 进程内命中、磁盘命中、未命中次数、命中率与进程内条目数
+        """
+        return {
+            "memory_hits": self.memory_hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "entries": len(self._entries),
+        }
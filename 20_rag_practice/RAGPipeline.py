@@ -0,0 +1,250 @@
+import asyncio
+import os
+import threading
+import time
+from http import HTTPStatus
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import chromadb
+import dashscope
+
+import rag_app_v5 as rag
+from BM25Index import BM25Index
+from JiebaTokenizer import tokenize_query, warm_up_jieba
+from MetadataFilter import to_chroma_where
+from RankFusion import reciprocal_rank_fusion
+from SemanticAnswerCache import answer_scope
+from TopK import top_k_indices
+
+_STREAM_END = object()
+
+
+class RAGPipeline:
+    """
+    基于 asyncio 的流式 RAG 流程，复用 rag_app_v5 的检索、融合、重排序与提示词构建。
+
+    向量检索（查询编码 + Chroma 查询）与 BM25 检索并发执行，两者都返回后立即融合并重排序；
+    大模型的流式输出在后台线程中读取，逐个 token 交给调用方的异步迭代器。
+    阻塞调用都放在线程池中执行，不会阻塞事件循环。
+    """
+
+    def __init__(self, collection, embedding_model, bm25_index, rerank_cache=None, query_embedding_cache=None,
+                 top_k: int = 6, observer: Optional[Callable[[str, float], None]] = None,
+                 stage_limits: Optional[Dict[str, int]] = None, answer_cache=None):
+        """
+        :param collection: Chroma collection
+        :param embedding_model: 预加载的嵌入模型
+        :param bm25_index: 持久化的 BM25 倒排索引
+        :param rerank_cache: 重排序得分缓存
+        :param query_embedding_cache: 查询嵌入向量缓存
+        :param top_k: 默认返回的文本块数
+        :param observer: 各阶段耗时回调 observer(阶段名, 秒)，用于统计指标
+        :param stage_limits: 各阶段（embed、vector、bm25、fetch、rerank、prompt、generate）的最大并发数，未列出的阶段不限制；
+            generate 限制的是同时读取大模型上游流的数量
+        :param answer_cache: 语义答案缓存，相似问题直接返回已生成的答案
+        """
+        self.collection = collection
+        self.embedding_model = embedding_model
+        self.bm25_index = bm25_index
+        self.rerank_cache = rerank_cache
+        self.query_embedding_cache = query_embedding_cache
+        self.top_k = top_k
+        self.observer = observer
+        self.answer_cache = answer_cache
+        self._semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in (stage_limits or {}).items()}
+
+    async def _run(self, stage: str, func, *args):
+        """
+        在线程池中执行阻塞调用，并记录该阶段耗时（含等待并发名额的时间）。
+        """
+        start = time.perf_counter()
+        semaphore = self._semaphores.get(stage)
+        try:
+            if semaphore is None:
+                return await asyncio.to_thread(func, *args)
+            async with semaphore:
+                return await asyncio.to_thread(func, *args)
+        finally:
+            if self.observer is not None:
+                self.observer(stage, time.perf_counter() - start)
+
+    def _encode_query(self, query: str):
+        if self.query_embedding_cache is not None:
+            return self.query_embedding_cache.encode(self.embedding_model, query)
+        return self.embedding_model.encode(query, normalize_embeddings=True)
+
+    async def retrieve(self, query: str, top_k: Optional[int] = None,
+                       filters=None, query_embedding=None) -> List[Tuple[str, str, float]]:
+        """
+        :param query: 查询语句
+        :param top_k: 返回的文本块数，默认使用构造时的 top_k
+        :param filters: 元数据过滤条件，格式同 rag_app_v5.retrieval_process
+        :param query_embedding: 已计算好的查询向量，None 表示在检索时编码
+        :return: 重排序后的 (文本块 ID, 文本块内容, 重排序得分) 列表
+        """
+        top_k = top_k or self.top_k
+        where = to_chroma_where(filters)
+
+        async def vector_search():
+            embedding = query_embedding
+            if embedding is None:
+                embedding = await self._run("embed", self._encode_query, query)
+            return await self._run(
+                "vector", lambda: self.collection.query(
+                    query_embeddings=[embedding.tolist()], n_results=top_k, where=where
+                )
+            )
+
+        async def bm25_search():
+            # 过滤条件在 BM25 索引的 SQLite 中随倒排表一起完成
+            return await self._run(
+                "bm25", lambda: self.bm25_index.search(tokenize_query(query), top_k, filters=filters)
+            )
+
+        # 两路检索并发执行，BM25 与查询编码、向量检索重叠
+        vector_results, bm25_results = await asyncio.gather(vector_search(), bm25_search())
+
+        vector_ids = vector_results['ids'][0]
+        bm25_ids = [doc_id for doc_id, _ in bm25_results]
+        id_to_doc = dict(zip(vector_ids, vector_results['documents'][0]))
+        missing_ids = [doc_id for doc_id in bm25_ids if doc_id not in id_to_doc]
+        if missing_ids:
+            fetched = await self._run("fetch", lambda: self.collection.get(ids=missing_ids))
+            id_to_doc.update(zip(fetched['ids'], fetched['documents']))
+            # 索引进程先后从 Chroma 与 BM25 删除文本块，两步之间的 BM25 命中可能已不在 Chroma 中，融合前丢弃
+            bm25_ids = [doc_id for doc_id in bm25_ids if doc_id in id_to_doc]
+
+        fused_ids = [
+            chunk_id for chunk_id, _ in
+            reciprocal_rank_fusion([vector_ids, bm25_ids], limit=max(rag.FUSION_CANDIDATES, top_k))
+        ]
+        fused_chunks = [id_to_doc[chunk_id] for chunk_id in fused_ids]
+        scores = (await self._run(
+            "rerank", rag.rerank_scores, [query], [fused_chunks], [fused_ids], self.rerank_cache
+        ))[0]
+        return [(fused_ids[i], fused_chunks[i], float(scores[i])) for i in top_k_indices(scores, top_k)]
+
+    async def answer_stream(self, query: str, top_k: Optional[int] = None, filters=None) -> AsyncIterator[str]:
+        """
+        检索完成后立即开始生成，以异步迭代器的形式逐个返回大模型输出的 token。
+
+        :param query: 查询语句
+        :param top_k: 送入提示词的文本块数
+        :param filters: 元数据过滤条件
+        """
+        query_embedding = None
+        if self.answer_cache is not None:
+            query_embedding = await self._run("embed", self._encode_query, query)
+            scope = answer_scope(top_k or self.top_k, filters)
+            # 查找时可能读取 SQLite 校验引用的文本块，同样放到线程池中执行
+            answer = await self._run("answer_cache", self.answer_cache.lookup, query_embedding, scope)
+            if answer is not None:
+                yield answer
+                return
+
+        results = await self.retrieve(query, top_k, filters, query_embedding)
+        # 提示词按 token 预算组装，长文本块不会撑爆模型上下文
+        prompt, _ = await self._run(
+            "prompt", rag.build_prompt, query, [chunk for _, chunk, _ in results], [score for _, _, score in results]
+        )
+        tokens = []
+        async for token in self.stream_generation(prompt):
+            tokens.append(token)
+            yield token
+        # 只缓存完整生成的答案，调用方提前停止或生成出错时不会执行到这里
+        if self.answer_cache is not None:
+            self.answer_cache.put(query_embedding, "".join(tokens), [chunk_id for chunk_id, _, _ in results], scope)
+
+    async def stream_generation(self, prompt: str) -> AsyncIterator[str]:
+        """
+        dashscope 的流式接口是同步生成器，在后台线程中读取，通过 asyncio.Queue 转交给事件循环。
+        generate 阶段的并发名额只在后台线程读取上游期间占用，读完即释放，不受下游客户端读取速度影响。
+
+        :param prompt: 完整的提示词
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        # 调用方提前停止迭代（例如客户端断开）时通知后台线程停止读取
+        stopped = threading.Event()
+        start = time.perf_counter()
+
+        def produce():
+            try:
+                dashscope.api_key = rag.QWEN_API_KEY
+                responses = dashscope.Generation.call(
+                    model=rag.QWEN_MODEL,
+                    messages=[{'role': 'user', 'content': prompt}],
+                    result_format='message',
+                    stream=True,
+                    incremental_output=True,
+                )
+                for response in responses:
+                    if stopped.is_set():
+                        return
+                    if response.status_code != HTTPStatus.OK:
+                        raise RuntimeError(f"请求失败: {response.status_code} - {response.message}")
+                    loop.call_soon_threadsafe(queue.put_nowait, response.output.choices[0]['message']['content'])
+                loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        semaphore = self._semaphores.get("generate")
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            producer = loop.run_in_executor(None, produce)
+        except BaseException:
+            if semaphore is not None:
+                semaphore.release()
+            raise
+        if semaphore is not None:
+            producer.add_done_callback(lambda _: semaphore.release())
+        first_token = True
+        # 后台线程已放入结束标记或异常，随即返回
+        producer_finished = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    producer_finished = True
+                    break
+                if isinstance(item, Exception):
+                    producer_finished = True
+                    raise item
+                if first_token and self.observer is not None:
+                    self.observer("first_token", time.perf_counter() - start)
+                first_token = False
+                yield item
+        finally:
+            stopped.set()
+            if producer_finished:
+                # 等待后台线程返回，线程池线程在本次迭代结束前释放
+                await producer
+            elif not producer.cancel():
+                # 后台线程正阻塞在读取下一个响应上，读到后检查 stopped 即退出；取回结果避免未处理异常告警
+                producer.add_done_callback(lambda future: future.exception())
+            if self.observer is not None:
+                self.observer("generate", time.perf_counter() - start)
+
+
+async def main():
+    # 使用 rag_app_v5 已建好的向量数据库与 BM25 索引
+    warm_up_jieba()
+    client = chromadb.PersistentClient(path=os.path.abspath("rag_app/chroma_db"))
+    pipeline = RAGPipeline(
+        client.get_or_create_collection(name="documents"),
+        rag.load_embedding_model(),
+        BM25Index(os.path.abspath(rag.BM25_INDEX_PATH)),
+    )
+    query = "下面报告中涉及了哪几个行业的案例以及总结各自面临的挑战？"
+    start = time.perf_counter()
+    first_token_time = None
+    async for token in pipeline.answer_stream(query):
+        if first_token_time is None:
+            first_token_time = time.perf_counter() - start
+        print(token, end="", flush=True)
+    print(f"\n首个 token 耗时: {first_token_time}s，总耗时: {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+# RRF 论文（Cormack et al., 2009）推荐的平滑常数
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[Sequence[Hashable]], k: int = DEFAULT_RRF_K,
+                           weights: Optional[Sequence[float]] = None,
+                           limit: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+    """
+    倒数排名融合（RRF）：按文本块 ID 合并多路检索结果，score = Σ weight / (k + rank)。
+
+    只依赖名次，不需要对向量距离与 BM25 得分做量纲对齐；同一 ID 在多路结果中出现时得分累加，
+    因而自然完成去重，两路检索都命中的文本块排名更靠前。
+
+    :param ranked_lists: 每路检索按相关性降序排列的文本块 ID 列表
+    :param k: 平滑常数，越大则名次差异的影响越小
+    :param weights: 每路检索的权重，默认均为 1
+    :param limit: 最多返回的候选数，None 表示全部返回
+    :return: (文本块 ID, 融合得分) 列表，按得分降序；得分相同时按首次出现的顺序
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranked_ids, weight in zip(ranked_lists, weights):
+        for rank, chunk_id in enumerate(ranked_ids, start=1):
+            scores[chunk_id] += weight / (k + rank)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused[:limit] if limit is not None else fused
+
+
+def weighted_score_fusion(scored_lists: Sequence[Sequence[Tuple[Hashable, float]]],
+                          weights: Optional[Sequence[float]] = None,
+                          limit: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+    """
+    加权得分融合：每路得分先做 min-max 归一化到 [0, 1]，再按权重相加。
+
+    向量检索返回距离时需先转换为“越大越相关”的相似度再传入。
+
+    :param scored_lists: 每路检索的 (文本块 ID, 得分) 列表
+    :param weights: 每路检索的权重，默认均为 1
+    :param limit: 最多返回的候选数，None 表示全部返回
+    :return: (文本块 ID, 融合得分) 列表，按得分降序
+    """
+    weights = weights or [1.0] * len(scored_lists)
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for scored_ids, weight in zip(scored_lists, weights):
+        if not scored_ids:
+            continue
+        values = [score for _, score in scored_ids]
+        low, high = min(values), max(values)
+        for chunk_id, score in scored_ids:
+            # 同一路得分全部相同时视为同等相关
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            scores[chunk_id] += weight * normalized
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused[:limit] if limit is not None else fused
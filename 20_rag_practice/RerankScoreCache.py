@@ -0,0 +1,129 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from EmbeddingCache import normalize_text
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+def content_digests(chunks: Optional[Sequence[str]], count: int) -> List[Optional[bytes]]:
+    """
+    :return: 文本块内容的哈希列表，未提供内容时为 count 个 None
+    """
+    if chunks is None:
+        return [None] * count
+    return [hashlib.blake2b(chunk.encode("utf-8"), digest_size=16).digest() for chunk in chunks]
+
+
+class RerankScoreCache:
+    """
+    重排序得分缓存：以（归一化查询文本, 文本块 ID）为键缓存交叉编码器的归一化得分。
+
+    容量有上限，按最近访问淘汰（LRU），条目超过 TTL 后失效；文本块重新索引时
+    通过 invalidate() 删除该文本块的全部缓存得分。读写时传入文本块内容的，条目同时记录内容哈希，
+    内容不一致即视为未命中，由其他进程（例如单独运行的增量索引）改写的文本块不会读到旧得分。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        """
+        :param max_entries: 最多缓存的得分条数
+        :param ttl_seconds: 条目有效期（秒），None 表示不过期
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # 键 -> (得分, 写入时间, 文本块内容哈希)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, float, Optional[bytes]]]" = OrderedDict()
+        # 文本块 ID 到其缓存键的反向索引，用于按文本块失效
+        self._keys_by_chunk: Dict[str, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, query: str, chunk_ids: Sequence[str],
+                 chunks: Optional[Sequence[str]] = None) -> List[Optional[float]]:
+        """
+        :param query: 查询语句
+        :param chunk_ids: 文本块 ID 列表
+        :param chunks: 与 chunk_ids 一一对应的文本块内容，提供时校验内容哈希
+        :return: 与 chunk_ids 一一对应的得分，未命中、已过期或内容已变化为 None
+        """
+        normalized_query = normalize_text(query)
+        digests = content_digests(chunks, len(chunk_ids))
+        now = time.monotonic()
+        results: List[Optional[float]] = []
+        with self._lock:
+            for chunk_id, digest in zip(chunk_ids, digests):
+                key = (normalized_query, chunk_id)
+                entry = self._entries.get(key)
+                if entry is not None and (
+                    (self.ttl_seconds is not None and now - entry[1] > self.ttl_seconds)
+                    or (digest is not None and entry[2] != digest)
+                ):
+                    self._remove(key)
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    results.append(entry[0])
+        return results
+
+    def put_many(self, query: str, chunk_ids: Sequence[str], scores: Sequence[float],
+                 chunks: Optional[Sequence[str]] = None):
+        """
+        :param query: 查询语句
+        :param chunk_ids: 文本块 ID 列表
+        :param scores: 与 chunk_ids 一一对应的归一化得分
+        :param chunks: 与 chunk_ids 一一对应的文本块内容，提供时记录内容哈希
+        """
+        normalized_query = normalize_text(query)
+        digests = content_digests(chunks, len(chunk_ids))
+        now = time.monotonic()
+        with self._lock:
+            for chunk_id, score, digest in zip(chunk_ids, scores, digests):
+                key = (normalized_query, chunk_id)
+                self._entries[key] = (float(score), now, digest)
+                self._entries.move_to_end(key)
+                self._keys_by_chunk.setdefault(chunk_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, chunk_ids: Iterable[str]):
+        """
+        删除指定文本块的全部缓存得分，在文本块被删除或重新索引时调用。
+        """
+        with self._lock:
+            for chunk_id in chunk_ids:
+                for key in self._keys_by_chunk.pop(chunk_id, ()):
+                    self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_chunk.clear()
+
+    def _remove(self, key: Tuple[str, str]):
+        self._entries.pop(key, None)
+        keys = self._keys_by_chunk.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_chunk[key[1]]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: 命中次数、未命中次数、命中率与当前条目数
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "entries": len(self._entries)}
@@ -0,0 +1,132 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Sequence, Tuple
+
+from FlagEmbedding import FlagReranker # 用于对嵌入结果进行重新排序的工具类
+
+DEFAULT_RERANKER_MODEL = "BAAI/bge-reranker-v2-m3"
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+
+
+class RerankerService:
+    """
+    常驻的重排序服务：模型只加载一次，并发查询的 [query, chunk] 对合并为一次前向计算。
+
+    调用方通过 score() 提交请求后阻塞等待结果；后台线程从队列中收集请求，
+    凑满 max_batch_size 个文本对或等待超过 max_wait_ms 后统一打分再分发结果。
+    """
+
+    def __init__(self, model, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS):
+        """
+        :param model: 提供 compute_score(pairs, normalize=True) 的重排序模型，例如 FlagReranker
+        :param max_batch_size: 单次前向计算的最大文本对数量
+        :param max_wait_ms: 收到第一个请求后等待更多请求的最长时间（毫秒）
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.pairs = 0
+        self._requests: "queue.Queue[Tuple[List[List[str]], Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="reranker-service", daemon=True)
+        self._worker.start()
+
+    def score(self, query: str, chunks: Sequence[str]) -> List[float]:
+        """
+        :param query: 查询语句
+        :param chunks: 候选文本块
+        :return: 与 chunks 一一对应的归一化相关性得分
+        """
+        return self.score_many([(query, chunks)])[0]
+
+    def score_many(self, requests: Sequence[Tuple[str, Sequence[str]]]) -> List[List[float]]:
+        """
+        一次提交多条查询的候选文本块，由后台线程合并为尽量少的前向计算。
+
+        :param requests: (查询语句, 候选文本块列表) 列表
+        :return: 每条查询与其候选文本块一一对应的归一化得分
+        """
+        futures: List[Future] = []
+        for query, chunks in requests:
+            future: Future = Future()
+            if chunks:
+                self._requests.put(([[query, chunk] for chunk in chunks], future))
+            else:
+                future.set_result([])
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _run(self):
+        while True:
+            batch = [self._requests.get()]
+            pair_count = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            # 在等待窗口内继续收集其他查询的请求，直到凑满一批
+            while pair_count < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                pair_count += len(request[0])
+            self._score_batch(batch)
+
+    def _score_batch(self, batch: List[Tuple[List[List[str]], Future]]):
+        all_pairs = [pair for pairs, _ in batch for pair in pairs]
+        try:
+            scores = self.model.compute_score(all_pairs, normalize=True, batch_size=self.max_batch_size)
+        except Exception as e:
+            logging.exception("Reranker batch failed")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        # 只有一个文本对时 compute_score 返回标量
+        if not isinstance(scores, list):
+            scores = [scores]
+        self.batches += 1
+        self.pairs += len(all_pairs)
+        offset = 0
+        for pairs, future in batch:
+            future.set_result(scores[offset:offset + len(pairs)])
+            offset += len(pairs)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "pairs": self.pairs,
+            "avg_batch_size": self.pairs / self.batches if self.batches else 0.0,
+        }
+
+
+_services: Dict[Tuple, RerankerService] = {}
+_services_lock = threading.Lock()
+
+
+def get_reranker_service(model_name: str = DEFAULT_RERANKER_MODEL, use_fp16: bool = True,
+                         max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                         max_wait_ms: float = DEFAULT_MAX_WAIT_MS) -> RerankerService:
+    """
+    获取进程内共享的重排序服务，首次调用时加载模型，之后直接复用。
+
+    :param model_name: 重排序模型名称或本地路径
+    :param use_fp16: 是否使用半精度推理
+    :param max_batch_size: 单次前向计算的最大文本对数量
+    :param max_wait_ms: 合并并发请求的最长等待时间（毫秒）
+    :return: RerankerService 单例
+    """
+    key = (model_name, use_fp16, max_batch_size, max_wait_ms)
+    with _services_lock:
+        if key not in _services:
+            start = time.perf_counter()
+            model = FlagReranker(model_name, use_fp16=use_fp16)
+            logging.info(f"Reranker {model_name} loaded in {time.perf_counter() - start:.2f}s")
+            _services[key] = RerankerService(model, max_batch_size, max_wait_ms)
+        return _services[key]
@@ -0,0 +1,204 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL_SECONDS = 24 * 3600
+# 归一化查询向量的余弦相似度阈值，超过即认为是同一问题的不同说法
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+# 每个作用域的查询向量矩阵初始行数，写满后容量翻倍
+INITIAL_SCOPE_CAPACITY = 64
+
+
+def answer_scope(top_k: Optional[int] = None, filters: Optional[Dict[str, Any]] = None) -> str:
+    """
+    影响答案的检索参数组成的作用域标识，只有作用域相同的条目之间才会相互命中。
+    """
+    return json.dumps({"top_k": top_k, "filters": filters or {}}, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class _ScopeMatrix:
+    """
+    一个作用域内全部条目的查询向量，预分配为固定容量的矩阵，按行原地写入，删除的行放回空闲列表复用。
+    """
+
+    def __init__(self, dimension: int):
+        self.matrix = np.zeros((INITIAL_SCOPE_CAPACITY, dimension), dtype=np.float32)
+        # 每行对应的条目 ID，空闲行为 -1
+        self.entry_ids = np.full(INITIAL_SCOPE_CAPACITY, -1, dtype=np.int64)
+        self.free_rows: List[int] = []
+        # 已使用过的行数，之后的行从未写入
+        self.used = 0
+
+    def add(self, entry_id: int, embedding: np.ndarray) -> int:
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            if self.used == len(self.matrix):
+                self._grow()
+            row = self.used
+            self.used += 1
+        self.matrix[row] = embedding
+        self.entry_ids[row] = entry_id
+        return row
+
+    def remove(self, row: int):
+        self.entry_ids[row] = -1
+        self.free_rows.append(row)
+
+    def __len__(self) -> int:
+        return self.used - len(self.free_rows)
+
+    def similarities(self, query_embedding: np.ndarray) -> np.ndarray:
+        """
+        :return: 与已使用的每一行的相似度，空闲行为负无穷
+        """
+        similarities = self.matrix[:self.used] @ query_embedding
+        similarities[self.entry_ids[:self.used] < 0] = -np.inf
+        return similarities
+
+    def _grow(self):
+        capacity = len(self.matrix) * 2
+        matrix = np.zeros((capacity, self.matrix.shape[1]), dtype=np.float32)
+        matrix[:self.used] = self.matrix[:self.used]
+        entry_ids = np.full(capacity, -1, dtype=np.int64)
+        entry_ids[:self.used] = self.entry_ids[:self.used]
+        self.matrix, self.entry_ids = matrix, entry_ids
+
+
+class SemanticAnswerCache:
+    """
+    语义答案缓存：以查询嵌入向量为键缓存大模型生成的答案。
+
+    新查询与已缓存查询的余弦相似度超过阈值时直接返回已有答案，跳过检索与生成。
+    容量有上限，按最近访问淘汰（LRU），条目超过 TTL 后失效；答案引用的任一文本块
+    重新索引时，通过 invalidate() 删除所有引用了该文本块的答案。索引由其他进程构建时，
+    本进程收不到 invalidate()，此时传入 chunks_exist，命中前确认答案引用的文本块仍在索引中。
+    """
+
+    def __init__(self, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+                 chunks_exist: Optional[Callable[[Sequence[str]], bool]] = None):
+        """
+        :param similarity_threshold: 命中所需的最小余弦相似度，查询向量需已归一化
+        :param max_entries: 最多缓存的答案数
+        :param ttl_seconds: 条目有效期（秒），None 表示不过期
+        :param chunks_exist: 判断文本块是否全部仍在索引中的函数，例如 BM25Index.contains_all；
+            文本块内容变化后 ID 随之变化，旧 ID 被删除，引用它的答案即失效
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.chunks_exist = chunks_exist
+        self.hits = 0
+        self.misses = 0
+        self._next_id = 0
+        # 条目 ID -> (作用域, 矩阵行号, 答案, 引用的文本块 ID, 写入时间)
+        self._entries: "OrderedDict[int, Tuple[str, int, str, Tuple[str, ...], float]]" = OrderedDict()
+        # 文本块 ID 到引用它的条目 ID 的反向索引，用于按文本块失效
+        self._entries_by_chunk: Dict[str, Set[int]] = {}
+        # 按作用域存放的查询向量矩阵
+        self._scopes: Dict[str, _ScopeMatrix] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, query_embedding: np.ndarray, scope: str = "") -> Optional[str]:
+        """
+        :param query_embedding: 归一化的查询嵌入向量
+        :param scope: 作用域标识，见 answer_scope()
+        :return: 最相似且超过阈值的已缓存答案，未命中返回 None
+        """
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        now = time.monotonic()
+        with self._lock:
+            scope_matrix = self._scopes.get(scope)
+            while scope_matrix is not None and len(scope_matrix):
+                # 一次矩阵向量乘法算出与该作用域全部条目的相似度
+                similarities = scope_matrix.similarities(query_embedding)
+                best = int(np.argmax(similarities))
+                if similarities[best] < self.similarity_threshold:
+                    break
+                entry_id = int(scope_matrix.entry_ids[best])
+                entry = self._entries[entry_id]
+                if (self.ttl_seconds is not None and now - entry[4] > self.ttl_seconds) or (
+                    self.chunks_exist is not None and not self.chunks_exist(entry[3])
+                ):
+                    # 最相似的条目已过期或引用的文本块已被重新索引，删除后继续查找次相似的条目
+                    self._remove(entry_id)
+                    scope_matrix = self._scopes.get(scope)
+                    continue
+                self.hits += 1
+                self._entries.move_to_end(entry_id)
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, query_embedding: np.ndarray, answer: str, chunk_ids: Sequence[str], scope: str = ""):
+        """
+        :param query_embedding: 归一化的查询嵌入向量
+        :param answer: 生成的答案
+        :param chunk_ids: 生成答案时引用的文本块 ID
+        :param scope: 作用域标识，见 answer_scope()
+        """
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            scope_matrix = self._scopes.get(scope)
+            if scope_matrix is None:
+                scope_matrix = self._scopes[scope] = _ScopeMatrix(len(query_embedding))
+            row = scope_matrix.add(entry_id, query_embedding)
+            self._entries[entry_id] = (scope, row, answer, tuple(chunk_ids), time.monotonic())
+            for chunk_id in chunk_ids:
+                self._entries_by_chunk.setdefault(chunk_id, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, chunk_ids: Iterable[str]):
+        """
+        删除引用了指定文本块的全部答案，在文本块被删除或重新索引时调用。
+        """
+        with self._lock:
+            for chunk_id in chunk_ids:
+                for entry_id in list(self._entries_by_chunk.get(chunk_id, ())):
+                    self._remove(entry_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._entries_by_chunk.clear()
+            self._scopes.clear()
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        scope_matrix = self._scopes[entry[0]]
+        scope_matrix.remove(entry[1])
+        if not len(scope_matrix):
+            del self._scopes[entry[0]]
+        for chunk_id in entry[3]:
+            entry_ids = self._entries_by_chunk.get(chunk_id)
+            if entry_ids is not None:
+                entry_ids.discard(entry_id)
+                if not entry_ids:
+                    del self._entries_by_chunk[chunk_id]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: 命中次数、未命中次数、命中率与当前条目数
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "entries": len(self._entries)}
@@ -0,0 +1,197 @@
+from collections import Counter
+from typing import Collection, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from BM25Index import BM25Index, DEFAULT_B, DEFAULT_EPSILON, DEFAULT_K1
+from TopK import top_k_indices
+
+# 缓存的候选掩码个数上限，每个掩码占用 文档数 字节
+MAX_CACHED_MASKS = 64
+
+
+class SparseBM25:
+    """
+    基于 CSR 稀疏矩阵的向量化 BM25 打分器。
+
+    构建时把每个 (词, 文档) 的完整 BM25 权重（IDF 与文档长度归一化都已计入）预先算好，
+    存为 词 × 文档 的 CSR 矩阵。单条查询只需切出查询词对应的行再求一次加权和，
+    多条查询合并为一次稀疏矩阵乘法。打分公式与 rank_bm25.BM25Okapi 相同；
+    search 与 search_batch 和 BM25Index.search 一样，只返回至少包含一个查询词的文档。
+    """
+
+    def __init__(self, tokenized_corpus: Sequence[Sequence[str]], doc_ids: Optional[Sequence[str]] = None,
+                 k1: float = DEFAULT_K1, b: float = DEFAULT_B, epsilon: float = DEFAULT_EPSILON):
+        """
+        :param tokenized_corpus: 分词后的文档列表
+        :param doc_ids: 与文档一一对应的 ID，默认使用文档下标
+        :param k1: 词频饱和参数
+        :param b: 文档长度归一化参数
+        :param epsilon: 负 IDF 的下限系数
+        """
+        vocabulary: Dict[str, int] = {}
+        rows, cols, tfs = [], [], []
+        doc_lengths = np.empty(len(tokenized_corpus), dtype=np.float64)
+        for doc_index, tokens in enumerate(tokenized_corpus):
+            doc_lengths[doc_index] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                rows.append(vocabulary.setdefault(term, len(vocabulary)))
+                cols.append(doc_index)
+                tfs.append(tf)
+        doc_ids = list(doc_ids) if doc_ids is not None else list(range(len(tokenized_corpus)))
+        self._build(vocabulary, doc_ids, doc_lengths, rows, cols, tfs, k1, b, epsilon)
+
+    @classmethod
+    def from_index(cls, bm25_index: BM25Index) -> "SparseBM25":
+        """
+        从持久化的 BM25Index 一次性读出倒排表构建稀疏矩阵，无需重新分词。
+
+        :param bm25_index: 已建好的 BM25 倒排索引
+        :return: 参数与该索引相同的 SparseBM25
+        """
+        doc_ids, doc_lengths, postings = bm25_index.export()
+        doc_positions = {doc_id: position for position, doc_id in enumerate(doc_ids)}
+        vocabulary: Dict[str, int] = {}
+        rows, cols, tfs = [], [], []
+        for term, doc_id, tf in postings:
+            rows.append(vocabulary.setdefault(term, len(vocabulary)))
+            cols.append(doc_positions[doc_id])
+            tfs.append(tf)
+        engine = cls.__new__(cls)
+        engine._build(vocabulary, doc_ids, np.asarray(doc_lengths, dtype=np.float64), rows, cols, tfs,
+                      bm25_index.k1, bm25_index.b, bm25_index.epsilon)
+        return engine
+
+    def _build(self, vocabulary, doc_ids, doc_lengths, rows, cols, tfs, k1, b, epsilon):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocabulary = vocabulary
+        self.doc_ids = doc_ids
+        self.corpus_size = len(doc_ids)
+        self.avgdl = float(doc_lengths.mean()) if self.corpus_size else 0.0
+
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.float64)
+
+        # 文档频率即每个词出现的文档数
+        doc_freqs = np.bincount(rows, minlength=len(vocabulary)).astype(np.float64)
+        idf = np.log(self.corpus_size - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        self.average_idf = float(idf.mean()) if len(idf) else 0.0
+        idf[idf < 0] = epsilon * self.average_idf
+        self.idf = idf
+
+        # 每个文档的长度归一化项只与文档有关，预先计算一次
+        if self.corpus_size:
+            self.doc_norms = k1 * (1 - b + b * doc_lengths / self.avgdl)
+        else:
+            self.doc_norms = doc_lengths
+        weights = idf[rows] * tfs * (k1 + 1) / (tfs + self.doc_norms[cols])
+        self.matrix = sparse.csr_matrix(
+            (weights, (rows, cols)), shape=(len(vocabulary), self.corpus_size), dtype=np.float64
+        )
+        # 与 matrix 结构相同、值全为 1 的矩阵，用于判断文档是否包含查询词（得分可能恰好为 0）
+        self.presence = self.matrix.copy()
+        self.presence.data[:] = 1.0
+        # 不可变候选集合（例如 BM25Index.filter_ids 的结果）到掩码的缓存
+        self._masks: Dict[FrozenSet[str], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.corpus_size
+
+    def _query_terms(self, query_tokens: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        counts = Counter(token for token in query_tokens if token in self.vocabulary)
+        term_indices = np.fromiter((self.vocabulary[term] for term in counts), dtype=np.int64, count=len(counts))
+        term_counts = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        return term_indices, term_counts
+
+    def get_scores(self, query_tokens: Sequence[str]) -> np.ndarray:
+        """
+        :param query_tokens: 查询分词结果，重复的词会重复计分（与 BM25Okapi 一致）
+        :return: 长度为文档数的得分数组
+        """
+        term_indices, term_counts = self._query_terms(query_tokens)
+        if not len(term_indices):
+            return np.zeros(self.corpus_size)
+        # 切出查询词所在的行，按词频加权后求和
+        return self.matrix[term_indices].T.dot(term_counts)
+
+    def get_batch_scores(self, queries: Sequence[Sequence[str]]) -> np.ndarray:
+        """
+        多条查询一次稀疏矩阵乘法完成打分。
+
+        :param queries: 查询分词结果列表
+        :return: 形状为 (查询数, 文档数) 的得分矩阵
+        """
+        return (self._query_matrix(queries) @ self.matrix).toarray()
+
+    def candidate_mask(self, candidate_ids: Collection[str]) -> np.ndarray:
+        """
+        :param candidate_ids: 允许返回的文档 ID，例如满足元数据过滤条件的文本块
+        :return: 长度为文档数的布尔掩码
+        """
+        if isinstance(candidate_ids, frozenset):
+            mask = self._masks.get(candidate_ids)
+            if mask is None:
+                if len(self._masks) >= MAX_CACHED_MASKS:
+                    self._masks.clear()
+                mask = self._masks[candidate_ids] = self._candidate_mask(candidate_ids)
+            return mask
+        return self._candidate_mask(candidate_ids)
+
+    def _candidate_mask(self, candidate_ids: Collection[str]) -> np.ndarray:
+        return np.fromiter((doc_id in candidate_ids for doc_id in self.doc_ids), dtype=bool, count=self.corpus_size)
+
+    def _query_matrix(self, queries: Sequence[Sequence[str]]) -> sparse.csr_matrix:
+        rows, cols, counts = [], [], []
+        for query_index, query_tokens in enumerate(queries):
+            term_indices, term_counts = self._query_terms(query_tokens)
+            rows.extend([query_index] * len(term_indices))
+            cols.extend(term_indices.tolist())
+            counts.extend(term_counts.tolist())
+        return sparse.csr_matrix(
+            (counts, (rows, cols)), shape=(len(queries), len(self.vocabulary)), dtype=np.float64
+        )
+
+    def _top_k(self, scores: np.ndarray, top_k: int, mask: np.ndarray) -> List[Tuple[str, float]]:
+        # 不包含查询词或被过滤的文档得分置为负无穷，不会进入 top-k
+        scores = np.where(mask, scores, -np.inf)
+        return [
+            (self.doc_ids[i], float(scores[i])) for i in top_k_indices(scores, top_k) if scores[i] != -np.inf
+        ]
+
+    def search(self, query_tokens: Sequence[str], top_k: int,
+               candidate_ids: Optional[Collection[str]] = None) -> List[Tuple[str, float]]:
+        """
+        :param query_tokens: 查询分词结果
+        :param top_k: 返回得分最高的前 top_k 个文档
+        :param candidate_ids: 只在这些文档中检索，None 表示不过滤
+        :return: (文档 ID, 得分) 列表，按得分降序
+        """
+        term_indices, term_counts = self._query_terms(query_tokens)
+        mask = np.zeros(self.corpus_size, dtype=bool)
+        if not len(term_indices):
+            return []
+        # 包含任一查询词的文档
+        mask[np.unique(self.matrix[term_indices].indices)] = True
+        if candidate_ids is not None:
+            mask &= self.candidate_mask(candidate_ids)
+        return self._top_k(self.matrix[term_indices].T.dot(term_counts), top_k, mask)
+
+    def search_batch(self, queries: Sequence[Sequence[str]], top_k: int,
+                     candidate_ids: Optional[Collection[str]] = None) -> List[List[Tuple[str, float]]]:
+        """
+        :param queries: 查询分词结果列表
+        :param top_k: 每条查询返回的文档数
+        :param candidate_ids: 所有查询只在这些文档中检索，None 表示不过滤
+        :return: 每条查询的 (文档 ID, 得分) 列表
+        """
+        query_matrix = self._query_matrix(queries)
+        scores = (query_matrix @ self.matrix).toarray()
+        # 查询词计数均为正，乘积非零即表示文档包含至少一个查询词
+        matched = (query_matrix @ self.presence).toarray() > 0
+        if candidate_ids is not None:
+            matched &= self.candidate_mask(candidate_ids)
+        return [self._top_k(row, top_k, mask) for row, mask in zip(scores, matched)]
@@ -1,5 +1,7 @@
+import bisect
+import io
 import regex as re
-from typing import List, Dict
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple, Union
 import logging
 
 # 设置日志
@@ -34,70 +36,67 @@ MAX_HTML_TAG_ATTRIBUTES_LENGTH = 100
 MAX_HTML_TAG_CONTENT_LENGTH = 1000
 LOOKAHEAD_RANGE = 100
 
-# 构建正则表达式
-chunk_regex = re.compile(
-    r"(" +
+# 流式分块参数：每次读取的窗口大小，以及窗口末尾不可信任的尾部长度。
+# 尾部长度必须大于任意分支在一次匹配尝试中能向后探查的最大字符数（表格分支约 4.5k 字符），
+# 否则窗口截断会改变匹配结果
+STREAM_WINDOW_SIZE = 1 << 20
+STREAM_SAFE_TAIL = 16384
+STREAM_CONTEXT_LENGTH = 16
+
+# 构建正则表达式，各分支按优先级排列，名称用于基准测试与分支级性能分析
+CHUNK_REGEX_BRANCHES = [
     # 1. Headings (Setext-style, Markdown, and HTML-style)
-    rf"(?:^(?:[#*=-]{{1,{MAX_HEADING_LENGTH}}}|\w[^\r\n]{{0,{MAX_HEADING_CONTENT_LENGTH}}}\r?\n[-=]{{2,{MAX_HEADING_UNDERLINE_LENGTH}}}|<h[1-6][^>]{{0,{MAX_HTML_HEADING_ATTRIBUTES_LENGTH}}}>)[^\r\n]{{1,{MAX_HEADING_CONTENT_LENGTH}}}(?:</h[1-6]>)?(?:\r?\n|$))"
-    + "|"
-    +
+    ("heading", rf"(?:^(?:[#*=-]{{1,{MAX_HEADING_LENGTH}}}|\w[^\r\n]{{0,{MAX_HEADING_CONTENT_LENGTH}}}\r?\n[-=]{{2,{MAX_HEADING_UNDERLINE_LENGTH}}}|<h[1-6][^>]{{0,{MAX_HTML_HEADING_ATTRIBUTES_LENGTH}}}>)[^\r\n]{{1,{MAX_HEADING_CONTENT_LENGTH}}}(?:</h[1-6]>)?(?:\r?\n|$))"),
     # 2. Citations
-    rf"(?:\[[0-9]+\][^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}})" + "|" +
+    ("citation", rf"(?:\[[0-9]+\][^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}})"),
     # 3. List items (Adjusted to handle indentation correctly)
-    rf"(?:(?:^|\r?\n)[ \t]{{0,3}}(?:[-*+•]|\d{{1,3}}\.\w\.|\[[ xX]\])[ \t]+(?:[^\r\n]{{1,{MAX_LIST_ITEM_LENGTH}}})(?:\r?\n[ \t]{{2,}}(?:[^\r\n]{{1,{MAX_LIST_ITEM_LENGTH}}}))*)"
-    + "|"
-    +
+    ("list_item", rf"(?:(?:^|\r?\n)[ \t]{{0,3}}(?:[-*+•]|\d{{1,3}}\.\w\.|\[[ xX]\])[ \t]+(?:[^\r\n]{{1,{MAX_LIST_ITEM_LENGTH}}})(?:\r?\n[ \t]{{2,}}(?:[^\r\n]{{1,{MAX_LIST_ITEM_LENGTH}}}))*)"),
     # 4. Block quotes (Handles nested quotes without chunking)
-    rf"(?:(?:^>(?:>|\\s{{2,}}){{0,2}}(?:[^\r\n]{{0,{MAX_BLOCKQUOTE_LINE_LENGTH}}})(?:\r?\n[ \t]+[^\r\n]{{0,{MAX_BLOCKQUOTE_LINE_LENGTH}}})*?\r?\n?))"
-    + "|"
-    +
+    ("blockquote", rf"(?:(?:^>(?:>|\\s{{2,}}){{0,2}}(?:[^\r\n]{{0,{MAX_BLOCKQUOTE_LINE_LENGTH}}})(?:\r?\n[ \t]+[^\r\n]{{0,{MAX_BLOCKQUOTE_LINE_LENGTH}}})*?\r?\n?))"),
     # 5. Code blocks
-    rf"(?:(?:^|\r?\n)(?:```|~~~)(?:\w{{0,{MAX_CODE_LANGUAGE_LENGTH}}})?\r?\n[\s\S]{{0,{MAX_CODE_BLOCK_LENGTH}}}?(?:```|~~~)\r?\n?)"
-    + rf"|(?:(?:^|\r?\n)(?: {{4}}|\t)[^\r\n]{{0,{MAX_LIST_ITEM_LENGTH}}}(?:\r?\n(?: {{4}}|\t)[^\r\n]{{0,{MAX_LIST_ITEM_LENGTH}}}){{0,{MAX_INDENTED_CODE_LINES}}}\r?\n?)"
-    + rf"|(?:<pre>(?:<code>)[\s\S]{{0,{MAX_CODE_BLOCK_LENGTH}}}?(?:</code>)?</pre>)"
-    + "|"
-    +
+    ("code_block", (
+        rf"(?:(?:^|\r?\n)(?:```|~~~)(?:\w{{0,{MAX_CODE_LANGUAGE_LENGTH}}})?\r?\n[\s\S]{{0,{MAX_CODE_BLOCK_LENGTH}}}?(?:```|~~~)\r?\n?)"
+        + rf"|(?:(?:^|\r?\n)(?: {{4}}|\t)[^\r\n]{{0,{MAX_LIST_ITEM_LENGTH}}}(?:\r?\n(?: {{4}}|\t)[^\r\n]{{0,{MAX_LIST_ITEM_LENGTH}}}){{0,{MAX_INDENTED_CODE_LINES}}}\r?\n?)"
+        + rf"|(?:<pre>(?:<code>)[\s\S]{{0,{MAX_CODE_BLOCK_LENGTH}}}?(?:</code>)?</pre>)"
+    )),
     # 6. Tables
-    rf"(?:(?:^|\r?\n)\|[^\r\n]{{0,{MAX_TABLE_CELL_LENGTH}}}\|(?:\r?\n\|[-:]{{1,{MAX_TABLE_CELL_LENGTH}}}\|)?(?:\r?\n\|[^\r\n]{{0,{MAX_TABLE_CELL_LENGTH}}}\|){{0,{MAX_TABLE_ROWS}}})"
-    + rf"|<table>[\s\S]{{0,{MAX_HTML_TABLE_LENGTH}}}?</table>"
-    + "|"
-    +
+    ("table", (
+        rf"(?:(?:^|\r?\n)\|[^\r\n]{{0,{MAX_TABLE_CELL_LENGTH}}}\|(?:\r?\n\|[-:]{{1,{MAX_TABLE_CELL_LENGTH}}}\|)?(?:\r?\n\|[^\r\n]{{0,{MAX_TABLE_CELL_LENGTH}}}\|){{0,{MAX_TABLE_ROWS}}})"
+        + rf"|<table>[\s\S]{{0,{MAX_HTML_TABLE_LENGTH}}}?</table>"
+    )),
     # 7. Horizontal rules
-    rf"(?:^(?:[-*_]){{{MIN_HORIZONTAL_RULE_LENGTH},}}\s*$|<hr\s*/?>)" + "|" +
+    ("horizontal_rule", rf"(?:^(?:[-*_]){{{MIN_HORIZONTAL_RULE_LENGTH},}}\s*$|<hr\s*/?>)"),
     # 8. Standalone lines or phrases (Prevent chunking by treating indented lines as part of the same block)
-    rf"(?:^(?:<[a-zA-Z][^>]{{0,{MAX_HTML_TAG_ATTRIBUTES_LENGTH}}}>[^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}})?(?:</[a-zA-Z]+>)?(?:\r?\n|$))"
-    + rf"(?:\r?\n[ \t]+[^\r\n]*)*)"
-    + "|"
-    +
+    ("standalone_line", (
+        rf"(?:^(?:<[a-zA-Z][^>]{{0,{MAX_HTML_TAG_ATTRIBUTES_LENGTH}}}>[^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}})?(?:</[a-zA-Z]+>)?(?:\r?\n|$))"
+        + rf"(?:\r?\n[ \t]+[^\r\n]*)*)"
+    )),
     # 9. Sentences (Allow sentences to include multiple lines if they are indented)
-    rf"(?:[^\r\n]{{1,{MAX_SENTENCE_LENGTH}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}})?(?=\s|$)(?:\r?\n[ \t]+[^\r\n]*)*)"
-    + "|"
-    +
+    ("sentence", rf"(?:[^\r\n]{{1,{MAX_SENTENCE_LENGTH}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}})?(?=\s|$)(?:\r?\n[ \t]+[^\r\n]*)*)"),
     # 10. Quoted text, parentheticals, or bracketed content
-    rf"(?<!\w)\"\"\"[^\"]{{0,{MAX_QUOTED_TEXT_LENGTH}}}\"\"\"(?!\w)"
-    + rf"|(?<!\w)(?:['\"\`])[^\r\n]{{0,{MAX_QUOTED_TEXT_LENGTH}}}\g<1>(?!\w)"
-    + rf"|\([^\r\n()]{0, {MAX_PARENTHETICAL_CONTENT_LENGTH} }(?:\([^\r\n()]{0, {MAX_PARENTHETICAL_CONTENT_LENGTH} }\)[^\r\n()]{0, {MAX_PARENTHETICAL_CONTENT_LENGTH} }){{0,{MAX_NESTED_PARENTHESES}}}\)"
-    + rf"|\[[^\r\n\[\]]{{0,{MAX_PARENTHETICAL_CONTENT_LENGTH}}}(?:\[[^\r\n\[\]]{{0,{MAX_PARENTHETICAL_CONTENT_LENGTH}}}\][^\r\n\[\]]{{0,{MAX_PARENTHETICAL_CONTENT_LENGTH}}}){{0,{MAX_NESTED_PARENTHESES}}}\]"
-    + rf"|\$[^\r\n$]{{0,{MAX_MATH_INLINE_LENGTH}}}\$"
-    + rf"|`[^\r\n`]{{0,{MAX_MATH_INLINE_LENGTH}}}`"
-    + "|"
-    +
+    ("quoted", (
+        rf"(?<!\w)\"\"\"[^\"]{{0,{MAX_QUOTED_TEXT_LENGTH}}}\"\"\"(?!\w)"
+        + rf"|(?<!\w)(?:['\"\`])[^\r\n]{{0,{MAX_QUOTED_TEXT_LENGTH}}}\g<1>(?!\w)"
+        + rf"|\([^\r\n()]{0, {MAX_PARENTHETICAL_CONTENT_LENGTH} }(?:\([^\r\n()]{0, {MAX_PARENTHETICAL_CONTENT_LENGTH} }\)[^\r\n()]{0, {MAX_PARENTHETICAL_CONTENT_LENGTH} }){{0,{MAX_NESTED_PARENTHESES}}}\)"
+        + rf"|\[[^\r\n\[\]]{{0,{MAX_PARENTHETICAL_CONTENT_LENGTH}}}(?:\[[^\r\n\[\]]{{0,{MAX_PARENTHETICAL_CONTENT_LENGTH}}}\][^\r\n\[\]]{{0,{MAX_PARENTHETICAL_CONTENT_LENGTH}}}){{0,{MAX_NESTED_PARENTHESES}}}\]"
+        + rf"|\$[^\r\n$]{{0,{MAX_MATH_INLINE_LENGTH}}}\$"
+        + rf"|`[^\r\n`]{{0,{MAX_MATH_INLINE_LENGTH}}}`"
+    )),
     # 11. Paragraphs (Treats indented lines as part of the same paragraph)
-    rf"(?:(?:^|\r?\n\r?\n)(?:<p>)?(?:(?:[^\r\n]{{1,{MAX_PARAGRAPH_LENGTH}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}})?(?=\s|$))|(?:[^\r\n]{{1,{MAX_PARAGRAPH_LENGTH}}}(?=[\r\n]|$))|(?:[^\r\n]{{1,{MAX_PARAGRAPH_LENGTH}}}(?=[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}}])(?:.{{1,{LOOKAHEAD_RANGE}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}}])(?=\s|$))?))(?:</p>)?(?:\r?\n[ \t]+[^\r\n]*)*)"
-    + "|"
-    +
+    ("paragraph", rf"(?:(?:^|\r?\n\r?\n)(?:<p>)?(?:(?:[^\r\n]{{1,{MAX_PARAGRAPH_LENGTH}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}})?(?=\s|$))|(?:[^\r\n]{{1,{MAX_PARAGRAPH_LENGTH}}}(?=[\r\n]|$))|(?:[^\r\n]{{1,{MAX_PARAGRAPH_LENGTH}}}(?=[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}}])(?:.{{1,{LOOKAHEAD_RANGE}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}}])(?=\s|$))?))(?:</p>)?(?:\r?\n[ \t]+[^\r\n]*)*)"),
     # 12. HTML-like tags and their content
-    rf"(?:<[a-zA-Z][^>]{{0,{MAX_HTML_TAG_ATTRIBUTES_LENGTH}}}(?:>[\s\S]{{0,{MAX_HTML_TAG_CONTENT_LENGTH}}}</[a-zA-Z]+>|\s*/>))"
-    + "|"
-    +
+    ("html_tag", rf"(?:<[a-zA-Z][^>]{{0,{MAX_HTML_TAG_ATTRIBUTES_LENGTH}}}(?:>[\s\S]{{0,{MAX_HTML_TAG_CONTENT_LENGTH}}}</[a-zA-Z]+>|\s*/>))"),
     # 13. LaTeX-style math expressions
-    rf"(?:(?:\$\$[\s\S]{{0,{MAX_MATH_BLOCK_LENGTH}}}?\$\$)|(?:\$[^\$\r\n]{{0,{MAX_MATH_INLINE_LENGTH}}}\$))"
-    + "|"
-    +
+    ("math", rf"(?:(?:\$\$[\s\S]{{0,{MAX_MATH_BLOCK_LENGTH}}}?\$\$)|(?:\$[^\$\r\n]{{0,{MAX_MATH_INLINE_LENGTH}}}\$))"),
     # 14. Fallback for any remaining content (Keep content together if it's indented)
-    rf"(?:(?:[^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}})?(?=\s|$))|(?:[^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}}(?=[\r\n]|$))|(?:[^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}}(?=[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}}])(?:.{{1,{LOOKAHEAD_RANGE}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}}])(?=\s|$))(?:\r?\n[ \t]+[^\r\n]*)?))"
-    + r")",
-    re.MULTILINE | re.UNICODE,
+    ("fallback", rf"(?:(?:[^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}})?(?=\s|$))|(?:[^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}}(?=[\r\n]|$))|(?:[^\r\n]{{1,{MAX_STANDALONE_LINE_LENGTH}}}(?=[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}}])(?:.{{1,{LOOKAHEAD_RANGE}}}(?:[.!?…]|\.\.\.|[\u2026\u2047-\u2049]|\p{{Emoji_Presentation}}\p{{Extended_Pictographic}}])(?=\s|$))(?:\r?\n[ \t]+[^\r\n]*)?))"),
+]
+
+CHUNK_REGEX_FLAGS = re.MULTILINE | re.UNICODE
+
+chunk_regex = re.compile(
+    r"(" + "|".join(pattern for _, pattern in CHUNK_REGEX_BRANCHES) + r")",
+    CHUNK_REGEX_FLAGS,
 )
 
 
@@ -120,24 +119,121 @@ class TextSplitter:
         logging.info(f"Split text into {len(filtered_result)} chunks")
         return filtered_result
 
-    def split_with_metadata(self, text: str) -> List[Dict[str, str]]:
+    def iter_chunks(
+        self,
+        stream_or_text: Union[str, TextIO],
+        window_size: int = STREAM_WINDOW_SIZE,
+    ) -> Iterator[str]:
+        """
+        以流式方式分割文本，按窗口读取输入并逐个产出文本块，输出与 split_text 完全一致。
+
+        只有结束位置距离窗口末尾超过 STREAM_SAFE_TAIL 的匹配才会被确认产出，
+        其余部分作为尾部保留到下一个窗口重新匹配，峰值内存由窗口大小决定。
+
+        :param stream_or_text: 文件对象（需支持 read(size)）或字符串
+        :param window_size: 每次读取的字符数
+        :return: 文本块生成器
+        """
+        stream = io.StringIO(stream_or_text) if isinstance(stream_or_text, str) else stream_or_text
+        # 读取量至少覆盖安全尾部，保证每个窗口都能确认新的匹配
+        read_size = max(window_size, 2 * STREAM_SAFE_TAIL)
+
+        buffer = ""
+        pos = 0  # 下一次匹配在 buffer 中的起始位置，pos 之前保留少量上下文供 ^ 与后行断言使用
+        eof = False
+        count = 0
+
+        while not eof:
+            data = stream.read(read_size)
+            if not data:
+                eof = True
+            buffer += data
+
+            limit = len(buffer) if eof else len(buffer) - STREAM_SAFE_TAIL
+            for match in self.chunk_regex.finditer(buffer, pos):
+                if not eof and match.end() > limit:
+                    break
+                for item in self._match_items(match):
+                    count += 1
+                    yield item
+                pos = match.end()
+            else:
+                # 安全区内再无匹配，这些起始位置在完整文本中同样不会匹配，可以直接跳过
+                pos = max(pos, limit)
+
+            if eof:
+                break
+
+            # 丢弃已处理的前缀，只保留上下文
+            cut = max(pos - STREAM_CONTEXT_LENGTH, 0)
+            buffer = buffer[cut:]
+            pos -= cut
+
+        logging.info(f"Streamed {count} chunks")
+
+    @staticmethod
+    def _match_spans(match) -> List[Tuple[int, int]]:
+        """
+        按 findall 的语义展开单个匹配的全部捕获组，返回去除空白后各文本块在原文中的字符区间。
+
+        :param match: 正则匹配对象
+        :return: (start, end) 区间列表
+        """
+        spans = []
+        for index, group in enumerate(match.groups(), 1):
+            if group:
+                stripped = group.strip()
+                if stripped:
+                    start = match.start(index) + len(group) - len(group.lstrip())
+                    spans.append((start, start + len(stripped)))
+        return spans
+
+    @classmethod
+    def _match_items(cls, match) -> List[str]:
+        """
+        按 findall 的语义展开单个匹配的全部捕获组，并去除空白。
+
+        :param match: 正则匹配对象
+        :return: 该匹配产出的文本块列表
+        """
+        text = match.string
+        return [text[start:end] for start, end in cls._match_spans(match)]
+
+    def split_with_metadata(
+        self, text: str, page_offsets: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
         """
         将输入文本分割成块，并添加元数据。
 
+        元数据中的 start/end 为字符偏移，byte_start/byte_end 为 UTF-8 字节偏移，
+        满足 text[start:end] == content，引用定位时直接切片即可，无需再次搜索原文。
+
         :param text: 要分割的输入文本
+        :param page_offsets: 每一页在 text 中的起始字符偏移（升序），提供时记录文本块所在页码（从 1 开始）
         :return: 包含分割文本和元数据的字典列表
         """
-        chunks = self.split_text(text)
-        return [
-            {
-                "content": chunk,
-                "metadata": {
+        result = []
+        byte_pos = 0
+        char_pos = 0
+        for match in self.chunk_regex.finditer(text):
+            for start, end in self._match_spans(match):
+                # 文本块起点单调不减，增量累计字节偏移
+                byte_pos += len(text[char_pos:start].encode("utf-8"))
+                char_pos = start
+                chunk = text[start:end]
+                metadata = {
                     "length": len(chunk),
-                    "type": self._determine_chunk_type(chunk)
+                    "type": self._determine_chunk_type(chunk),
+                    "start": start,
+                    "end": end,
+                    "byte_start": byte_pos,
+                    "byte_end": byte_pos + len(chunk.encode("utf-8")),
                 }
-            }
-            for chunk in chunks
-        ]
+                if page_offsets:
+                    metadata["page"] = bisect.bisect_right(page_offsets, start)
+                result.append({"content": chunk, "metadata": metadata})
+        logging.info(f"Split text into {len(result)} chunks")
+        return result
 
     @staticmethod
     def _determine_chunk_type(chunk: str) -> str:
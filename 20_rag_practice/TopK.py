@@ -0,0 +1,25 @@
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    用 argpartition 在 O(n) 内选出得分最高的 top_k 个下标，只对候选排序。
+
+    与 sorted(..., reverse=True) 的稳定排序结果一致：得分相同时下标小的在前，
+    第 k 名处的并列得分会全部进入候选，避免 argpartition 任意取舍。
+
+    :param scores: 一维得分数组
+    :param top_k: 返回的个数
+    :return: 按得分降序排列的下标数组
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    n = scores.shape[0]
+    if top_k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < n:
+        kth_score = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+        candidates = np.flatnonzero(scores >= kth_score)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:top_k]]
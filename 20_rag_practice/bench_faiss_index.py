@@ -0,0 +1,106 @@
+"""
+FAISS 索引基准测试：Flat（精确检索基线）、HNSW 与 IVF-PQ 的召回率、延迟与内存对比。
+
+用法:
+    python bench_faiss_index.py                         # 默认 10 万个 512 维向量、1000 条查询
+    python bench_faiss_index.py --vectors 1000000       # 百万级语料
+    python bench_faiss_index.py --nprobe 64 --ef-search 128
+    python bench_faiss_index.py --refine --k-factor 8   # 额外测试带原始向量精确重排（RFlat）的 IVF-PQ
+    python bench_faiss_index.py --min-recall 0.9        # 任一 ANN 索引召回率低于阈值时以非零状态退出
+
+向量为带聚类结构的合成数据并做 L2 归一化，与 bge-small-zh-v1.5 的归一化嵌入一样使用内积检索。
+内存以索引序列化后的大小计（向量编码、倒排列表与图结构），同时给出每个向量的字节数及相对 float32 原始向量的比例。
+"""
+import argparse
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from FaissIndexFactory import HNSW_EF_SEARCH, INDEX_TYPES, IVFPQ_K_FACTOR, IVFPQ_NPROBE, build_index, set_search_params
+
+
+def generate_vectors(count, dimension, clusters, seed=0):
+    """
+    生成围绕若干中心分布的归一化向量，比均匀随机向量更接近真实文本嵌入的分布。
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.randint(clusters, size=count)] + 0.6 * rng.standard_normal((count, dimension)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(found, expected):
+    """
+    :return: 近似检索结果中包含精确 top-k 结果的比例
+    """
+    hits = sum(len(set(row_found) & set(row_expected)) for row_found, row_expected in zip(found, expected))
+    return hits / expected.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS 索引召回率与延迟基准测试")
+    parser.add_argument("--vectors", type=int, default=100_000, help="语料向量数")
+    parser.add_argument("--dimension", type=int, default=512, help="向量维度（bge-small-zh-v1.5 为 512）")
+    parser.add_argument("--queries", type=int, default=1000, help="查询数")
+    parser.add_argument("--clusters", type=int, default=1000, help="合成数据的聚类中心数")
+    parser.add_argument("--top-k", type=int, default=10, help="计算 recall@k 的 k")
+    parser.add_argument("--nprobe", type=int, default=IVFPQ_NPROBE, help="IVF 检索的倒排列表数")
+    parser.add_argument("--ef-search", type=int, default=HNSW_EF_SEARCH, help="HNSW 检索的候选队列长度")
+    parser.add_argument("--refine", action="store_true", help="额外测试带原始向量精确重排（RFlat）的 IVF-PQ")
+    parser.add_argument("--k-factor", type=int, default=IVFPQ_K_FACTOR, help="IVF-PQ 精确重排的候选倍数")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, action="append", help="只测试指定索引，可重复指定")
+    parser.add_argument("--min-recall", type=float, default=None, help="召回率下限，低于该值时以非零状态退出")
+    args = parser.parse_args()
+
+    vectors = generate_vectors(args.vectors + args.queries, args.dimension, args.clusters)
+    corpus, queries = vectors[:args.vectors], vectors[args.vectors:]
+    print(f"语料向量数: {len(corpus)}, 维度: {args.dimension}, 查询数: {len(queries)}, top_k: {args.top_k}")
+
+    # 精确检索结果作为召回率的参照
+    flat = faiss.IndexFlatIP(args.dimension)
+    flat.add(corpus)
+    _, expected = flat.search(queries, args.top_k)
+
+    # (名称, 索引类型, 是否精确重排)
+    variants = [(index_type, index_type, False) for index_type in args.index_type or INDEX_TYPES]
+    if args.refine and any(index_type == "ivfpq" for _, index_type, _ in variants):
+        variants.append(("ivfpq+RFlat", "ivfpq", True))
+    raw_bytes = corpus.nbytes
+
+    print(f"{'索引':<12}{'内存(MB)':>10}{'字节/向量':>10}{'内存比':>8}{'构建(s)':>10}"
+          f"{'批量(ms/q)':>12}{'单条(ms)':>10}{'recall@k':>10}")
+    failed = []
+    for name, index_type, refine in variants:
+        start = time.perf_counter()
+        index = build_index(corpus, index_type, refine)
+        build_time = time.perf_counter() - start
+        set_search_params(index, args.nprobe, args.ef_search, args.k_factor)
+        memory_bytes = faiss.serialize_index(index).nbytes
+
+        start = time.perf_counter()
+        _, found = index.search(queries, args.top_k)
+        batch_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        # 单条查询延迟，对应在线服务逐条检索的场景
+        sample = queries[:min(200, len(queries))]
+        start = time.perf_counter()
+        for query in sample:
+            index.search(query[None, :], args.top_k)
+        single_ms = (time.perf_counter() - start) / len(sample) * 1000
+
+        recall = recall_at_k(found, expected)
+        print(f"{name:<12}{memory_bytes / 1e6:>10.1f}{memory_bytes / len(corpus):>10.0f}"
+              f"{memory_bytes / raw_bytes:>8.2f}{build_time:>10.2f}{batch_ms:>12.3f}{single_ms:>10.3f}{recall:>10.3f}")
+        if args.min_recall is not None and index_type != "flat" and recall < args.min_recall:
+            failed.append(name)
+
+    if failed:
+        print(f"\n召回率低于 {args.min_recall} 的索引: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+TextSplitter 基准测试与分支级性能分析。
+
+用法:
+    python bench_text_splitter.py                      # 各类合成语料的吞吐量（MB/s）
+    python bench_text_splitter.py --profile            # 统计 chunk_regex 各分支的匹配次数与耗时
+    python bench_text_splitter.py --min-mbps 1.0       # 任一语料低于阈值时以非零状态退出，可作为回归门禁
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+
+import regex as re
+
+from TextSplitter import (
+    CHUNK_REGEX_BRANCHES,
+    CHUNK_REGEX_FLAGS,
+    TextSplitter,
+    chunk_regex,
+)
+
+CJK_CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+CJK_PUNCTUATION = "。！？，；："
+
+PROFILE_SIZE_LIMIT = 256 * 1024
+
+
+def _words(rng, count):
+    return " ".join(
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+        for _ in range(count)
+    )
+
+
+def generate_markdown(size, seed=0):
+    """生成包含标题、列表、引用、代码块、表格与公式的 Markdown 文本。"""
+    rng = random.Random(seed)
+    blocks = [
+        lambda: f"# {_words(rng, 4)}\n",
+        lambda: f"{_words(rng, 3)}\n{'=' * rng.randint(3, 20)}\n",
+        lambda: "".join(f"- {_words(rng, rng.randint(3, 12))}\n" for _ in range(rng.randint(2, 6))),
+        lambda: f"> {_words(rng, 15)}\n",
+        lambda: f"```python\n{chr(10).join(_words(rng, 6) for _ in range(rng.randint(2, 10)))}\n```\n",
+        lambda: "| a | b | c |\n|---|---|---|\n" + "".join(f"| {rng.randint(0, 99)} | x | y |\n" for _ in range(5)),
+        lambda: f"{_words(rng, rng.randint(10, 60))}. {_words(rng, 8)}?\n",
+        lambda: f"Inline $x^{rng.randint(1, 9)}$ and `code` and (paren (nested) text) [1].\n",
+        lambda: "\n",
+    ]
+    return _fill(rng, blocks, size)
+
+
+def generate_html(size, seed=0):
+    """生成包含标题、段落、表格与预格式化代码的 HTML 文本。"""
+    rng = random.Random(seed)
+    blocks = [
+        lambda: f"<h2 class=\"title\">{_words(rng, 4)}</h2>\n",
+        lambda: f"<p>{_words(rng, rng.randint(10, 60))}.</p>\n",
+        lambda: "<table>" + "".join(f"<tr><td>{_words(rng, 2)}</td></tr>" for _ in range(5)) + "</table>\n",
+        lambda: f"<pre><code>{_words(rng, 20)}</code></pre>\n",
+        lambda: f"<div id=\"d{rng.randint(0, 999)}\"><span>{_words(rng, 6)}</span></div>\n",
+        lambda: "<hr/>\n",
+    ]
+    return _fill(rng, blocks, size)
+
+
+def generate_cjk(size, seed=0):
+    """生成中文散文：长句、全角标点、少量换行。"""
+    rng = random.Random(seed)
+
+    def sentence():
+        return "".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(8, 80))) + rng.choice(CJK_PUNCTUATION)
+
+    blocks = [
+        lambda: "".join(sentence() for _ in range(rng.randint(2, 8))) + "\n",
+        lambda: "\n",
+    ]
+    return _fill(rng, blocks, size)
+
+
+def generate_pathological(size, seed=0):
+    """生成容易引发大量回溯的输入：无空白长行、未闭合的代码块与标签、深层括号、大量分隔符。"""
+    rng = random.Random(seed)
+    blocks = [
+        lambda: "a" * rng.randint(500, 5000) + "\n",
+        lambda: "```\n" + _words(rng, 300) + "\n",
+        lambda: "<div " + "x" * 200 + "\n",
+        lambda: "(" * 50 + _words(rng, 10) + "\n",
+        lambda: "|" * 300 + "\n",
+        lambda: "$" + "1" * 200 + "\n",
+        lambda: "\"" + _words(rng, 100) + "\n",
+        lambda: " " * 100 + "\n",
+    ]
+    return _fill(rng, blocks, size)
+
+
+def _fill(rng, blocks, size):
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(blocks)()
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:size]
+
+
+CORPORA = {
+    "markdown": generate_markdown,
+    "html": generate_html,
+    "cjk": generate_cjk,
+    "pathological": generate_pathological,
+}
+
+
+def benchmark(splitter, text, repeat):
+    """
+    测量 split_text 的吞吐量。
+
+    :return: (最佳耗时秒数, MB/s, 文本块数量)
+    """
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    best = float("inf")
+    chunk_count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunk_count = len(splitter.split_text(text))
+        best = min(best, time.perf_counter() - start)
+    return best, size_mb / best, chunk_count
+
+
+def profile_branches(text):
+    """
+    将 chunk_regex 的匹配耗时归因到各个命名分支。
+
+    按组合正则的语义重放：在每个尝试位置依次尝试各分支，第一个匹配成功的分支即为该位置的胜出分支，
+    之前失败的分支耗时计为失败尝试。单独编译的分支保留外层捕获组，使分支内的 \\g<1> 语义不变。
+
+    :return: {分支名: 统计字典}
+    """
+    branch_regexes = [
+        (name, re.compile(r"(" + pattern + r")", CHUNK_REGEX_FLAGS))
+        for name, pattern in CHUNK_REGEX_BRANCHES
+    ]
+    stats = defaultdict(lambda: {"wins": 0, "attempts": 0, "time": 0.0, "worst": 0.0})
+
+    def attempt(position):
+        for name, branch_regex in branch_regexes:
+            start = time.perf_counter()
+            match = branch_regex.match(text, position)
+            elapsed = time.perf_counter() - start
+            stat = stats[name]
+            stat["attempts"] += 1
+            stat["time"] += elapsed
+            stat["worst"] = max(stat["worst"], elapsed)
+            if match:
+                stat["wins"] += 1
+                return match
+        return None
+
+    position = 0
+    for match in chunk_regex.finditer(text):
+        # 两个匹配之间的位置上所有分支都失败，同样计入耗时
+        while position < match.start():
+            attempt(position)
+            position += 1
+        attempt(match.start())
+        position = max(match.end(), match.start() + 1)
+    return stats
+
+
+def print_profile(corpus_name, stats):
+    total = sum(stat["time"] for stat in stats.values()) or 1.0
+    print(f"\n[{corpus_name}] 分支级性能分析（按耗时降序）")
+    print(f"{'分支':<18}{'胜出次数':>10}{'尝试次数':>12}{'总耗时(ms)':>14}{'占比':>9}{'单次最长(ms)':>15}")
+    for name, stat in sorted(stats.items(), key=lambda item: item[1]["time"], reverse=True):
+        print(
+            f"{name:<18}{stat['wins']:>10}{stat['attempts']:>12}"
+            f"{stat['time'] * 1000:>14.2f}{stat['time'] / total:>9.1%}{stat['worst'] * 1000:>15.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TextSplitter 基准测试")
+    parser.add_argument("--size-kb", type=int, default=256, help="每类合成语料的大小（KB）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最佳耗时")
+    parser.add_argument("--corpus", choices=sorted(CORPORA), action="append", help="只测试指定语料，可重复指定")
+    parser.add_argument("--profile", action="store_true", help="统计各分支的匹配次数与耗时")
+    parser.add_argument("--min-mbps", type=float, default=None, help="吞吐量下限，低于该值时以非零状态退出")
+    args = parser.parse_args()
+
+    # split_text 每次调用都会输出日志，基准测试时关闭
+    logging.getLogger().setLevel(logging.WARNING)
+
+    splitter = TextSplitter(chunk_regex)
+    names = args.corpus or list(CORPORA)
+    failed = []
+
+    print(f"{'语料':<14}{'大小(MB)':>10}{'耗时(s)':>10}{'MB/s':>10}{'文本块数':>10}")
+    for name in names:
+        text = CORPORA[name](args.size_kb * 1024)
+        elapsed, mbps, chunk_count = benchmark(splitter, text, args.repeat)
+        size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+        print(f"{name:<14}{size_mb:>10.2f}{elapsed:>10.3f}{mbps:>10.2f}{chunk_count:>10}")
+        if args.min_mbps is not None and mbps < args.min_mbps:
+            failed.append(name)
+
+    if args.profile:
+        for name in names:
+            # 分支级重放比组合正则慢得多，限制分析文本大小
+            text = CORPORA[name](min(args.size_kb * 1024, PROFILE_SIZE_LIMIT))
+            print_profile(name, profile_branches(text))
+
+    if failed:
+        print(f"\n吞吐量低于 {args.min_mbps} MB/s 的语料: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 from langchain_community.document_loaders import PyPDFLoader # PDF文档提取
 from langchain_text_splitters import RecursiveCharacterTextSplitter # 文档拆分chunk
 from sentence_transformers import SentenceTransformer # 加载和使用Embedding模型
-import faiss # Faiss向量库
 import numpy as np # 处理嵌入向量数据，用于Faiss向量检索
+from EmbeddingEncoder import encode_texts # 批量计算嵌入向量
+from EmbeddingCache import EmbeddingCache, EMBEDDING_CACHE_PATH, embedding_cache_model_name # 持久化嵌入向量缓存
+from FaissIndexFactory import build_index, read_index, save_index # 按配置创建 Flat / HNSW / IVF-PQ 索引，持久化与内存映射加载
+from ChunkStore import ChunkStore # 内存映射的紧凑文本块存储
 import dashscope #调用Qwen大模型
 from http import HTTPStatus #检查与Qwen模型HTTP请求状态
 
@@ -13,6 +16,13 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false" # 不使用分词并行化操作,
 qwen_model = "qwen-turbo"
 qwen_api_key = "your_api_key"
 
+EMBEDDING_MODEL_PATH = "rag_app/bge-small-zh-v1.5"
+# Faiss索引类型："flat"为精确检索；"hnsw"、"ivfpq"为近似检索，适合百万级文本块，ivfpq内存占用最小
+faiss_index_type = "flat"
+# 持久化Faiss索引与文本块存储的目录，文档变化后删除该目录即可重建索引
+faiss_index_dir = "rag_app/faiss_index_v1"
+FAISS_INDEX_FILENAME = "index.faiss"
+
 def load_embedding_model():
     """
     加载bge-small-zh-v1.5模型
@@ -20,16 +30,18 @@ def load_embedding_model():
     """
     print(f"加载Embedding模型中")
     # SentenceTransformer读取绝对路径下的bge-small-zh-v1.5模型，非下载
-    embedding_model = SentenceTransformer(os.path.abspath('rag_app/bge-small-zh-v1.5'))
+    embedding_model = SentenceTransformer(os.path.abspath(EMBEDDING_MODEL_PATH))
     print(f"bge-small-zh-v1.5模型最大输入长度: {embedding_model.max_seq_length}") 
     return embedding_model
 
 
-def indexing_process(pdf_file, embedding_model):
+def indexing_process(pdf_file, embedding_model, embedding_cache=None, index_dir=None):
     """
     索引流程：加载PDF文件，并将其内容分割成小块，计算这些小块的嵌入向量并将其存储在FAISS向量数据库中。
     :param pdf_file: PDF文件路径
     :param embedding_model: 预加载的嵌入模型
+    :param embedding_cache: 嵌入向量缓存，未变化的文本块直接复用已有向量
+    :param index_dir: 保存Faiss索引与文本块存储的目录，为None时只保存在内存中
     :return: 返回FAISS嵌入向量索引和分割后的文本块原始内容列表
     """
     # PyPDFLoader加载PDF文件，忽略图片提取
@@ -48,29 +60,37 @@ def indexing_process(pdf_file, embedding_model):
     chunks = text_splitter.split_text(pdf_text)
     print(f"分割的文本Chunk数量: {len(chunks)}") 
 
-    # 文本块转化为嵌入向量列表，normalize_embeddings表示对嵌入向量进行归一化，用于准确计算相似度
-    embeddings = []
-    for chunk in chunks:
-        embedding = embedding_model.encode(chunk, normalize_embeddings=True)
-        embeddings.append(embedding)
+    # 文本块按长度排序后分批转化为嵌入向量，normalize_embeddings表示对嵌入向量进行归一化，用于准确计算相似度
+    embeddings_np = encode_texts(embedding_model, chunks, normalize_embeddings=True, cache=embedding_cache)
 
     print("文本块Chunk转化为嵌入向量完成")
 
-    # 将嵌入向量列表转化为numpy数组，FAISS索引操作需要numpy数组输入
-    embeddings_np = np.array(embeddings)
-
-    # 获取嵌入向量的维度（每个向量的长度）
-    dimension = embeddings_np.shape[1]
+    # 按faiss_index_type使用内积（归一化后即余弦相似度）创建索引，需要训练的索引先在随机样本上训练，再添加所有嵌入向量
+    index = build_index(embeddings_np, faiss_index_type)
 
-    # 使用余弦相似度创建FAISS索引
-    index = faiss.IndexFlatIP(dimension)
-    # 将所有的嵌入向量添加到FAISS索引中，后续可以用来进行相似性检索
-    index.add(embeddings_np)
+    if index_dir is not None:
+        # 先删除旧索引文件，再写文本块存储与索引文件，索引文件存在即表示上次索引完整结束
+        index_path = os.path.join(index_dir, FAISS_INDEX_FILENAME)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        ChunkStore.write(index_dir, chunks)
+        save_index(index, index_path)
+        print(f"索引与文本块存储已保存到: {index_dir}")
 
     print("索引过程完成.")
 
     return index, chunks
 
+def load_index(index_dir):
+    """
+    加载持久化的Faiss索引与文本块存储，两者都以内存映射方式读取，无需重新解析文档和计算嵌入向量，多个进程共享页缓存。
+    :param index_dir: indexing_process保存索引的目录
+    :return: 返回Faiss嵌入向量索引和文本块存储（与文本块列表一样按下标读取）
+    """
+    index = read_index(os.path.join(index_dir, FAISS_INDEX_FILENAME))
+    chunks = ChunkStore(index_dir)
+    return index, chunks
+
 def retrieval_process(query, index, chunks, embedding_model, top_k=3):
     """
     检索流程：将用户查询Query转化为嵌入向量，并在Faiss索引中检索最相似的前k个文本块。
@@ -96,6 +116,9 @@ def retrieval_process(query, index, chunks, embedding_model, top_k=3):
     # 输出查询出的top_k个文本块及其相似度得分
     results = []
     for i in range(top_k):
+        # 近似索引的候选不足top_k个时以-1填充
+        if indices[0][i] < 0:
+            break
         # 获取相似文本块的原始内容
         result_chunk = chunks[indices[0][i]]
         print(f"文本块 {i}:\n{result_chunk}") 
@@ -165,17 +188,27 @@ def main():
 
     query="下面报告中涉及了哪几个行业的案例以及总结各自面临的挑战？"
     embedding_model = load_embedding_model()
-
-    # 索引流程：加载PDF文件，分割文本块，计算嵌入向量，存储在FAISS索引中（内存）
-    index, chunks = indexing_process('test_lesson2.pdf', embedding_model)
-
-    # 检索流程：将用户查询转化为嵌入向量，检索最相似的文本块
-    retrieval_chunks = retrieval_process(query, index, chunks, embedding_model)
-
-    # 生成流程：调用Qwen大模型生成响应
-    generate_process(query, retrieval_chunks)
-
-    print("RAG过程结束.")
+    # 嵌入向量缓存：以模型标识与归一化文本为键，重复运行时未变化的文本块不再重新编码
+    # 缓存键中的模型标识由实际加载的模型路径得到，更换模型后不会读到旧模型的向量
+    embedding_model_name = embedding_cache_model_name(EMBEDDING_MODEL_PATH)
+    with EmbeddingCache(os.path.abspath(EMBEDDING_CACHE_PATH), embedding_model_name) as embedding_cache:
+        index_dir = os.path.abspath(faiss_index_dir)
+        if os.path.exists(os.path.join(index_dir, FAISS_INDEX_FILENAME)) and ChunkStore.exists(index_dir):
+            # 已有持久化索引时直接内存映射加载，跳过文档解析与嵌入计算
+            index, chunks = load_index(index_dir)
+            print(f"加载已有索引: {index_dir}，文本块数量: {len(chunks)}")
+        else:
+            # 索引流程：加载PDF文件，分割文本块，计算嵌入向量，存储在FAISS索引中，并保存到faiss_index_dir
+            index, chunks = indexing_process('test_lesson2.pdf', embedding_model, embedding_cache, index_dir)
+            print(f"嵌入缓存统计: {embedding_cache.stats()}")
+
+        # 检索流程：将用户查询转化为嵌入向量，检索最相似的文本块
+        retrieval_chunks = retrieval_process(query, index, chunks, embedding_model)
+
+        # 生成流程：调用Qwen大模型生成响应
+        generate_process(query, retrieval_chunks)
+
+        print("RAG过程结束.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
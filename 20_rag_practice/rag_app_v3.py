@@ -12,6 +12,9 @@ from langchain_community.document_loaders import (
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from sentence_transformers import SentenceTransformer
+from ChromaWriter import encode_and_store
+from EmbeddingCache import EmbeddingCache, EMBEDDING_CACHE_PATH, embedding_cache_model_name
+from QueryEmbeddingCache import QueryEmbeddingCache
 import os
 import dashscope
 from http import HTTPStatus
@@ -20,12 +23,16 @@ import chromadb
 import uuid
 import shutil
 
-from rank_bm25 import BM25Okapi # 从 rank_bm25 库中导入 BM25Okapi 类，用于实现 BM25 算法的检索功能
-import jieba # 导入 jieba 库，用于对中文文本进行分词处理
+from RankFusion import reciprocal_rank_fusion
+from BM25Index import BM25Index # 持久化的 BM25 倒排索引，用于实现 BM25 算法的检索功能
+from JiebaTokenizer import tokenize_corpus, tokenize_query, warm_up_jieba # jieba 分词：预热词典、查询分词缓存
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 QWEN_MODEL = "qwen-turbo"
 QWEN_API_KEY = "your_api_key"
+EMBEDDING_MODEL_PATH = "rag_app/bge-small-zh-v1.5"
+# 向量检索与 BM25 检索结果按文本块 ID 融合（RRF）后保留的候选数，不少于 top_k
+FUSION_CANDIDATES = 8
 
 DOCUMENT_LOADER_MAPPING = {
     ".pdf": (PDFPlumberLoader, {}),
@@ -54,13 +61,13 @@ def load_document(file_path):
     print(f"不支持的文档类型: '{ext}'")
     return ""
 
-def load_embedding_model(model_path='rag_app/bge-small-zh-v1.5'):
+def load_embedding_model(model_path=EMBEDDING_MODEL_PATH):
     print("加载Embedding模型中")
     embedding_model = SentenceTransformer(os.path.abspath(model_path))
     print(f"bge-small-zh-v1.5模型最大输入长度: {embedding_model.max_seq_length}\n")
     return embedding_model
 
-def indexing_process(folder_path, embedding_model, collection):
+def indexing_process(folder_path, embedding_model, collection, bm25_index, embedding_cache=None, client=None):
     all_chunks = []
     all_ids = []
 
@@ -79,35 +86,36 @@ def indexing_process(folder_path, embedding_model, collection):
                 all_chunks.extend(chunks)
                 all_ids.extend([str(uuid.uuid4()) for _ in range(len(chunks))])
 
-    embeddings = [embedding_model.encode(chunk, normalize_embeddings=True).tolist() for chunk in all_chunks]
+    # 分批编码并写入向量数据库，写入与下一批编码重叠
+    encode_and_store(embedding_model, collection, all_ids, all_chunks, cache=embedding_cache, client=client)
+
+    # 索引阶段一次性分词并写入 BM25 倒排索引
+    bm25_index.add_documents(all_ids, tokenize_corpus(all_chunks))
 
-    collection.add(ids=all_ids, embeddings=embeddings, documents=all_chunks)
     print("嵌入生成完成，向量数据库存储完成.")
     print("索引过程完成.")
     print("********************************************************")
 
-def retrieval_process(query, collection, embedding_model=None, top_k=6):
+def retrieval_process(query, collection, embedding_model=None, bm25_index=None, top_k=6, query_embedding_cache=None):
 
-    query_embedding = embedding_model.encode(query, normalize_embeddings=True).tolist()
+    # 重复查询直接复用缓存的查询向量，不再执行一次完整的模型前向计算
+    if query_embedding_cache is not None:
+        query_embedding = query_embedding_cache.encode(embedding_model, query).tolist()
+    else:
+        query_embedding = embedding_model.encode(query, normalize_embeddings=True).tolist()
     vector_results = collection.query(query_embeddings=[query_embedding], n_results=top_k)
 
-    # 从 Chroma collection 中提取所有文档
-    all_docs = collection.get()['documents']
-
-    # 对所有文档进行中文分词
-    tokenized_corpus = [list(jieba.cut(doc)) for doc in all_docs]
-
-    # 使用分词后的文档集合实例化 BM25Okapi，对这些文档进行 BM25 检索的准备工作
-    bm25 = BM25Okapi(tokenized_corpus)
-    # 对查询语句进行分词处理，将分词结果存储为列表
-    tokenized_query = list(jieba.cut(query))
-    # 计算查询语句与每个文档的 BM25 得分，返回每个文档的相关性分数
-    bm25_scores = bm25.get_scores(tokenized_query)
-    
-    # 获取 BM25 检索得分最高的前 top_k 个文档的索引
-    bm25_top_k_indices = sorted(range(len(bm25_scores)), key=lambda i: bm25_scores[i], reverse=True)[:top_k]
-    # 根据索引提取对应的文档内容
-    bm25_chunks = [all_docs[i] for i in bm25_top_k_indices]
+    # 在持久化的 BM25 倒排索引中只对查询词的倒排表打分，不再对全部文档重新分词、构建 BM25Okapi
+    # 查询分词带 LRU 缓存，语料分词已在索引阶段完成，查询路径不会重新分词语料
+    tokenized_query = tokenize_query(query)
+    bm25_ids = [doc_id for doc_id, _ in bm25_index.search(tokenized_query, top_k)]
+    # 根据文本块 ID 从 Chroma 取回对应的文档内容
+    bm25_chunks = []
+    id_to_doc = {}
+    if bm25_ids:
+        fetched = collection.get(ids=bm25_ids)
+        id_to_doc.update(zip(fetched['ids'], fetched['documents']))
+        bm25_chunks = [id_to_doc[doc_id] for doc_id in bm25_ids]
 
     # 打印 向量 检索结果
     print(f"查询语句: {query}")
@@ -125,13 +133,19 @@ def retrieval_process(query, collection, embedding_model=None, top_k=6):
         print(f"BM25 检索排名: {rank + 1}")
         print(f"文档内容:\n{doc}\n")
 
-    # 合并结果，将 向量 检索的结果放在前面，然后是 BM25 检索的结果
-    combined_results = vector_chunks + bm25_chunks
+    # 按文本块 ID 用 RRF 融合两路结果，两路都命中的文本块只保留一份
+    vector_ids = vector_results['ids'][0]
+    id_to_doc.update(zip(vector_ids, vector_results['documents'][0]))
+    fused = reciprocal_rank_fusion([vector_ids, bm25_ids], limit=max(FUSION_CANDIDATES, top_k))
+    fused_chunks = [id_to_doc[chunk_id] for chunk_id, _ in fused]
+    print(f"RRF 融合后的候选文本块数量: {len(fused_chunks)}（融合前 {len(vector_chunks) + len(bm25_chunks)}）")
+
+    combined_results = fused_chunks
 
     print("检索过程完成.")
     print("********************************************************")
 
-    # 返回合并后的全部结果，共2*top_k个文档块
+    # 返回融合后的候选文本块，最多 max(FUSION_CANDIDATES, top_k) 个
     return combined_results
 
 def generate_process(query, chunks):
@@ -174,6 +188,8 @@ def generate_process(query, chunks):
 
 def main():
     print("RAG过程开始.")
+    # 进程启动时预热 jieba 词典，前缀词典缓存在 rag_app 目录
+    warm_up_jieba()
 
     chroma_db_path = os.path.abspath("rag_app/chroma_db")
     if os.path.exists(chroma_db_path):
@@ -182,12 +198,23 @@ def main():
     client = chromadb.PersistentClient(path=os.path.abspath(chroma_db_path))
     collection = client.get_or_create_collection(name="documents") 
     embedding_model = load_embedding_model()
-
-    indexing_process('rag_app/data_lesson6', embedding_model, collection)
-    query = "下面报告中涉及了哪几个行业的案例以及总结各自面临的挑战？"
-    retrieval_chunks = retrieval_process(query, collection, embedding_model)
-    generate_process(query, retrieval_chunks)
-    print("RAG过程结束.")
+    # 缓存键中的模型标识由实际加载的模型路径得到，更换模型后不会读到旧模型的向量
+    embedding_model_name = embedding_cache_model_name(EMBEDDING_MODEL_PATH)
+    with EmbeddingCache(os.path.abspath(EMBEDDING_CACHE_PATH), embedding_model_name) as embedding_cache:
+        # BM25 倒排索引与向量数据库一起重建
+        bm25_index = BM25Index(os.path.abspath("rag_app/bm25_index.sqlite"))
+        bm25_index.clear()
+
+        indexing_process('rag_app/data_lesson6', embedding_model, collection, bm25_index, embedding_cache, client)
+        print(f"嵌入缓存统计: {embedding_cache.stats()}")
+        query = "下面报告中涉及了哪几个行业的案例以及总结各自面临的挑战？"
+        # 查询嵌入向量缓存：进程内 LRU，未命中时再查与文本块共用的磁盘缓存，多个工作进程可共享
+        query_embedding_cache = QueryEmbeddingCache(embedding_model_name, backend=embedding_cache)
+        retrieval_chunks = retrieval_process(query, collection, embedding_model, bm25_index,
+                                             query_embedding_cache=query_embedding_cache)
+        print(f"查询嵌入缓存统计: {query_embedding_cache.stats()}")
+        generate_process(query, retrieval_chunks)
+        print("RAG过程结束.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
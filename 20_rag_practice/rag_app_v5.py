@@ -9,27 +9,58 @@ from langchain_community.document_loaders import (
     UnstructuredXMLLoader,
     UnstructuredHTMLLoader,
 )
-from typing import List, Dict
+from typing import List, Dict, Optional
 from TextSplitter import TextSplitter, chunk_regex
+from ChunkPacker import ChunkPacker
+from ChunkDeduplicator import ChunkDeduplicator
+from DedupIndex import DedupIndex
+from IndexManifest import IndexManifest, file_content_hash, make_chunk_id
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from sentence_transformers import SentenceTransformer
+from ChromaWriter import encode_and_store, update_duplicate_metadata
+from EmbeddingEncoder import encode_texts
+from EmbeddingCache import EmbeddingCache, EMBEDDING_CACHE_PATH, embedding_cache_model_name
+from QueryEmbeddingCache import QueryEmbeddingCache
 import os
 import dashscope
 from http import HTTPStatus
 
 import chromadb
-import uuid
-import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-from rank_bm25 import BM25Okapi
-import jieba
+from RankFusion import reciprocal_rank_fusion
+from BM25Index import BM25Index
+from TopK import top_k_indices
+from MetadataFilter import file_date, to_chroma_where
+from JiebaTokenizer import tokenize_corpus, tokenize_query, warm_up_jieba
 
-from FlagEmbedding import FlagReranker # 用于对嵌入结果进行重新排序的工具类
+from RerankScoreCache import RerankScoreCache
+from PromptBudgeter import get_prompt_budgeter
+from SemanticAnswerCache import SemanticAnswerCache, answer_scope
+from RerankerService import get_reranker_service # 常驻的重排序服务，模型只加载一次并合并并发请求
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 QWEN_MODEL = "qwen-turbo"
 QWEN_API_KEY = "your_api_key"
+# 提示词（问题与参考文档）的 token 上限，按 QWEN_MODEL 的分词器计数
+PROMPT_MAX_TOKENS = 4000
+# 向量检索与 BM25 检索结果按文本块 ID 融合（RRF）后保留的候选数，不少于 top_k
+FUSION_CANDIDATES = 8
+# 重排序模型与服务参数：单次前向计算的最大文本对数量、合并并发请求的最长等待时间（毫秒）
+RERANKER_MODEL = "BAAI/bge-reranker-v2-m3"
+RERANK_MAX_BATCH_SIZE = 32
+RERANK_MAX_WAIT_MS = 5.0
+# 文档解析与分割的并行进程数，None 表示使用全部 CPU 核心
+INGEST_WORKERS = None
+# 文本块合并的 token 上限（None 表示使用嵌入模型最大输入长度）与相邻块重叠 token 数
+CHUNK_MAX_TOKENS = None
+CHUNK_OVERLAP_TOKENS = 0
+EMBEDDING_MODEL_PATH = "rag_app/bge-small-zh-v1.5"
+INDEX_MANIFEST_PATH = "rag_app/index_manifest.json"
+BM25_INDEX_PATH = "rag_app/bm25_index.sqlite"
+DEDUP_INDEX_PATH = "rag_app/dedup_index.sqlite"
 
 DOCUMENT_LOADER_MAPPING = {
     ".pdf": (PDFPlumberLoader, {}),
@@ -45,106 +76,301 @@ DOCUMENT_LOADER_MAPPING = {
     ".html": (UnstructuredHTMLLoader, {}),
 }
 
-def load_document(file_path):
+def load_document_pages(file_path):
+    """
+    解析文档并返回分页内容。PDFPlumberLoader 按页返回，其余加载器通常只返回一个整体文档。
+
+    :param file_path: 文档文件路径
+    :return: 页面文本列表，不支持的文档类型返回空列表
+    """
     ext = os.path.splitext(file_path)[1]
     loader_class, loader_args = DOCUMENT_LOADER_MAPPING.get(ext, (None, None))
 
     if loader_class:
         loader = loader_class(file_path, **loader_args)
         documents = loader.load()
-        content = "\n".join([doc.page_content for doc in documents])
-        return content
+        return [doc.page_content for doc in documents]
 
     print(f"不支持的文档类型: '{ext}'")
-    return ""
+    return []
+
+def join_pages(pages):
+    """
+    用换行符拼接页面文本，并记录每一页在拼接结果中的起始字符偏移。
+
+    :param pages: 页面文本列表
+    :return: (文档内容字符串, 页面起始偏移列表)
+    """
+    page_offsets = []
+    offset = 0
+    for page in pages:
+        page_offsets.append(offset)
+        offset += len(page) + 1
+    return "\n".join(pages), page_offsets
 
-def load_embedding_model(model_path='rag_app/bge-small-zh-v1.5'):
+def load_document(file_path):
+    content, _ = join_pages(load_document_pages(file_path))
+    return content
+
+def load_embedding_model(model_path=EMBEDDING_MODEL_PATH):
     print("加载Embedding模型中")
     embedding_model = SentenceTransformer(os.path.abspath(model_path))
     print(f"bge-small-zh-v1.5模型最大输入长度: {embedding_model.max_seq_length}\n")
     return embedding_model
 
-def reranking(query, chunks, top_k=3):
-    # 初始化重排序模型，使用BAAI/bge-reranker-v2-m3
-    reranker = FlagReranker('BAAI/bge-reranker-v2-m3', use_fp16=True)
-    
-    # 构造输入对，每个 query 与 chunk 形成一对
-    input_pairs = [[query, chunk] for chunk in chunks]
-    
-    # 计算每个 chunk 与 query 的语义相似性得分
-    scores = reranker.compute_score(input_pairs, normalize=True)
+def rerank_scores(queries, chunk_lists, chunk_id_lists=None, rerank_cache=None):
+    """
+    计算多条查询各自候选文本块的重排序得分。先查询重排序得分缓存，
+    所有查询未命中的文本对一次性提交给重排序服务，合并为尽量少的前向计算。
+
+    :param queries: 查询语句列表
+    :param chunk_lists: 每条查询的候选文本块列表
+    :param chunk_id_lists: 每条查询的候选文本块 ID 列表，提供时才使用缓存；缓存同时校验文本块内容哈希，
+        其他进程重新索引后内容变化的文本块不会读到旧得分
+    :param rerank_cache: 重排序得分缓存
+    :return: 与 chunk_lists 形状相同的得分列表
+    """
+    # 获取进程内共享的重排序服务，模型只在首次调用时加载
+    reranker = get_reranker_service(RERANKER_MODEL, True, RERANK_MAX_BATCH_SIZE, RERANK_MAX_WAIT_MS)
+    use_cache = rerank_cache is not None and chunk_id_lists is not None
+
+    score_lists = [
+        rerank_cache.get_many(query, chunk_ids, chunks) if use_cache else [None] * len(chunks)
+        for query, chunks, chunk_ids in zip(queries, chunk_lists, chunk_id_lists or [None] * len(queries))
+    ]
+    missing_lists = [[i for i, score in enumerate(scores) if score is None] for scores in score_lists]
+
+    # 计算每个 chunk 与 query 的语义相似性得分，只有未命中缓存的文本块才送入模型
+    missing_scores = reranker.score_many([
+        (query, [chunks[i] for i in missing]) for query, chunks, missing in zip(queries, chunk_lists, missing_lists)
+    ])
+    for index, (scores, missing, new_scores) in enumerate(zip(score_lists, missing_lists, missing_scores)):
+        for i, score in zip(missing, new_scores):
+            scores[i] = score
+        if use_cache and missing:
+            rerank_cache.put_many(
+                queries[index], [chunk_id_lists[index][i] for i in missing], new_scores,
+                [chunk_lists[index][i] for i in missing],
+            )
+    return score_lists
+
+def reranking(query, chunks, top_k=3, chunk_ids=None, rerank_cache=None, return_ids=False):
+    scores = rerank_scores([query], [chunks], [chunk_ids] if chunk_ids is not None else None, rerank_cache)[0]
     
     print("文档块重排序得分:", scores)
     
-    # 对得分进行排序并获取排名前 top_k 的 chunks
-    sorted_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
-    reranking_chunks = [chunks[i] for i in sorted_indices[:top_k]]
+    # 用 argpartition 选出得分最高的 top_k 个 chunks，只对这 top_k 个排序
+    sorted_indices = top_k_indices(scores, top_k)
+    reranking_chunks = [chunks[i] for i in sorted_indices]
     
     # 打印前三个 score 对应的文档块
-    for i in range(top_k):
+    for i in range(len(reranking_chunks)):
         print(f"重排序文档块{i+1}: 相似度得分：{scores[sorted_indices[i]]}，文档块信息：{reranking_chunks[i]}\n")
     
+    if return_ids:
+        return reranking_chunks, [chunk_ids[i] for i in sorted_indices]
     return reranking_chunks
 
-def indexing_process(folder_path: str, embedding_model, collection):
+def split_document(file_path: str):
+    """
+    解析并分割单个文档，作为进程池的工作函数，需要保持在模块顶层以便序列化。
+
+    :param file_path: 文档文件路径
+    :return: (文档内容, 页面起始偏移列表或 None, 带元数据的文本块列表)
+    """
+    pages = load_document_pages(file_path)
+    document_text, page_offsets = join_pages(pages)
+    if not document_text:
+        return "", None, []
+
+    # 只有 PDF 加载器按页返回，其他格式不记录页码
+    if not file_path.endswith(".pdf"):
+        page_offsets = None
+    splitter = TextSplitter(chunk_regex)
+    return document_text, page_offsets, splitter.split_with_metadata(document_text, page_offsets)
+
+def split_documents(file_paths: List[str], max_workers: Optional[int] = INGEST_WORKERS):
+    """
+    并行解析并分割多个文档。结果顺序与 file_paths 一致，与工作进程数无关。
+
+    :param file_paths: 文档文件路径列表
+    :param max_workers: 工作进程数，None 表示使用全部 CPU 核心，1 表示在当前进程中串行执行
+    :return: 与 file_paths 一一对应的 (文档内容, 页面起始偏移列表或 None, 带元数据的文本块列表) 列表
+    """
+    if max_workers == 1 or len(file_paths) <= 1:
+        return [split_document(file_path) for file_path in file_paths]
+
+    # 调用时重排序服务的后台线程与 torch 可能已经启动，fork 带线程的进程可能死锁，因此以 spawn 方式启动工作进程
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # executor.map 按提交顺序返回结果，保证输出确定
+        return list(executor.map(split_document, file_paths))
+
+def indexing_process(folder_path: str, embedding_model, collection, bm25_index: BM25Index,
+                     manifest: Optional[IndexManifest] = None,
+                     embedding_cache: Optional[EmbeddingCache] = None,
+                     max_workers: Optional[int] = INGEST_WORKERS,
+                     rerank_cache: Optional[RerankScoreCache] = None,
+                     answer_cache: Optional[SemanticAnswerCache] = None,
+                     dedup_index: Optional[DedupIndex] = None,
+                     client=None):
     all_chunks: List[Dict[str, str]] = []
     all_ids: List[str] = []
 
-    splitter = TextSplitter(chunk_regex)
-
-    for filename in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, filename)
-
-        if os.path.isfile(file_path):
-            document_text = load_document(file_path)
-            if document_text:
-                print(f"文档 {filename} 的总字符数: {len(document_text)}")
-
-                chunks_with_metadata = splitter.split_with_metadata(document_text)
-                print(f"文档 {filename} 分割的文本Chunk数量: {len(chunks_with_metadata)}")
-
-                for chunk in chunks_with_metadata:
-                    all_chunks.append(chunk)
-                    all_ids.append(str(uuid.uuid4()))
-
-                    # 添加文件名到元数据
-                    chunk['metadata']['filename'] = filename
-
-    # 生成嵌入向量
-    embeddings = [embedding_model.encode(chunk['content'], normalize_embeddings=True).tolist() for chunk in all_chunks]
+    # 排序保证多次运行的文档处理顺序一致
+    filenames = [
+        filename for filename in sorted(os.listdir(folder_path))
+        if os.path.isfile(os.path.join(folder_path, filename))
+    ]
+    file_hashes = {
+        filename: file_content_hash(os.path.join(folder_path, filename)) for filename in filenames
+    }
+
+    # 重复块来源发生变化、需要更新 duplicate_filenames 的历史代表块
+    duplicate_owners = set()
+    # 对比增量索引清单，只处理新增或内容变化的文件，并删除已变化或已删除文件的旧文本块
+    if manifest is not None:
+        changed, removed, stale_ids = manifest.diff(file_hashes)
+        if dedup_index is not None:
+            # 已变化或已删除文件中的重复块记录失效，本次重新去重时再写入
+            duplicate_owners.update(dedup_index.delete_files(list(changed) + list(removed)))
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+            bm25_index.delete_documents(stale_ids)
+            if dedup_index is not None:
+                dedup_index.delete(stale_ids)
+            if rerank_cache is not None:
+                rerank_cache.invalidate(stale_ids)
+            if answer_cache is not None:
+                answer_cache.invalidate(stale_ids)
+        for filename in removed:
+            manifest.remove(filename)
+        print(f"增量索引: 新增或修改 {len(changed)} 个文档, 删除 {len(removed)} 个文档, 移除 {len(stale_ids)} 个旧文本块")
+        changed = set(changed)
+        filenames = [filename for filename in filenames if filename in changed]
+
+    file_paths = [os.path.join(folder_path, filename) for filename in filenames]
+
+    # 按嵌入模型分词器的 token 数合并过小的文本块、拆分超长文本块
+    packer = ChunkPacker.from_embedding_model(embedding_model, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+
+    chunk_filenames: List[str] = []
+    for filename, (document_text, page_offsets, chunks_with_metadata) in zip(
+        filenames, split_documents(file_paths, max_workers)
+    ):
+        file_hash = file_hashes[filename]
+        document_date = file_date(os.path.join(folder_path, filename))
+        if document_text:
+            print(f"文档 {filename} 的总字符数: {len(document_text)}")
+            print(f"文档 {filename} 分割的文本Chunk数量: {len(chunks_with_metadata)}")
+            # 合并块从原文切片并记录起止页码，跨页文本块引用时不会丢失后续页码
+            chunks_with_metadata = packer.pack(chunks_with_metadata, document_text, page_offsets)
+            print(f"文档 {filename} 合并后的文本Chunk数量: {len(chunks_with_metadata)}")
+
+            for chunk in chunks_with_metadata:
+                # 文本块 ID 由文件内容哈希与字符区间确定，重复索引同一文件得到相同 ID
+                chunk_id = make_chunk_id(filename, file_hash, chunk['metadata']['start'], chunk['metadata']['end'])
+                all_chunks.append(chunk)
+                all_ids.append(chunk_id)
+                chunk_filenames.append(filename)
+
+                # 添加文件名与文档日期（YYYYMMDD 整数）到元数据，用于检索时按元数据过滤
+                chunk['metadata']['filename'] = filename
+                chunk['metadata']['date'] = document_date
+
+    # 去除完全重复与近似重复的文本块（页眉页脚、免责声明等），只保留每组中的第一个；
+    # 提供去重索引时同时与历史运行中已索引的代表块比较，增量索引与全量重建的去重结果一致
+    representatives = ChunkDeduplicator().deduplicate(all_chunks, all_ids, dedup_index) if all_chunks else []
+    kept = [i for i, representative in enumerate(representatives) if representative == all_ids[i]]
+    print(f"去重后保留 {len(kept)}/{len(all_chunks)} 个文本块")
+    if dedup_index is not None:
+        # 本次保留的代表块已由去重器写好元数据；历史代表块在 Chroma 中按去重索引的记录更新
+        kept_ids = {all_ids[i] for i in kept}
+        duplicate_owners.update(
+            representative for i, representative in enumerate(representatives) if representative != all_ids[i]
+        )
+        update_duplicate_metadata(collection, dedup_index, duplicate_owners - kept_ids)
+
+    if manifest is not None:
+        file_chunk_ids = {filename: [] for filename in filenames}
+        file_depends_on = {filename: [] for filename in filenames}
+        for i, representative in enumerate(representatives):
+            if representative == all_ids[i]:
+                file_chunk_ids[chunk_filenames[i]].append(all_ids[i])
+            else:
+                # 被合并的重复块依赖代表块（可能来自之前的运行），代表块被删除时需要重新索引该文件
+                file_depends_on[chunk_filenames[i]].append(representative)
+        for filename in filenames:
+            manifest.update(filename, file_hashes[filename], file_chunk_ids[filename], file_depends_on[filename])
+
+    all_chunks = [all_chunks[i] for i in kept]
+    all_ids = [all_ids[i] for i in kept]
+
+    if not all_chunks:
+        if dedup_index is not None:
+            dedup_index.commit()
+        if manifest is not None:
+            manifest.mark_clean()
+            manifest.save()
+        print("没有需要更新的文档，索引过程完成.")
+        print("********************************************************")
+        return
 
     # 准备存储到向量数据库的数据
     documents = [chunk['content'] for chunk in all_chunks]
     metadatas = [chunk['metadata'] for chunk in all_chunks]
 
-    # 将数据添加到集合中
-    collection.add(
-        ids=all_ids,
-        embeddings=embeddings,
-        documents=documents,
-        metadatas=metadatas
-    )
+    # 分批编码并写入向量数据库，写入与下一批编码重叠
+    encode_and_store(embedding_model, collection, all_ids, documents, metadatas, cache=embedding_cache,
+                     client=client)
+
+    # 索引阶段一次性分词并写入 BM25 倒排索引，同时记录用于过滤的 filename、type、date
+    bm25_index.add_documents(all_ids, tokenize_corpus(documents), metadatas)
+    # 重新写入的文本块的重排序得分缓存失效
+    if rerank_cache is not None:
+        rerank_cache.invalidate(all_ids)
+    # 引用了这些文本块的缓存答案同样失效
+    if answer_cache is not None:
+        answer_cache.invalidate(all_ids)
+
+    # 向量数据库与 BM25 索引写入成功后再保存去重索引与清单，中断时下次运行会重新处理这些文件
+    if dedup_index is not None:
+        dedup_index.commit()
+    if manifest is not None:
+        manifest.mark_clean()
+        manifest.save()
 
     print("嵌入生成完成，向量数据库存储完成.")
     print("索引过程完成.")
     print("********************************************************")
 
 
-def retrieval_process(query, collection, embedding_model=None, top_k=6):
-
-    query_embedding = embedding_model.encode(query, normalize_embeddings=True).tolist()
-    vector_results = collection.query(query_embeddings=[query_embedding], n_results=top_k)
-
-    all_docs = collection.get()['documents']
-
-    tokenized_corpus = [list(jieba.cut(doc)) for doc in all_docs]
-
-    bm25 = BM25Okapi(tokenized_corpus)
-    tokenized_query = list(jieba.cut(query))
-    bm25_scores = bm25.get_scores(tokenized_query)
-    
-    bm25_top_k_indices = sorted(range(len(bm25_scores)), key=lambda i: bm25_scores[i], reverse=True)[:top_k]
-    bm25_chunks = [all_docs[i] for i in bm25_top_k_indices]
+def retrieval_process(query, collection, embedding_model=None, bm25_index=None, top_k=6, rerank_cache=None,
+                      query_embedding_cache=None, filters=None, return_ids=False):
+
+    # 重复查询直接复用缓存的查询向量，不再执行一次完整的模型前向计算
+    if query_embedding_cache is not None:
+        query_embedding = query_embedding_cache.encode(embedding_model, query).tolist()
+    else:
+        query_embedding = embedding_model.encode(query, normalize_embeddings=True).tolist()
+
+    # 元数据过滤条件（filename、type、date_from、date_to）下推到 Chroma where 子句，
+    # BM25 一侧在 SQLite 读取倒排表时按同样的条件过滤，不再从 Chroma 取出全部满足条件的 ID
+    where = to_chroma_where(filters)
+    vector_results = collection.query(query_embeddings=[query_embedding], n_results=top_k, where=where)
+
+    # 在持久化的 BM25 倒排索引中只对查询词的倒排表打分，不再对全部文档重新分词、构建 BM25Okapi
+    # 查询分词带 LRU 缓存，语料分词已在索引阶段完成，查询路径不会重新分词语料
+    tokenized_query = tokenize_query(query)
+    bm25_ids = [doc_id for doc_id, _ in bm25_index.search(tokenized_query, top_k, filters=filters)]
+    # 根据文本块 ID 从 Chroma 取回对应的文档内容
+    bm25_chunks = []
+    id_to_doc = {}
+    if bm25_ids:
+        fetched = collection.get(ids=bm25_ids)
+        id_to_doc.update(zip(fetched['ids'], fetched['documents']))
+        # 单独运行的增量索引先后删除 Chroma 与 BM25 中的文本块，两步之间 BM25 可能命中 Chroma 中已删除的文本块
+        bm25_ids = [doc_id for doc_id in bm25_ids if doc_id in id_to_doc]
+        bm25_chunks = [id_to_doc[doc_id] for doc_id in bm25_ids]
 
     print(f"查询语句: {query}")
     print(f"向量检索最相似的前 {top_k} 个文本块:")
@@ -160,29 +386,108 @@ def retrieval_process(query, collection, embedding_model=None, top_k=6):
         print(f"BM25 检索排名: {rank + 1}")
         print(f"文档内容:\n{doc}\n")
 
-    # 使用重排序模型对检索结果进行重新排序，输出重排序后的前top_k文档块
-    reranking_chunks = reranking(query,vector_chunks + bm25_chunks, top_k)
+    # 按文本块 ID 用 RRF 融合两路结果，两路都命中的文本块只保留一份
+    vector_ids = vector_results['ids'][0]
+    id_to_doc.update(zip(vector_ids, vector_results['documents'][0]))
+    fused = reciprocal_rank_fusion([vector_ids, bm25_ids], limit=max(FUSION_CANDIDATES, top_k))
+    fused_chunks = [id_to_doc[chunk_id] for chunk_id, _ in fused]
+    print(f"RRF 融合后的候选文本块数量: {len(fused_chunks)}（融合前 {len(vector_chunks) + len(bm25_chunks)}）")
+
+    # 只把融合后的候选送入重排序模型，输出重排序后的前top_k文档块
+    reranking_chunks = reranking(query, fused_chunks, top_k, [chunk_id for chunk_id, _ in fused], rerank_cache,
+                                 return_ids)
 
     print("检索过程完成.")
     print("********************************************************")
 
-    # 返回重排序后的前top_k个文档块
+    # 返回重排序后的前top_k个文档块（return_ids 为 True 时同时返回对应的文本块 ID）
     return reranking_chunks
 
+def retrieval_batch(queries, collection, embedding_model, bm25_index, top_k=6, rerank_cache=None,
+                    query_embedding_cache=None, filters=None):
+    """
+    批量检索：一次编码全部查询、一次多向量 Chroma 查询、一次稀疏矩阵乘法完成 BM25 打分，
+    并把所有查询的重排序文本对合并提交，适合评测与批量问题集。
+
+    :param queries: 查询语句列表
+    :param collection: Chroma collection
+    :param embedding_model: 嵌入模型
+    :param bm25_index: 持久化的 BM25 倒排索引
+    :param top_k: 每条查询返回的文本块数
+    :param rerank_cache: 重排序得分缓存
+    :param query_embedding_cache: 查询嵌入向量缓存
+    :param filters: 元数据过滤条件，对所有查询生效，格式同 retrieval_process
+    :return: 每条查询重排序后的前 top_k 个文本块，与 retrieval_process 的返回值形状相同
+    """
+    if not queries:
+        return []
+
+    # 全部查询按长度排序后分批编码，再一次性发起多向量查询
+    if query_embedding_cache is not None:
+        query_embeddings = query_embedding_cache.encode_many(embedding_model, queries)
+    else:
+        query_embeddings = encode_texts(embedding_model, queries, normalize_embeddings=True, show_progress=False)
+    where = to_chroma_where(filters)
+    vector_results = collection.query(query_embeddings=query_embeddings.tolist(), n_results=top_k, where=where)
+    # 满足过滤条件的文本块 ID 由 BM25 索引的 SQLite 查出，并按过滤条件缓存到索引下次写入
+    candidate_ids = bm25_index.filter_ids(filters)
+
+    # BM25：所有查询组成一个稀疏矩阵，与词-文档矩阵做一次乘法；稀疏矩阵缓存在索引上，索引写入后才重建
+    bm25_results = bm25_index.sparse().search_batch(
+        [tokenize_query(query) for query in queries], top_k, candidate_ids
+    )
+    # 与 retrieval_process 相同，保留至少包含一个查询词的全部 top_k 文本块
+    bm25_id_lists = [[doc_id for doc_id, _ in results] for results in bm25_results]
+
+    id_to_doc = {}
+    for ids, documents in zip(vector_results['ids'], vector_results['documents']):
+        id_to_doc.update(zip(ids, documents))
+    missing_ids = list({doc_id for ids in bm25_id_lists for doc_id in ids if doc_id not in id_to_doc})
+    if missing_ids:
+        fetched = collection.get(ids=missing_ids)
+        id_to_doc.update(zip(fetched['ids'], fetched['documents']))
+    # 丢弃 Chroma 中已被增量索引删除的 BM25 命中，同 retrieval_process
+    bm25_id_lists = [[doc_id for doc_id in ids if doc_id in id_to_doc] for ids in bm25_id_lists]
+
+    fusion_limit = max(FUSION_CANDIDATES, top_k)
+    fused_id_lists = [
+        [chunk_id for chunk_id, _ in reciprocal_rank_fusion([vector_ids, bm25_ids], limit=fusion_limit)]
+        for vector_ids, bm25_ids in zip(vector_results['ids'], bm25_id_lists)
+    ]
+    fused_chunk_lists = [[id_to_doc[chunk_id] for chunk_id in ids] for ids in fused_id_lists]
+
+    score_lists = rerank_scores(queries, fused_chunk_lists, fused_id_lists, rerank_cache)
+    results = []
+    for chunks, scores in zip(fused_chunk_lists, score_lists):
+        results.append([chunks[i] for i in top_k_indices(scores, top_k)])
+
+    print(f"批量检索完成: {len(queries)} 条查询，候选文本块 {sum(len(chunks) for chunks in fused_chunk_lists)} 个")
+    return results
+
+def build_prompt(query, chunks, scores=None):
+    """
+    按 PROMPT_MAX_TOKENS 预算组装提示词：文本块按重排序得分贪心放入，最后一个放不下的文本块在句子边界处截断。
+
+    :param query: 查询语句
+    :param chunks: 检索得到的文本块
+    :param scores: 与 chunks 一一对应的重排序得分，None 表示 chunks 已按得分降序排列
+    :return: (提示词, 提示词 token 数)
+    :raises ValueError: 问题本身已超过 PROMPT_MAX_TOKENS
+    """
+    return get_prompt_budgeter(QWEN_MODEL, PROMPT_MAX_TOKENS).build(query, chunks, scores)
+
 def generate_process(query, chunks):
     llm_model = QWEN_MODEL
     dashscope.api_key = QWEN_API_KEY
 
-    context = ""
-    for i, chunk in enumerate(chunks):
-        context += f"参考文档{i+1}: \n{chunk}\n\n"
-
-    prompt = f"根据参考文档回答问题：{query}\n\n{context}"
-    print(prompt+"\n")
+    try:
+        # 提示词组装（含 token 计数与裁剪）出错时同样返回 None
+        prompt, prompt_tokens = build_prompt(query, chunks)
+        print(prompt+"\n")
+        print(f"提示词 token 数: {prompt_tokens}/{PROMPT_MAX_TOKENS}")
 
-    messages = [{'role': 'user', 'content': prompt}]
+        messages = [{'role': 'user', 'content': prompt}]
 
-    try:
         responses = dashscope.Generation.call(
             model = llm_model,
             messages=messages,
@@ -207,22 +512,90 @@ def generate_process(query, chunks):
         print(f"大模型生成过程中发生错误: {e}")
         return None
 
+def answer_process(query, collection, embedding_model, bm25_index, answer_cache, top_k=6, rerank_cache=None,
+                   query_embedding_cache=None, filters=None):
+    """
+    先查语义答案缓存，与已回答过的问题足够相似时直接返回缓存的答案；
+    未命中时执行完整的检索与生成，并以查询向量为键缓存答案及其引用的文本块。
+
+    :param answer_cache: 语义答案缓存
+    :return: 生成或缓存的答案，生成失败返回 None
+    """
+    if query_embedding_cache is not None:
+        query_embedding = query_embedding_cache.encode(embedding_model, query)
+    else:
+        query_embedding = embedding_model.encode(query, normalize_embeddings=True)
+    scope = answer_scope(top_k, filters)
+    answer = answer_cache.lookup(query_embedding, scope)
+    if answer is not None:
+        print(f"命中语义答案缓存:\n{answer}")
+        print("********************************************************")
+        return answer
+
+    chunks, chunk_ids = retrieval_process(query, collection, embedding_model, bm25_index, top_k, rerank_cache,
+                                          query_embedding_cache, filters, return_ids=True)
+    answer = generate_process(query, chunks)
+    if answer is not None:
+        answer_cache.put(query_embedding, answer, chunk_ids, scope)
+    return answer
+
 def main():
     print("RAG过程开始.")
+    # 进程启动时预热 jieba 词典，前缀词典缓存在 rag_app 目录
+    warm_up_jieba()
+    # 启动时加载重排序模型，查询时不再承担模型加载耗时
+    get_reranker_service(RERANKER_MODEL, True, RERANK_MAX_BATCH_SIZE, RERANK_MAX_WAIT_MS)
 
     chroma_db_path = os.path.abspath("rag_app/chroma_db")
-    if os.path.exists(chroma_db_path):
-        shutil.rmtree(chroma_db_path)
-
     client = chromadb.PersistentClient(path=os.path.abspath(chroma_db_path))
     collection = client.get_or_create_collection(name="documents") 
     embedding_model = load_embedding_model()
-
-    indexing_process('rag_app/data_lesson6', embedding_model, collection)
-    query = "下面报告中涉及了哪几个行业的案例以及总结各自面临的挑战？"
-    retrieval_chunks = retrieval_process(query, collection, embedding_model)
-    generate_process(query, retrieval_chunks)
-    print("RAG过程结束.")
+    # 缓存键中的模型标识由实际加载的模型路径得到，更换模型后不会读到旧模型的向量
+    embedding_model_name = embedding_cache_model_name(EMBEDDING_MODEL_PATH)
+    with EmbeddingCache(os.path.abspath(EMBEDDING_CACHE_PATH), embedding_model_name) as embedding_cache:
+        # 增量索引清单，记录文件内容哈希与文本块 ID，分块或嵌入配置变化时自动全量重建
+        manifest = IndexManifest(
+            os.path.abspath(INDEX_MANIFEST_PATH),
+            settings={
+                "embedding_model": EMBEDDING_MODEL_PATH,
+                "chunk_max_tokens": CHUNK_MAX_TOKENS,
+                "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+                "chunk_metadata": "filename,date,page_end",
+                # BM25 索引记录 filename、type、date 用于过滤，旧索引缺少这些列时需全量重建
+                "bm25_metadata": "filename,type,date",
+            },
+        )
+        bm25_index = BM25Index(os.path.abspath(BM25_INDEX_PATH))
+        # 已索引代表块的 MinHash 签名，增量索引时新文本块与之比较去重
+        dedup_index = DedupIndex(os.path.abspath(DEDUP_INDEX_PATH))
+        if collection.count() == 0:
+            # 向量数据库为空（首次运行或已被删除）时清单、BM25 索引与去重索引失效
+            manifest.reset()
+            bm25_index.clear()
+            dedup_index.clear()
+
+        # 重排序得分缓存，键为归一化查询文本与文本块 ID，并校验文本块内容哈希，文本块重新索引时失效
+        rerank_cache = RerankScoreCache()
+        # 语义答案缓存，相似问题直接复用已生成的答案，引用的文本块重新索引时失效；
+        # 命中前检查引用的文本块是否仍在 BM25 索引中，其他进程重建索引后同样不会返回旧答案
+        answer_cache = SemanticAnswerCache(chunks_exist=bm25_index.contains_all)
+
+        indexing_process('rag_app/data_lesson6', embedding_model, collection, bm25_index, manifest, embedding_cache,
+                         rerank_cache=rerank_cache, answer_cache=answer_cache, dedup_index=dedup_index,
+                         client=client)
+        print(f"嵌入缓存统计: {embedding_cache.stats()}")
+        query = "下面报告中涉及了哪几个行业的案例以及总结各自面临的挑战？"
+        # 查询嵌入向量缓存：进程内 LRU，未命中时再查与文本块共用的磁盘缓存，多个工作进程可共享
+        query_embedding_cache = QueryEmbeddingCache(embedding_model_name, backend=embedding_cache)
+        answer_process(query, collection, embedding_model, bm25_index, answer_cache, rerank_cache=rerank_cache,
+                       query_embedding_cache=query_embedding_cache)
+        # 相同问题的另一种问法，相似度超过阈值时直接返回缓存的答案
+        answer_process("报告里提到了哪些行业的案例？各自面临什么挑战？", collection, embedding_model, bm25_index,
+                       answer_cache, rerank_cache=rerank_cache, query_embedding_cache=query_embedding_cache)
+        print(f"查询嵌入缓存统计: {query_embedding_cache.stats()}")
+        print(f"重排序得分缓存统计: {rerank_cache.stats()}")
+        print(f"语义答案缓存统计: {answer_cache.stats()}")
+        print("RAG过程结束.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
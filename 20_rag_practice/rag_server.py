@@ -0,0 +1,185 @@
+"""
+rag_app_v5 的常驻 HTTP 查询服务。
+
+嵌入模型、BM25 索引、重排序模型与各级缓存在启动时加载一次，之后所有请求共享：
+    POST /search   混合检索 + 重排序，返回文本块及得分
+    POST /answer   检索后以 SSE（text/event-stream）逐个推送大模型 token
+    GET  /metrics  各阶段耗时直方图与语义答案缓存命中率（Prometheus 文本格式）
+    GET  /health   健康检查
+
+服务只负责查询，索引仍由 rag_app_v5.py 构建（增量索引）。
+
+用法:
+    python rag_server.py --port 8000 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import chromadb
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+import rag_app_v5 as rag
+from BM25Index import BM25Index
+from EmbeddingCache import EmbeddingCache, EMBEDDING_CACHE_PATH, embedding_cache_model_name
+from JiebaTokenizer import warm_up_jieba
+from QueryEmbeddingCache import QueryEmbeddingCache
+from RAGPipeline import RAGPipeline
+from RerankScoreCache import RerankScoreCache
+from RerankerService import get_reranker_service
+from SemanticAnswerCache import SemanticAnswerCache
+
+# 执行阻塞调用（模型推理、Chroma、SQLite、dashscope 流读取）的线程数
+SERVER_THREADS = 16
+# 各阶段最大并发数：嵌入与重排序占用模型，生成占用大模型 API 配额
+STAGE_LIMITS = {"embed": 4, "vector": 8, "bm25": 8, "rerank": 4, "generate": 8}
+# 耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class StageMetrics:
+    """
+    按阶段统计耗时的累积直方图，输出 Prometheus 文本格式。
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            counts = self._counts.setdefault(stage, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP rag_stage_latency_seconds RAG pipeline stage latency",
+            "# TYPE rag_stage_latency_seconds histogram",
+        ]
+        with self._lock:
+            for stage in sorted(self._counts):
+                counts = self._counts[stage]
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'rag_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'rag_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {counts[-1]}')
+                lines.append(f'rag_stage_latency_seconds_sum{{stage="{stage}"}} {self._sums[stage]}')
+                lines.append(f'rag_stage_latency_seconds_count{{stage="{stage}"}} {counts[-1]}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = StageMetrics()
+resources: Dict[str, Any] = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 所有模型与索引只在启动时加载一次
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=SERVER_THREADS))
+    warm_up_jieba()
+    get_reranker_service(rag.RERANKER_MODEL, True, rag.RERANK_MAX_BATCH_SIZE, rag.RERANK_MAX_WAIT_MS)
+    embedding_model = rag.load_embedding_model()
+    # 缓存键中的模型标识由实际加载的模型路径得到
+    embedding_model_name = embedding_cache_model_name(rag.EMBEDDING_MODEL_PATH)
+    embedding_cache = EmbeddingCache(os.path.abspath(EMBEDDING_CACHE_PATH), embedding_model_name)
+    client = chromadb.PersistentClient(path=os.path.abspath("rag_app/chroma_db"))
+    bm25_index = BM25Index(os.path.abspath(rag.BM25_INDEX_PATH))
+    resources["embedding_cache"] = embedding_cache
+    resources["pipeline"] = RAGPipeline(
+        client.get_or_create_collection(name="documents"),
+        embedding_model,
+        bm25_index,
+        rerank_cache=RerankScoreCache(),
+        query_embedding_cache=QueryEmbeddingCache(embedding_model_name, backend=embedding_cache),
+        observer=metrics.observe,
+        stage_limits=STAGE_LIMITS,
+        # 索引由单独运行的 rag_app_v5.py 重建，服务进程收不到失效通知，命中前检查引用的文本块是否仍在索引中
+        answer_cache=SemanticAnswerCache(chunks_exist=bm25_index.contains_all),
+    )
+    try:
+        yield
+    finally:
+        embedding_cache.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+class QueryRequest(BaseModel):
+    query: str
+    top_k: Optional[int] = None
+    # 元数据过滤条件：filename、type、date_from、date_to
+    filters: Optional[Dict[str, Any]] = None
+
+
+class SearchResult(BaseModel):
+    id: str
+    content: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+
+@app.post("/search", response_model=SearchResponse)
+async def search(request: QueryRequest):
+    try:
+        results = await resources["pipeline"].retrieve(request.query, request.top_k, request.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SearchResponse(
+        query=request.query,
+        results=[SearchResult(id=chunk_id, content=chunk, score=score) for chunk_id, chunk, score in results],
+    )
+
+
+@app.post("/answer")
+async def answer(request: QueryRequest):
+    async def event_stream():
+        try:
+            async for token in resources["pipeline"].answer_stream(request.query, request.top_k, request.filters):
+                yield f"data: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    lines = []
+    # 语义答案缓存的命中情况
+    for key, value in resources["pipeline"].answer_cache.stats().items():
+        lines.append(f"rag_answer_cache_{key} {value}")
+    return metrics.render() + "\n".join(lines) + "\n"
+
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="RAG 查询服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数，每个进程各自加载一份模型")
+    args = parser.parse_args()
+    uvicorn.run("rag_server:app", host=args.host, port=args.port, workers=args.workers)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 20_rag_practice 下的模块以平铺方式互相导入，测试时把该目录加入模块搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,35 @@
+import numpy as np
+
+from ChromaWriter import encode_and_store
+
+
+class FakeModel:
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class FakeClient:
+    def get_max_batch_size(self):
+        return 3
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.batches.append((ids, embeddings))
+
+
+def test_batches_capped_by_client_and_passed_as_lists():
+    collection = FakeCollection()
+    texts = [f"文本{i}" for i in range(7)]
+    ids = [f"id{i}" for i in range(7)]
+    assert encode_and_store(FakeModel(), collection, ids, texts, client=FakeClient()) == 7
+    assert [batch_ids for batch_ids, _ in collection.batches] == [ids[0:3], ids[3:6], ids[6:7]]
+    for batch_ids, embeddings in collection.batches:
+        assert isinstance(embeddings, list) and isinstance(embeddings[0], list)
+        assert len(embeddings) == len(batch_ids)
@@ -0,0 +1,108 @@
+from ChromaWriter import update_duplicate_metadata
+from ChunkDeduplicator import ChunkDeduplicator
+from DedupIndex import DedupIndex
+
+BOILERPLATE = "本报告仅供参考，不构成任何投资建议。市场有风险，投资需谨慎。未经许可不得转载或引用本报告内容。"
+
+
+def make_chunk(content, filename):
+    return {"content": content, "metadata": {"filename": filename}}
+
+
+def test_exact_and_near_duplicates_within_batch():
+    chunks = [
+        make_chunk(BOILERPLATE, "a.pdf"),
+        make_chunk("完全不同的正文内容，讨论制造业的数字化转型。", "a.pdf"),
+        make_chunk(BOILERPLATE, "b.pdf"),
+        make_chunk(BOILERPLATE + "。", "c.pdf"),
+    ]
+    representatives = ChunkDeduplicator().deduplicate(chunks)
+    assert representatives == [0, 1, 0, 0]
+    assert chunks[0]["metadata"]["duplicate_filenames"] == "b.pdf,c.pdf"
+    assert chunks[0]["metadata"]["duplicate_count"] == 2
+
+
+def test_incremental_run_matches_previously_indexed_boilerplate(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    deduplicator = ChunkDeduplicator()
+
+    # 第一次运行只索引文件 A
+    first = [make_chunk(BOILERPLATE, "a.pdf"), make_chunk("文件 A 的正文：零售行业的库存管理挑战。", "a.pdf")]
+    assert deduplicator.deduplicate(first, ["a-0", "a-1"], index) == ["a-0", "a-1"]
+    index.commit()
+
+    # 第二次运行只处理新增的文件 B，其中包含 A 的免责声明（精确与近似重复各一处）
+    second = [
+        make_chunk("文件 B 的正文：医疗行业的数据合规挑战。", "b.pdf"),
+        make_chunk(BOILERPLATE, "b.pdf"),
+        make_chunk(BOILERPLATE + "。", "b.pdf"),
+    ]
+    representatives = deduplicator.deduplicate(second, ["b-0", "b-1", "b-2"], index)
+    assert representatives == ["b-0", "a-0", "a-0"]
+
+
+def test_uncommitted_representatives_are_rolled_back(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    deduplicator = ChunkDeduplicator()
+    deduplicator.deduplicate([make_chunk(BOILERPLATE, "a.pdf")], ["a-0"], index)
+    index.rollback()
+    assert len(index) == 0
+    assert deduplicator.deduplicate([make_chunk(BOILERPLATE, "b.pdf")], ["b-0"], index) == ["b-0"]
+
+
+def test_deleted_representative_no_longer_matches(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    deduplicator = ChunkDeduplicator()
+    deduplicator.deduplicate([make_chunk(BOILERPLATE, "a.pdf")], ["a-0"], index)
+    index.commit()
+    index.delete(["a-0"])
+    assert deduplicator.deduplicate([make_chunk(BOILERPLATE, "b.pdf")], ["b-0"], index) == ["b-0"]
+
+
+def test_signature_settings_change_clears_index(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    ChunkDeduplicator().deduplicate([make_chunk(BOILERPLATE, "a.pdf")], ["a-0"], index)
+    index.commit()
+    ChunkDeduplicator(seed=2).deduplicate([make_chunk("其他内容。", "b.pdf")], ["b-0"], index)
+    assert len(index) == 1
+
+
+class FakeCollection:
+    """只实现 update_duplicate_metadata 用到的 get 与 update。"""
+
+    def __init__(self, metadatas):
+        self.metadatas = metadatas
+
+    def get(self, ids, include):
+        ids = [chunk_id for chunk_id in ids if chunk_id in self.metadatas]
+        return {"ids": ids, "metadatas": [dict(self.metadatas[chunk_id]) for chunk_id in ids]}
+
+    def update(self, ids, metadatas):
+        for chunk_id, metadata in zip(ids, metadatas):
+            self.metadatas[chunk_id] = metadata
+
+
+def test_cross_run_duplicates_update_stored_representative(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    deduplicator = ChunkDeduplicator()
+
+    first = [make_chunk(BOILERPLATE, "a.pdf")]
+    deduplicator.deduplicate(first, ["a-0"], index)
+    index.commit()
+    collection = FakeCollection({"a-0": dict(first[0]["metadata"])})
+
+    # 第二次运行的 B、C 中的免责声明都合并到 A 的代表块
+    second = [make_chunk(BOILERPLATE, "b.pdf"), make_chunk(BOILERPLATE + "。", "c.pdf")]
+    assert deduplicator.deduplicate(second, ["b-0", "c-0"], index) == ["a-0", "a-0"]
+    assert update_duplicate_metadata(collection, index, ["a-0"]) == 1
+    index.commit()
+    assert collection.metadatas["a-0"] == {
+        "filename": "a.pdf", "duplicate_filenames": "b.pdf,c.pdf", "duplicate_count": 2
+    }
+
+    # 文件 C 被删除后，代表块的重复来源随之更新
+    assert index.delete_files(["c.pdf"]) == ["a-0"]
+    update_duplicate_metadata(collection, index, ["a-0"])
+    assert collection.metadatas["a-0"]["duplicate_filenames"] == "b.pdf"
+    assert collection.metadatas["a-0"]["duplicate_count"] == 1
+    index.close()
@@ -0,0 +1,46 @@
+import pytest
+
+from ChunkPacker import ChunkPacker
+from TextSplitter import TextSplitter, chunk_regex
+
+
+def count_chars(texts):
+    return [len(text) for text in texts]
+
+
+def split(text, page_offsets=None):
+    return TextSplitter(chunk_regex).split_with_metadata(text, page_offsets)
+
+
+def test_merged_content_matches_document_slice():
+    text = "第一段内容。\n\n第二段内容。\n\n\n第三段内容。\n\n第四段内容。"
+    packed = ChunkPacker(count_chars, max_tokens=20).pack(split(text), text)
+    assert len(packed) < len(split(text))
+    for chunk in packed:
+        metadata = chunk["metadata"]
+        assert text[metadata["start"]:metadata["end"]] == chunk["content"]
+        assert text.encode("utf-8")[metadata["byte_start"]:metadata["byte_end"]].decode("utf-8") == chunk["content"]
+
+
+def test_merged_chunk_records_page_range():
+    pages = ["第一页的内容。", "第二页的内容。"]
+    text = "\n".join(pages)
+    page_offsets = [0, len(pages[0]) + 1]
+    packed = ChunkPacker(count_chars, max_tokens=100).pack(split(text, page_offsets), text, page_offsets)
+    assert len(packed) == 1
+    assert packed[0]["content"] == text
+    assert (packed[0]["metadata"]["page"], packed[0]["metadata"]["page_end"]) == (1, 2)
+
+
+def test_oversized_chunk_split_keeps_offsets():
+    text = "这是第一句话。这是第二句话。这是第三句话。这是第四句话。"
+    packed = ChunkPacker(count_chars, max_tokens=8).pack(split(text), text)
+    assert all(len(chunk["content"]) <= 8 for chunk in packed)
+    for chunk in packed:
+        assert text[chunk["metadata"]["start"]:chunk["metadata"]["end"]] == chunk["content"]
+
+
+def test_offsets_require_document_text():
+    text = "第一段内容。\n\n第二段内容。"
+    with pytest.raises(ValueError):
+        ChunkPacker(count_chars, max_tokens=20).pack(split(text))
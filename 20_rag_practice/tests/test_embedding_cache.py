@@ -0,0 +1,37 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from EmbeddingCache import EmbeddingCache, embedding_cache_model_name
+
+
+def test_access_times_flushed_when_block_raises(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with EmbeddingCache(path, "model") as cache:
+        cache.put_many(["文本"], np.ones((1, 4), dtype=np.float32))
+    before = sqlite3.connect(path).execute("SELECT last_access FROM embeddings").fetchone()[0]
+
+    with pytest.raises(RuntimeError):
+        with EmbeddingCache(path, "model") as cache:
+            assert cache.get_many(["文本"])[0] is not None
+            raise RuntimeError("中途出错")
+
+    after = sqlite3.connect(path).execute("SELECT last_access FROM embeddings").fetchone()[0]
+    assert after > before
+
+
+def test_same_model_name_hits_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with EmbeddingCache(path, "bge-small-zh-v1.5") as cache:
+        cache.put_many(["文本"], np.ones((1, 4), dtype=np.float32))
+    with EmbeddingCache(path, "bge-small-zh-v1.5") as cache:
+        assert cache.get_many(["文本"])[0] is not None
+    with EmbeddingCache(path, "rag_app/bge-small-zh-v1.5") as cache:
+        assert cache.get_many(["文本"])[0] is None
+
+
+def test_model_name_follows_model_path():
+    assert embedding_cache_model_name("rag_app/bge-small-zh-v1.5") == "bge-small-zh-v1.5"
+    assert embedding_cache_model_name("rag_app/bge-small-zh-v1.5/") == "bge-small-zh-v1.5"
+    assert embedding_cache_model_name("rag_app/bge-large-zh-v1.5") != embedding_cache_model_name("rag_app/bge-small-zh-v1.5")
@@ -0,0 +1,48 @@
+import faiss
+import numpy as np
+
+from FaissIndexFactory import (
+    IVFPQ_K_FACTOR, IVFPQ_NPROBE, PQ_MIN_TRAINING_POINTS, build_index, index_description, read_index, save_index,
+)
+
+
+def _vectors(count, dimension):
+    rng = np.random.RandomState(0)
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def test_small_corpus_falls_back_to_flat():
+    assert index_description("ivfpq", PQ_MIN_TRAINING_POINTS - 1, 512) == "Flat"
+
+
+def test_refinement_is_opt_in():
+    description = index_description("ivfpq", PQ_MIN_TRAINING_POINTS, 512)
+    assert description.startswith("IVF")
+    assert "RFlat" not in description
+    assert index_description("ivfpq", PQ_MIN_TRAINING_POINTS, 512, refine=True).endswith(",RFlat")
+
+
+def test_ivfpq_uses_less_memory_than_flat():
+    vectors = _vectors(PQ_MIN_TRAINING_POINTS, 64)
+    ivfpq = build_index(vectors, "ivfpq")
+    flat = build_index(vectors, "flat")
+    assert faiss.serialize_index(ivfpq).nbytes < faiss.serialize_index(flat).nbytes / 2
+
+
+def test_refined_ivfpq_search_params_survive_save_and_mmap_read(tmp_path):
+    vectors = _vectors(PQ_MIN_TRAINING_POINTS, 16)
+
+    index = build_index(vectors, "ivfpq", refine=True)
+    assert isinstance(index, faiss.IndexRefine)
+    assert index.k_factor == IVFPQ_K_FACTOR
+    assert faiss.extract_index_ivf(index).nprobe == IVFPQ_NPROBE
+
+    path = str(tmp_path / "index.faiss")
+    save_index(index, path)
+    loaded = read_index(path)
+    assert loaded.k_factor == IVFPQ_K_FACTOR
+    # 精确重排后查询自身应排在第一位
+    _, ids = loaded.search(vectors[:20], 1)
+    assert (ids[:, 0] == np.arange(20)).mean() >= 0.9
@@ -0,0 +1,41 @@
+from IndexManifest import IndexManifest
+
+
+def make_manifest(tmp_path, settings=None):
+    return IndexManifest(str(tmp_path / "manifest.json"), settings=settings or {"model": "m"})
+
+
+def test_diff_reports_changed_removed_and_stale_ids(tmp_path):
+    manifest = make_manifest(tmp_path)
+    manifest.update("a.pdf", "h1", ["a-0", "a-1"])
+    manifest.update("b.pdf", "h2", ["b-0"])
+    changed, removed, stale_ids = manifest.diff({"a.pdf": "h1-new", "c.pdf": "h3"})
+    assert sorted(changed) == ["a.pdf", "c.pdf"]
+    assert removed == ["b.pdf"]
+    assert sorted(stale_ids) == ["a-0", "a-1", "b-0"]
+
+
+def test_diff_propagates_through_dependencies(tmp_path):
+    manifest = make_manifest(tmp_path)
+    manifest.update("a.pdf", "h1", ["a-0"])
+    # b 的重复块合并到 a-0，c 的重复块合并到 b-0
+    manifest.update("b.pdf", "h2", ["b-0"], depends_on=["a-0"])
+    manifest.update("c.pdf", "h3", ["c-0"], depends_on=["b-0"])
+    manifest.update("d.pdf", "h4", ["d-0"])
+    changed, removed, stale_ids = manifest.diff({"a.pdf": "h1-new", "b.pdf": "h2", "c.pdf": "h3", "d.pdf": "h4"})
+    assert changed == ["a.pdf", "b.pdf", "c.pdf"]
+    assert removed == []
+    assert stale_ids == ["a-0", "b-0", "c-0"]
+
+
+def test_settings_change_marks_everything_changed_until_clean(tmp_path):
+    manifest = make_manifest(tmp_path)
+    manifest.update("a.pdf", "h1", ["a-0"])
+    manifest.save()
+
+    reloaded = make_manifest(tmp_path, settings={"model": "other"})
+    changed, _, stale_ids = reloaded.diff({"a.pdf": "h1"})
+    assert changed == ["a.pdf"] and stale_ids == ["a-0"]
+
+    reloaded.mark_clean()
+    assert reloaded.diff({"a.pdf": "h1"}) == ([], [], [])
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from BM25Index import BM25Index
+from MetadataFilter import to_sql_where
+
+DOCS = [
+    ("a1", ["报销", "流程"], {"filename": "a.pdf", "type": "paragraph", "date": 20240101}),
+    ("a2", ["报销", "标准"], {"filename": "a.pdf", "type": "heading", "date": 20240101}),
+    ("b1", ["报销", "审批"], {"filename": "b.pdf", "type": "paragraph", "date": 20240601}),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    bm25_index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    bm25_index.add_documents([doc[0] for doc in DOCS], [doc[1] for doc in DOCS], [doc[2] for doc in DOCS])
+    yield bm25_index
+    bm25_index.close()
+
+
+def test_to_sql_where_rejects_unknown_keys():
+    assert to_sql_where(None) == (None, [])
+    with pytest.raises(ValueError):
+        to_sql_where({"author": "x"})
+
+
+@pytest.mark.parametrize("filters, expected", [
+    (None, {"a1", "a2", "b1"}),
+    ({"filename": "a.pdf"}, {"a1", "a2"}),
+    ({"filename": ["a.pdf", "b.pdf"], "type": "paragraph"}, {"a1", "b1"}),
+    ({"date_from": 20240301}, {"b1"}),
+    ({"date_to": 20240301, "type": "heading"}, {"a2"}),
+])
+def test_search_filters_postings_in_sqlite(index, filters, expected):
+    assert {doc_id for doc_id, _ in index.search(["报销"], 10, filters=filters)} == expected
+
+
+def test_filter_ids_are_cached_until_index_is_written(index):
+    doc_ids = index.filter_ids({"filename": "a.pdf"})
+    assert doc_ids == {"a1", "a2"}
+    assert index.filter_ids({"filename": "a.pdf"}) is doc_ids
+    assert index.filter_ids(None) is None
+
+    index.add_documents(["a3"], [["报销"]], [{"filename": "a.pdf", "type": "paragraph", "date": 20240101}])
+    assert index.filter_ids({"filename": "a.pdf"}) == {"a1", "a2", "a3"}
+
+
+def test_old_docs_table_gains_metadata_columns(tmp_path):
+    path = str(tmp_path / "bm25.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    bm25_index = BM25Index(path)
+    bm25_index.add_documents(["a1"], [["报销"]], [{"filename": "a.pdf"}])
+    assert bm25_index.filter_ids({"filename": "a.pdf"}) == {"a1"}
+    bm25_index.close()
@@ -0,0 +1,45 @@
+import pytest
+
+from PromptBudgeter import PromptBudgeter
+
+
+def count_chars(texts):
+    return [len(text) for text in texts]
+
+
+def count_superadditive(texts):
+    # 每处拼接额外计 3 个 token，拼接后的计数大于分段计数之和，模拟分词在拼接处的差异
+    return [len(text) + 3 * text.count("\n\n参考文档") for text in texts]
+
+
+CHUNKS = ["第一句话。第二句话。第三句话。", "另一个文本块。它也有两句。", "第三个文本块。"]
+
+
+def test_chunks_are_ordered_by_score_and_fit_budget():
+    budgeter = PromptBudgeter(count_chars, 1000)
+    prompt, tokens = budgeter.build("问题", CHUNKS, scores=[0.1, 0.9, 0.5])
+    assert prompt.index("另一个文本块") < prompt.index("第三个文本块") < prompt.index("第一句话")
+    assert tokens == len(prompt)
+
+
+def test_last_chunk_is_trimmed_at_sentence_boundary():
+    header_only, _ = PromptBudgeter(count_chars, 1000).build("问题", [])
+    full, _ = PromptBudgeter(count_chars, 1000).build("问题", CHUNKS[:1])
+    budgeter = PromptBudgeter(count_chars, len(full) - len("第三句话。"))
+    prompt, tokens = budgeter.build("问题", CHUNKS[:1])
+    assert prompt.startswith(header_only)
+    assert "第二句话。" in prompt and "第三句话" not in prompt
+    assert tokens <= budgeter.max_tokens
+
+
+@pytest.mark.parametrize("max_tokens", [40, 60, 80, 100])
+def test_final_count_never_exceeds_budget(max_tokens):
+    budgeter = PromptBudgeter(count_superadditive, max_tokens)
+    prompt, tokens = budgeter.build("问题", CHUNKS)
+    assert tokens == count_superadditive([prompt])[0]
+    assert tokens <= max_tokens
+
+
+def test_query_over_budget_raises():
+    with pytest.raises(ValueError):
+        PromptBudgeter(count_chars, 5).build("一个很长很长很长的问题", CHUNKS)
@@ -0,0 +1,23 @@
+from RankFusion import reciprocal_rank_fusion, weighted_score_fusion
+
+
+def test_rrf_merges_by_id_and_ranks_shared_hits_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]])
+    ids = [chunk_id for chunk_id, _ in fused]
+    assert ids[0] == "c"
+    assert sorted(ids) == ["a", "b", "c", "d"]
+
+
+def test_rrf_limit_returns_all_when_fewer_candidates():
+    # 候选数少于 limit 时原样返回，调用方不能假设结果至少有 limit 个
+    assert len(reciprocal_rank_fusion([["a"], ["a", "b"]], limit=8)) == 2
+    assert len(reciprocal_rank_fusion([["a", "b", "c"], ["d"]], limit=2)) == 2
+
+
+def test_rrf_empty_lists():
+    assert reciprocal_rank_fusion([[], []], limit=8) == []
+
+
+def test_weighted_score_fusion_normalizes_each_list():
+    fused = dict(weighted_score_fusion([[("a", 10.0), ("b", 0.0)], [("b", 0.5), ("c", 0.1)]]))
+    assert fused["a"] == 1.0 and fused["b"] == 1.0 and fused["c"] == 0.0
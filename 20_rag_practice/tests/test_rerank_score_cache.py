@@ -0,0 +1,21 @@
+from RerankScoreCache import RerankScoreCache
+
+
+def test_changed_content_is_a_miss():
+    cache = RerankScoreCache()
+    cache.put_many("报销流程", ["c1", "c2"], [0.9, 0.1], ["旧内容一", "内容二"])
+    # 其他进程重新索引后 c1 的内容变化，本进程未收到 invalidate 也不会读到旧得分
+    assert cache.get_many("报销流程", ["c1", "c2"], ["新内容一", "内容二"]) == [None, 0.1]
+    assert cache.stats()["entries"] == 1
+
+
+def test_invalidate_and_ttl():
+    cache = RerankScoreCache(ttl_seconds=None)
+    cache.put_many("报销流程", ["c1"], [0.5])
+    assert cache.get_many("  报销流程 ", ["c1"]) == [0.5]
+    cache.invalidate(["c1"])
+    assert cache.get_many("报销流程", ["c1"]) == [None]
+
+    expired = RerankScoreCache(ttl_seconds=0)
+    expired.put_many("报销流程", ["c1"], [0.5])
+    assert expired.get_many("报销流程", ["c1"]) == [None]
@@ -0,0 +1,71 @@
+import numpy as np
+
+from BM25Index import BM25Index
+from SemanticAnswerCache import INITIAL_SCOPE_CAPACITY, SemanticAnswerCache, answer_scope
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_similar_query_hits_within_scope_only():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    cache.put(unit(1, 0, 0), "答案", ["c1"], answer_scope(6))
+    assert cache.lookup(unit(1, 0.1, 0), answer_scope(6)) == "答案"
+    assert cache.lookup(unit(1, 0.1, 0), answer_scope(3)) is None
+    assert cache.lookup(unit(0, 1, 0), answer_scope(6)) is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3, "entries": 1}
+
+
+def test_invalidate_ttl_and_lru():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.put(unit(1, 0, 0), "a", ["c1"])
+    cache.put(unit(0, 1, 0), "b", ["c2"])
+    cache.invalidate(["c1"])
+    assert cache.lookup(unit(1, 0, 0)) is None
+
+    cache.put(unit(0, 0, 1), "c", ["c3"])
+    assert cache.lookup(unit(0, 1, 0)) == "b"
+    # 容量为 2，最久未访问的 c 被淘汰
+    cache.put(unit(1, 1, 0), "d", ["c4"])
+    assert cache.lookup(unit(0, 0, 1)) is None
+    assert len(cache) == 2
+
+    expired = SemanticAnswerCache(ttl_seconds=0)
+    expired.put(unit(1, 0, 0), "a", ["c1"])
+    assert expired.lookup(unit(1, 0, 0)) is None
+    assert len(expired) == 0
+
+
+def test_rows_are_reused_and_matrix_grows():
+    cache = SemanticAnswerCache(max_entries=10 * INITIAL_SCOPE_CAPACITY)
+    rng = np.random.RandomState(0)
+    embeddings = rng.standard_normal((3 * INITIAL_SCOPE_CAPACITY, 8)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    for i, embedding in enumerate(embeddings):
+        cache.put(embedding, str(i), [f"c{i}"])
+    cache.invalidate([f"c{i}" for i in range(0, len(embeddings), 2)])
+    cache.put(unit(*([1.0] * 8)), "new", ["new"])
+    assert cache.lookup(unit(*([1.0] * 8))) == "new"
+    assert cache.lookup(embeddings[1]) == "1"
+    assert cache.lookup(embeddings[0]) != "0"
+
+
+def test_reindex_in_another_process_evicts_cached_answer(tmp_path):
+    path = str(tmp_path / "bm25.sqlite")
+    server_index = BM25Index(path)
+    server_index.add_documents(["c1", "c2"], [["报销"], ["流程"]])
+    cache = SemanticAnswerCache(chunks_exist=server_index.contains_all)
+    cache.put(unit(1, 0, 0), "旧答案", ["c1", "c2"])
+    assert cache.lookup(unit(1, 0, 0)) == "旧答案"
+
+    # 另一个进程的增量索引删除了 c1（文件内容变化后文本块 ID 随之变化）
+    indexer = BM25Index(path)
+    indexer.delete_documents(["c1"])
+    indexer.add_documents(["c1-new"], [["报销"]])
+    indexer.close()
+
+    assert cache.lookup(unit(1, 0, 0)) is None
+    assert len(cache) == 0
+    server_index.close()
@@ -0,0 +1,45 @@
+import pytest
+
+from BM25Index import BM25Index
+
+DOCS = {
+    "a": ["苹果", "香蕉", "苹果"],
+    "b": ["香蕉", "橘子"],
+    "c": ["葡萄", "西瓜", "葡萄"],
+    "d": ["橘子", "苹果", "西瓜"],
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    bm25_index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    bm25_index.add_documents(list(DOCS), list(DOCS.values()))
+    yield bm25_index
+    bm25_index.close()
+
+
+def test_single_and_batch_search_match_index_search(index):
+    queries = [["苹果"], ["橘子", "葡萄"], ["不存在"]]
+    sparse_bm25 = index.sparse()
+    for query, batch_results in zip(queries, sparse_bm25.search_batch(queries, 10)):
+        expected = index.search(query, 10)
+        assert [doc_id for doc_id, _ in sparse_bm25.search(query, 10)] == [doc_id for doc_id, _ in expected]
+        assert [doc_id for doc_id, _ in batch_results] == [doc_id for doc_id, _ in expected]
+
+
+def test_sparse_is_cached_until_index_is_written(index, tmp_path):
+    sparse_bm25 = index.sparse()
+    assert index.sparse() is sparse_bm25
+
+    index.add_documents(["e"], [["荔枝"]])
+    rebuilt = index.sparse()
+    assert rebuilt is not sparse_bm25
+    assert rebuilt.search(["荔枝"], 1)[0][0] == "e"
+
+    # 其他进程（另一个连接）写入后同样重建
+    writer = BM25Index(str(tmp_path / "bm25.sqlite"))
+    writer.delete_documents(["e"])
+    writer.close()
+    assert index.sparse() is not rebuilt
+    assert index.sparse().search(["荔枝"], 1) == []
+    assert len(index) == len(DOCS)